@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Load test: throughput and per-request overhead of the whole gateway.
+
+Starts the stub upstreams (stub_upstreams.py) and the gateway from main.py
+under uvicorn, each in its own process, then drives a mixed workload for
+--duration seconds:
+
+  catalog    public GETs: vehicle list and detail, availability, ratings
+  rentals    authenticated rental, payment and profile reads and writes
+  uploads    authenticated multipart avatar uploads of --upload-kb
+  abusive    login attempts from a few clients well past the auth rate limit
+
+Clients connect from distinct 127.0.0.x addresses so the rate limiter sees
+them as separate IPs. Tokens are HS256 JWTs the gateway verifies itself.
+
+Overhead is the client-measured latency minus the upstream's own handling
+time (from its Server-Timing header; zero for cache hits and requests the
+gateway answers itself). It includes the loopback hops and the client, so
+the same measurement taken directly against a stub is reported as the
+"direct" floor. Compare runs made on the same machine.
+
+Run from the api-gateway directory:
+
+    python benchmarks/load_test.py [--duration S] [--concurrency N] [--mix catalog=60,rentals=25,uploads=5,abusive=10]
+                                   [--latency-ms N] [--jitter-ms N] [--payload-items N] [--upload-kb N] [--json FILE]
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_DIR = os.path.dirname(BENCHMARK_DIR)
+
+SERVICES = ("user", "vehicle", "rental", "rating", "payment")
+
+JWT_SECRET = "load-test-secret"
+
+# Login attempts an abusive client may make per window before getting 429s
+AUTH_RATE_LIMIT = 20
+
+# Distinct source addresses of the abusive workload
+ABUSIVE_CLIENTS = 4
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def make_token(user_id, role="customer", ttl=3600):
+    header = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    claims = {"userId": user_id, "email": f"user{user_id}@example.com", "role": role, "exp": int(time.time()) + ttl}
+    payload = _b64(json.dumps(claims).encode())
+    signing_input = header + b"." + payload
+    signature = _b64(hmac.new(JWT_SECRET.encode(), signing_input, hashlib.sha256).digest())
+    return (signing_input + b"." + signature).decode()
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def upstream_time(response):
+    """Upstream handling time in seconds, from the stub's Server-Timing header."""
+    if response.headers.get("x-cache") == "HIT":
+        return 0.0
+    timing = response.headers.get("server-timing", "")
+    _, _, duration = timing.partition("dur=")
+    try:
+        return float(duration.split(";")[0].split(",")[0]) / 1000
+    except ValueError:
+        return 0.0
+
+
+class Workloads:
+    """Request generators for each workload; each returns (method, path, kwargs)."""
+
+    def __init__(self, rng, upload_kb):
+        self.rng = rng
+        self.upload = os.urandom(upload_kb * 1024)
+        self._auth_headers = {}
+
+    def auth_headers(self, client_id):
+        headers = self._auth_headers.get(client_id)
+        if headers is None:
+            headers = self._auth_headers[client_id] = {"Authorization": f"Bearer {make_token(client_id)}"}
+        return headers
+
+    def catalog(self, client_id):
+        rng = self.rng
+        choice = rng.random()
+        if choice < 0.35:
+            return "GET", "/vehicles", {}
+        if choice < 0.7:
+            return "GET", f"/vehicles/{rng.randrange(500)}", {}
+        if choice < 0.85:
+            return "GET", "/rentals/availability", {"params": {"vehicleId": rng.randrange(500)}}
+        return "GET", f"/ratings/{rng.randrange(500)}", {}
+
+    def rentals(self, client_id):
+        rng = self.rng
+        headers = self.auth_headers(client_id)
+        choice = rng.random()
+        if choice < 0.4:
+            return "GET", f"/rentals/user/{client_id}", {"headers": headers}
+        if choice < 0.6:
+            return "GET", "/users/profile", {"headers": headers}
+        if choice < 0.8:
+            return "GET", f"/payments/rental/{rng.randrange(1000)}", {"headers": headers}
+        body = {"vehicleId": rng.randrange(500), "startDate": "2026-01-01", "endDate": "2026-01-05"}
+        return "POST", "/rentals/", {"headers": headers, "json": body}
+
+    def uploads(self, client_id):
+        headers = self.auth_headers(client_id)
+        files = {"avatar": ("avatar.jpg", self.upload, "image/jpeg")}
+        return "POST", f"/users/{client_id}/avatar", {"headers": headers, "files": files}
+
+    def abusive(self, client_id):
+        return "POST", "/auth/login", {"json": {"email": f"user{client_id}@example.com", "password": "guess"}}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("catalog", "rentals", "uploads", "abusive"):
+            raise argparse.ArgumentTypeError(f"Unknown workload: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def start_process(args, env=None, cwd=None):
+    return subprocess.Popen(
+        args, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+
+
+def stop_process(process):
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def wait_ready(url, timeout=20):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def gateway_env(args):
+    env = dict(os.environ)
+    for offset, service in enumerate(SERVICES):
+        env[f"{service.upper()}_SERVICE_URL"] = f"http://127.0.0.1:{args.stub_base_port + offset}"
+    env.update({
+        # Production mode, so localhost is not exempt from rate limiting
+        "ENVIRONMENT": "production",
+        "GATEWAY_JWT_VERIFY": "true",
+        "JWT_SECRET": JWT_SECRET,
+        "RATE_LIMIT_MAX_REQUESTS": str(10**9),
+        "RATE_LIMIT_AUTH_MAX_REQUESTS": str(AUTH_RATE_LIMIT),
+        "RATE_LIMIT_AUTH_WINDOW_SECONDS": "60",
+        "LOG_LEVEL": "WARNING",
+    })
+    return env
+
+
+def client_address(workload, client_id):
+    # One source address per client; abusive clients get their own range
+    third = {"catalog": 0, "rentals": 1, "uploads": 2, "abusive": 3}[workload]
+    return f"127.0.{third}.{2 + client_id % 250}"
+
+
+def client_count(workload, args):
+    # Abusive clients are few and hammer; everyone else is spread out
+    return ABUSIVE_CLIENTS if workload == "abusive" else args.clients
+
+
+def create_clients(base_url, mix, args):
+    """One client per simulated user, created up front so setup is not measured."""
+    clients = {}
+    for workload in mix:
+        for client_id in range(client_count(workload, args)):
+            transport = httpx.AsyncHTTPTransport(local_address=client_address(workload, client_id), verify=False)
+            clients[workload, client_id] = httpx.AsyncClient(base_url=base_url, transport=transport, timeout=30)
+    return clients
+
+
+async def drive(clients, workloads, rng, mix, args, duration, results):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        while time.monotonic() < deadline:
+            workload = rng.choices(names, weights)[0]
+            client_id = rng.randrange(client_count(workload, args))
+            method, path, kwargs = getattr(workloads, workload)(client_id)
+            client = clients[workload, client_id]
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                results[workload].append((time.perf_counter() - start, 0.0, type(e).__name__))
+                continue
+            elapsed = time.perf_counter() - start
+            results[workload].append((elapsed, upstream_time(response), response.status_code))
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+
+async def measure_direct(args):
+    """The same measurement against a stub directly: the client and loopback floor."""
+    results = []
+    deadline = time.monotonic() + min(5.0, args.duration)
+    url = f"http://127.0.0.1:{args.stub_base_port + SERVICES.index('vehicle')}"
+
+    async with httpx.AsyncClient(base_url=url) as client:
+        async def worker():
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                response = await client.get("/vehicles/1")
+                results.append((time.perf_counter() - start, upstream_time(response), response.status_code))
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return results
+
+
+def summarize(samples, duration):
+    latencies = sorted(elapsed for elapsed, _, _ in samples)
+    overheads = sorted(max(0.0, elapsed - upstream) for elapsed, upstream, _ in samples)
+    statuses = Counter(str(status) for _, _, status in samples)
+    return {
+        "requests": len(samples),
+        "throughput": len(samples) / duration,
+        "statuses": dict(sorted(statuses.items())),
+        "latency_ms": {
+            "p50": percentile(latencies, 0.5) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "p999": percentile(latencies, 0.999) * 1000,
+        },
+        "overhead_ms": {
+            "p50": percentile(overheads, 0.5) * 1000,
+            "p99": percentile(overheads, 0.99) * 1000,
+            "p999": percentile(overheads, 0.999) * 1000,
+        },
+    }
+
+
+def print_report(report, args):
+    print(
+        f"{args.duration:g}s, concurrency {args.concurrency}, upstream latency {args.latency_ms:g}ms "
+        f"(+{args.jitter_ms:g}ms jitter), {args.payload_items} items per GET, {args.upload_kb}KB uploads"
+    )
+    header = (
+        f"{'workload':<10} {'requests':>9} {'req/s':>8} {'lat p50':>8} {'lat p99':>8} {'lat p999':>9} "
+        f"{'ovh p50':>8} {'ovh p99':>8} {'ovh p999':>9}  statuses"
+    )
+    print(header)
+    for name, r in report.items():
+        lat, ovh = r["latency_ms"], r["overhead_ms"]
+        statuses = " ".join(f"{status}:{count}" for status, count in r["statuses"].items())
+        print(
+            f"{name:<10} {r['requests']:>9} {r['throughput']:>8.0f} {lat['p50']:>8.2f} {lat['p99']:>8.2f} "
+            f"{lat['p999']:>9.2f} {ovh['p50']:>8.2f} {ovh['p99']:>8.2f} {ovh['p999']:>9.2f}  {statuses}"
+        )
+    print("latency and overhead in ms")
+
+
+async def run(args):
+    stubs = start_process(
+        [
+            sys.executable, os.path.join(BENCHMARK_DIR, "stub_upstreams.py"),
+            "--base-port", str(args.stub_base_port),
+            "--latency-ms", str(args.latency_ms),
+            "--jitter-ms", str(args.jitter_ms),
+            "--payload-items", str(args.payload_items),
+        ],
+    )
+    gateway = start_process(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning", "--no-access-log",
+        ],
+        env=gateway_env(args),
+        cwd=GATEWAY_DIR,
+    )
+    try:
+        for offset in range(len(SERVICES)):
+            await wait_ready(f"http://127.0.0.1:{args.stub_base_port + offset}/health")
+        base_url = f"http://127.0.0.1:{args.port}"
+        await wait_ready(f"{base_url}/api/health")
+
+        direct = await measure_direct(args)
+
+        rng = random.Random(args.seed)
+        workloads = Workloads(rng, args.upload_kb)
+        clients = create_clients(base_url, args.mix, args)
+        try:
+            # Open connections and fill the gateway's pools and caches first
+            await drive(clients, workloads, rng, args.mix, args, args.warmup, defaultdict(list))
+            results = defaultdict(list)
+            start = time.perf_counter()
+            await drive(clients, workloads, rng, args.mix, args, args.duration, results)
+            duration = time.perf_counter() - start
+        finally:
+            for client in clients.values():
+                await client.aclose()
+    finally:
+        stop_process(gateway)
+        stop_process(stubs)
+
+    report = {name: summarize(samples, duration) for name, samples in sorted(results.items())}
+    report["all"] = summarize([s for samples in results.values() for s in samples], duration)
+    report["direct"] = summarize(direct, min(5.0, args.duration))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to drive load")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of unmeasured load first")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent client tasks")
+    parser.add_argument("--clients", type=int, default=200, help="Distinct well-behaved clients (source IPs)")
+    parser.add_argument(
+        "--mix", type=parse_mix, default=parse_mix("catalog=60,rentals=25,uploads=5,abusive=10"),
+        help="Workload weights",
+    )
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Stub upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra stub latency, up to this much")
+    parser.add_argument("--payload-items", type=int, default=20, help="Items in each stub GET response")
+    parser.add_argument("--upload-kb", type=int, default=256, help="Size of each upload")
+    parser.add_argument("--port", type=int, default=4100, help="Gateway port")
+    parser.add_argument("--stub-base-port", type=int, default=4101, help="First stub upstream port")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the request mix")
+    parser.add_argument("--json", help="Also write the report to this file, e.g. to compare commits")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "json"}, "report": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
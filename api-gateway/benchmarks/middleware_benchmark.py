@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request overhead of the gateway middleware stack.
+
+Drives an in-process Starlette app through httpx's ASGI transport (no network)
+with three stacks:
+
+  none       no middleware, the baseline
+  base-http  three pass-through BaseHTTPMiddleware layers, i.e. the task,
+             memory-stream and response re-wrapping cost every request paid
+             before the middleware was rewritten
+  asgi       the gateway's MetricsMiddleware, RequestLoggingMiddleware,
+             RateLimitMiddleware and AuthMiddleware, in the same order as main.py
+
+Run from the api-gateway directory:
+
+    python benchmarks/middleware_benchmark.py [--requests N] [--concurrency N]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware import RequestLoggingMiddleware, AuthMiddleware, RateLimitMiddleware, MetricsMiddleware  # noqa: E402
+
+
+class PassThroughMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        return await call_next(request)
+
+
+async def endpoint(request):
+    return JSONResponse({"id": request.path_params["vehicle_id"], "status": "available"})
+
+
+def build_app(stack):
+    if stack == "none":
+        middleware = []
+    elif stack == "base-http":
+        middleware = [Middleware(PassThroughMiddleware) for _ in range(3)]
+    else:
+        # Outermost first, matching the add_middleware order in main.py
+        middleware = [
+            Middleware(MetricsMiddleware),
+            Middleware(RequestLoggingMiddleware),
+            Middleware(RateLimitMiddleware, max_requests=10**9, window_size=60),
+            Middleware(AuthMiddleware),
+        ]
+    return Starlette(routes=[Route("/vehicles/{vehicle_id}", endpoint)], middleware=middleware)
+
+
+async def measure(stack, requests, concurrency):
+    app = build_app(stack)
+    # A non-local client address so the rate limiter is exercised
+    transport = httpx.ASGITransport(app=app, client=("203.0.113.10", 50000))
+    latencies = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        # Warm up
+        for _ in range(1000):
+            await client.get("/vehicles/1")
+
+        queue = asyncio.Queue()
+        for i in range(requests):
+            queue.put_nowait(i)
+
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.get("/vehicles/1")
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "throughput": requests / elapsed,
+        "mean_us": statistics.fmean(latencies) * 1e6,
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000, help="Requests per stack")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent client tasks")
+    args = parser.parse_args()
+
+    # Keep log output out of the measurement
+    logging.getLogger("api_gateway").setLevel(logging.CRITICAL)
+
+    results = {}
+    for stack in ("none", "base-http", "asgi"):
+        results[stack] = await measure(stack, args.requests, args.concurrency)
+
+    baseline = results["none"]["mean_us"]
+    print(f"{args.requests} requests per stack, concurrency {args.concurrency}")
+    print(f"{'stack':<10} {'req/s':>10} {'mean us':>10} {'p50 us':>10} {'p99 us':>10} {'overhead us':>12}")
+    for stack, r in results.items():
+        print(
+            f"{stack:<10} {r['throughput']:>10.0f} {r['mean_us']:>10.1f} {r['p50_us']:>10.1f} "
+            f"{r['p99_us']:>10.1f} {r['mean_us'] - baseline:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: sliding-window-counter limiter vs. the per-IP timestamp lists
+that RateLimitMiddleware used before.
+
+Run from the api-gateway directory:
+
+    python benchmarks/rate_limit_benchmark.py [--requests N] [--ips N] [--max-requests N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.rate_limiter import SlidingWindowRateLimiter  # noqa: E402
+
+
+class TimestampListLimiter:
+    """The previous RateLimitMiddleware algorithm, kept here for comparison."""
+
+    def __init__(self, max_requests, window_size):
+        self.max_requests = max_requests
+        self.window_size = window_size
+        self.request_counts = defaultdict(list)
+        self.last_warning = {}
+
+    def hit(self, client_ip):
+        now = datetime.now()
+        self.request_counts[client_ip] = [
+            timestamp for timestamp in self.request_counts[client_ip]
+            if timestamp > now - timedelta(seconds=self.window_size)
+        ]
+        if len(self.request_counts[client_ip]) >= self.max_requests:
+            if (client_ip not in self.last_warning or
+                    now - self.last_warning[client_ip] > timedelta(minutes=1)):
+                self.last_warning[client_ip] = now
+            return False
+        self.request_counts[client_ip].append(now)
+        return True
+
+
+def run(name, limiter, keys):
+    tracemalloc.start()
+    start = time.perf_counter()
+    allowed = 0
+    for key in keys:
+        if limiter.hit(key):
+            allowed += 1
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_hit_ns = elapsed / len(keys) * 1e9
+    print(f"{name:<24} {per_hit_ns:>10.0f} ns/hit {peak / 1024:>10.0f} KiB peak {allowed:>10} allowed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200_000, help="Requests to simulate")
+    parser.add_argument("--ips", type=int, default=5_000, help="Distinct client IPs")
+    parser.add_argument("--max-requests", type=int, default=300, help="Limit per window")
+    parser.add_argument("--window", type=int, default=60, help="Window size in seconds")
+    args = parser.parse_args()
+
+    random.seed(42)
+    # A few hot clients and a long tail, roughly like real traffic
+    hot = [f"10.0.0.{i}" for i in range(10)]
+    keys = [
+        random.choice(hot) if random.random() < 0.5 else f"172.16.{i // 256 % 256}.{i % 256}"
+        for i in (random.randrange(args.ips) for _ in range(args.requests))
+    ]
+
+    print(f"{args.requests} requests, {args.ips} IPs, limit {args.max_requests}/{args.window}s")
+    run("timestamp lists (old)", TimestampListLimiter(args.max_requests, args.window), keys)
+    run("sliding window counter", SlidingWindowRateLimiter(args.max_requests, args.window), keys)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: how long a freshly started gateway takes to answer.
+
+Starts the stub upstreams (stub_upstreams.py) once, then starts and stops
+the gateway --runs times. Each run measures, from the moment the process is
+spawned:
+
+  import     importing main.py, in a separate interpreter
+  ready      the first 200 from /api/health
+  proxied    the first proxied request to each of the vehicle, rental and
+             rating services after that, which pays for any work the
+             gateway left to the first request (pools, TLS setup, caches)
+  warm       the same requests once more, for comparison
+
+The gateway is launched the way it is deployed, with ``python main.py``
+(--launcher main), or with plain uvicorn as before (--launcher uvicorn).
+The stubs answer without delay, so the times are the gateway's own.
+
+Run from the api-gateway directory:
+
+    python benchmarks/startup_benchmark.py [--runs N] [--launcher main|uvicorn] [--workers N] [--json FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_DIR = os.path.dirname(BENCHMARK_DIR)
+
+SERVICES = ("user", "vehicle", "rental", "rating", "payment")
+
+# One public GET per service measured for the first proxied request
+PROXIED_PATHS = ("/vehicles/1", "/rentals/availability?vehicleId=1", "/ratings/1")
+
+
+def start_process(args, env=None, cwd=None):
+    return subprocess.Popen(
+        args, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+
+
+def stop_process(process):
+    if process.poll() is None:
+        # Workers run in the gateway's session; stop them with it
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+async def wait_ready(client, url, timeout=30, interval=0.005):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get(url)
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(interval)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def gateway_env(args):
+    env = dict(os.environ)
+    for offset, service in enumerate(SERVICES):
+        env[f"{service.upper()}_SERVICE_URL"] = f"http://127.0.0.1:{args.stub_base_port + offset}"
+    env.update({
+        "ENVIRONMENT": "production",
+        "GATEWAY_RELOAD": "false",
+        "HOST": "127.0.0.1",
+        "PORT": str(args.port),
+        "WEB_CONCURRENCY": str(args.workers),
+        "RATE_LIMIT_MAX_REQUESTS": str(10**9),
+        "LOG_LEVEL": "WARNING",
+        # Not measured here, and a cached answer would hide the proxy path
+        "CACHE_ENABLED": "false",
+    })
+    return env
+
+
+def gateway_command(args):
+    if args.launcher == "uvicorn":
+        return [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(args.workers),
+        ]
+    return [sys.executable, "main.py"]
+
+
+def measure_import(env):
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=GATEWAY_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+async def measure_run(args, env):
+    base_url = f"http://127.0.0.1:{args.port}"
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        started = time.perf_counter()
+        gateway = start_process(gateway_command(args), env=env, cwd=GATEWAY_DIR)
+        try:
+            await wait_ready(client, "/api/health")
+            ready = time.perf_counter() - started
+
+            timings = {}
+            for phase in ("proxied", "warm"):
+                elapsed = 0.0
+                for path in PROXIED_PATHS:
+                    request_started = time.perf_counter()
+                    response = await client.get(path)
+                    elapsed += time.perf_counter() - request_started
+                    if response.status_code != 200:
+                        raise RuntimeError(f"{path} returned {response.status_code}")
+                timings[phase] = elapsed
+        finally:
+            stop_process(gateway)
+    return {"ready": ready, **timings}
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "min": round(values[0] * 1000, 1),
+        "median": round(statistics.median(values) * 1000, 1),
+        "max": round(values[-1] * 1000, 1),
+    }
+
+
+def print_report(report, args):
+    print(f"{args.runs} runs, launcher {args.launcher}, {args.workers} worker(s)")
+    print(f"{'phase':<10} {'min':>8} {'median':>8} {'max':>8}")
+    for phase, r in report.items():
+        print(f"{phase:<10} {r['min']:>8.1f} {r['median']:>8.1f} {r['max']:>8.1f}")
+    print(f"times in ms; proxied and warm are the sum of {len(PROXIED_PATHS)} requests")
+
+
+async def run(args):
+    stubs = start_process(
+        [
+            sys.executable, os.path.join(BENCHMARK_DIR, "stub_upstreams.py"),
+            "--base-port", str(args.stub_base_port),
+            "--latency-ms", "0",
+        ],
+    )
+    env = gateway_env(args)
+    samples = {"import": [], "ready": [], "proxied": [], "warm": []}
+    try:
+        async with httpx.AsyncClient() as client:
+            for offset in range(len(SERVICES)):
+                await wait_ready(client, f"http://127.0.0.1:{args.stub_base_port + offset}/health", interval=0.1)
+
+        for _ in range(args.runs):
+            samples["import"].append(measure_import(env))
+            for phase, value in (await measure_run(args, env)).items():
+                samples[phase].append(value)
+    finally:
+        stop_process(stubs)
+
+    return {phase: summarize(values) for phase, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Gateway starts to measure")
+    parser.add_argument("--launcher", choices=("main", "uvicorn"), default="main", help="How to start the gateway")
+    parser.add_argument("--workers", type=int, default=1, help="Gateway worker processes")
+    parser.add_argument("--port", type=int, default=4200, help="Gateway port")
+    parser.add_argument("--stub-base-port", type=int, default=4201, help="First stub upstream port")
+    parser.add_argument("--json", help="Also write the report to this file, e.g. to compare commits")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "json"}, "report": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
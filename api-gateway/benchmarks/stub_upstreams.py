@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Stub upstreams for gateway load tests.
+
+Serves stand-ins for the user, vehicle, rental, rating and payment services
+on consecutive ports starting at --base-port (in that order). Every path is
+accepted:
+
+  GET/HEAD   a JSON document with --payload-items items
+  other      the request body is read and discarded, and a small JSON
+             document is returned
+
+Each response waits --latency-ms (plus up to --jitter-ms of random extra)
+and reports its own handling time in a ``Server-Timing: app;dur=<ms>``
+header, which load_test.py subtracts to get the gateway's overhead.
+
+Run from the api-gateway directory:
+
+    python benchmarks/stub_upstreams.py [--base-port N] [--latency-ms N] [--jitter-ms N] [--payload-items N]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import signal
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+# Services in port order, relative to --base-port
+SERVICES = ("user", "vehicle", "rental", "rating", "payment")
+
+METHODS = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"]
+
+
+def build_payload(service, items):
+    """Serialize the GET response once; about 100 bytes per item."""
+    return json.dumps({
+        "service": service,
+        "items": [
+            {"id": i, "name": f"{service} item {i}", "status": "available", "price": 100 + i % 50, "rating": 4.5}
+            for i in range(items)
+        ],
+    }).encode("utf-8")
+
+
+def build_stub_app(service, latency_ms=5.0, jitter_ms=0.0, payload_items=20):
+    """Return an ASGI app standing in for ``service``."""
+    payload = build_payload(service, payload_items)
+    latency = latency_ms / 1000
+    jitter = jitter_ms / 1000
+
+    async def handle(request):
+        start = time.perf_counter()
+        if request.method in ("GET", "HEAD"):
+            body = payload
+        else:
+            received = 0
+            async for chunk in request.stream():
+                received += len(chunk)
+            body = json.dumps({"service": service, "ok": True, "received": received}).encode("utf-8")
+
+        delay = latency + (random.random() * jitter if jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={"Server-Timing": f"app;dur={duration_ms:.3f}"},
+        )
+
+    return Starlette(routes=[Route("/{path:path}", handle, methods=METHODS)])
+
+
+class _Server(uvicorn.Server):
+    # Several servers share one loop; serve() installs a single handler for all
+    def install_signal_handlers(self):
+        pass
+
+
+async def serve(base_port, latency_ms, jitter_ms, payload_items, host="127.0.0.1"):
+    servers = []
+    for offset, service in enumerate(SERVICES):
+        app = build_stub_app(service, latency_ms, jitter_ms, payload_items)
+        config = uvicorn.Config(app, host=host, port=base_port + offset, log_level="warning", access_log=False)
+        servers.append(_Server(config))
+
+    def stop():
+        for server in servers:
+            server.should_exit = True
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop)
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-port", type=int, default=3901, help="Port of the user service; the others follow")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Latency added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency, up to this much")
+    parser.add_argument("--payload-items", type=int, default=20, help="Items in each GET response")
+    args = parser.parse_args()
+    asyncio.run(serve(args.base_port, args.latency_ms, args.jitter_ms, args.payload_items))
+
+
+if __name__ == "__main__":
+    main()
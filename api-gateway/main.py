@@ -1,12 +1,17 @@
 import os
+import signal
+import asyncio
+import tempfile
 import logging
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Depends
 from dotenv import load_dotenv
 
+# Load environment variables before the modules below read their configuration
+load_dotenv()
+
 # Import middleware
-from middleware import RequestLoggingMiddleware, AuthMiddleware, RateLimitMiddleware
+from middleware import RequestLoggingMiddleware, AuthMiddleware, RateLimitMiddleware, GatewayCORSMiddleware, MetricsMiddleware, record_route
+from middleware.rate_limiter import close_rate_limiters
 
 # Import route modules
 from routes import (
@@ -16,70 +21,59 @@ from routes import (
     health_router,
     rating_router,
     payment_router,
-    admin_router
+    admin_router,
+    gateway_router,
+    batch_router,
+    file_router
 )
 
 # Import utility functions
 from utils.proxy_request import close_http_client
+from utils.gateway_config import gateway_config
+from utils.file_server import file_server
+from utils.image_derivatives import image_derivatives
+from utils.upstream_pools import upstream_pools
+from utils.health_checker import upstream_health
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("api_gateway")
 
-# Load environment variables
-load_dotenv()
-
 # Initialize FastAPI app
 app = FastAPI(
     title="Car Rental API Gateway",
     description="API Gateway for Car Rental Microservices",
-    version="1.0.0"
+    version="1.0.0",
+    # Hands the matched route template to the metrics middleware
+    dependencies=[Depends(record_route)],
 )
 
-# Configure CORS
-origins = [
-    "http://localhost:4000",
-    "http://127.0.0.1:4000",
-    os.getenv("FRONTEND_URL", "http://frontend:4000")
-]
-
-if "ADDITIONAL_CORS_ORIGINS" in os.environ:
-    additional_origins = os.getenv("ADDITIONAL_CORS_ORIGINS").split(",")
-    origins.extend([origin.strip() for origin in additional_origins])
+# Configure CORS; allowed origins come from the gateway configuration and
+# follow reloads
+logger.info(f"Configured CORS origins: {list(gateway_config.current.origins)}")
 
-# Log configured origins for debugging
-logger.info(f"Configured CORS origins: {origins}")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "X-Requested-With"],
-    expose_headers=["Content-Length"],
-    max_age=600,  # Cache preflight requests for 10 minutes
-)
+app.add_middleware(GatewayCORSMiddleware)
 
 # Add custom middleware
-app.add_middleware(RequestLoggingMiddleware)
 app.add_middleware(AuthMiddleware)
 app.add_middleware(
     RateLimitMiddleware, 
     max_requests=int(os.getenv("RATE_LIMIT_MAX_REQUESTS", 300)), 
     window_size=int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", 60))
 )
+# Added last so they are the outermost layers and also see requests
+# rejected by the auth and rate limit middleware
+app.add_middleware(RequestLoggingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
-# Check if uploads directory exists (for local development)
+# Check if uploads directory exists (for local development); /uploads is
+# served by routes/file_routes.py from UPLOADS_DIR
 # In production (Render.com), file uploads should use cloud storage
-uploads_dir = "/app/uploads"
+uploads_dir = file_server.root
 environment = os.getenv("ENVIRONMENT", "development")
 
-if environment == "development" and os.path.exists(uploads_dir):
-    logger.info(f"Mounting uploads directory: {uploads_dir}")
-    # List contents for debugging
-    logger.info(f"Contents of {uploads_dir}: {os.listdir(uploads_dir)}")
-    # Serve static files from uploads directory
-    app.mount("/uploads", StaticFiles(directory=uploads_dir, html=True), name="uploads")
+if environment == "development" and os.path.isdir(uploads_dir):
+    logger.info(f"Serving uploads directory: {uploads_dir}")
 elif environment == "production":
     logger.info("Production environment: File uploads should use cloud storage service")
     # In production, you should configure cloud storage (AWS S3, Cloudinary, etc.)
@@ -88,6 +82,10 @@ elif environment == "production":
 else:
     logger.warning(f"Uploads directory {uploads_dir} not found! File uploads may not work properly.")
 
+# Backend services the routers below forward to. Other services are only
+# probed and pooled when their URL is configured.
+ROUTED_SERVICES = ("user", "vehicle", "rental", "rating", "payment", "admin")
+
 # Include routers
 app.include_router(health_router)
 app.include_router(user_router)
@@ -96,12 +94,89 @@ app.include_router(rental_router)
 app.include_router(rating_router)
 app.include_router(payment_router)
 app.include_router(admin_router)
+app.include_router(gateway_router)
+app.include_router(batch_router)
+app.include_router(file_router)
+
+@app.on_event("startup")
+async def startup_event():
+    # SIGHUP re-reads the environment file and swaps the gateway configuration
+    if hasattr(signal, "SIGHUP"):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, gateway_config.reload)
+        except (NotImplementedError, RuntimeError):
+            logger.warning("SIGHUP configuration reload is not supported on this platform")
+    # Follow reloads triggered in the other workers
+    gateway_config.start_watching()
+    # Build the upstream pools before serving, so the first request to each
+    # service after a cold start does not pay for it
+    services = ROUTED_SERVICES + tuple(gateway_config.current.configured)
+    created = upstream_pools.warm(services)
+    logger.info(f"Created {created} upstream pools at startup")
+    # Probe the services in the background for /api/health/ready and fail-fast routing
+    upstream_health.start(ROUTED_SERVICES)
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await gateway_config.stop_watching()
+    await upstream_health.stop()
+    # Close the per-upstream connection pools
     await close_http_client()
-
-if __name__ == "__main__":
+    # Stop the image encoder processes
+    image_derivatives.close()
+    # Flush pending rate limit counts and unmap the shared counter files
+    close_rate_limiters()
+
+def _available(module):
+    import importlib.util
+    return importlib.util.find_spec(module) is not None
+
+
+def serve():
+    """
+    Run the gateway under uvicorn.
+
+    In development (``ENVIRONMENT=development``, or ``GATEWAY_RELOAD=true``)
+    a single process reloads on code changes. Otherwise it runs
+    ``WEB_CONCURRENCY`` worker processes on uvloop and httptools when they
+    are installed, without uvicorn's access log: RequestLoggingMiddleware
+    already logs every request.
+    """
     import uvicorn
+
+    host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "3000"))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
+    reload = os.getenv("GATEWAY_RELOAD", str(environment == "development")).strip().lower() in ("1", "true", "yes", "on")
+    if reload:
+        uvicorn.run("main:app", host=host, port=port, reload=True)
+        return
+
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    reload_file = None
+    if workers > 1 and not os.getenv("GATEWAY_RELOAD_FILE"):
+        # Workers inherit the environment; a configuration reload in one of
+        # them is passed on to the others through this file
+        reload_file = os.path.join(tempfile.gettempdir(), f"api-gateway-reload-{os.getpid()}")
+        os.environ["GATEWAY_RELOAD_FILE"] = reload_file
+    loop = "uvloop" if _available("uvloop") else "asyncio"
+    http = "httptools" if _available("httptools") else "h11"
+    logger.info(f"Starting {workers} worker(s) on {host}:{port} (loop={loop}, http={http})")
+    try:
+        uvicorn.run(
+            # Workers import the app themselves; a single process serves the one
+            # already imported here instead of importing it a second time
+            "main:app" if workers > 1 else app,
+            host=host,
+            port=port,
+            workers=workers,
+            loop=loop,
+            http=http,
+            access_log=False,
+        )
+    finally:
+        if reload_file is not None and os.path.exists(reload_file):
+            os.remove(reload_file)
+
+
+if __name__ == "__main__":
+    serve()
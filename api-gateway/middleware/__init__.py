@@ -1,9 +1,14 @@
 from .logging_middleware import RequestLoggingMiddleware
 from .auth_middleware import AuthMiddleware
 from .rate_limit_middleware import RateLimitMiddleware
+from .cors_middleware import GatewayCORSMiddleware
+from .metrics_middleware import MetricsMiddleware, record_route
 
 __all__ = [
     "RequestLoggingMiddleware",
     "AuthMiddleware",
-    "RateLimitMiddleware"
+    "RateLimitMiddleware",
+    "GatewayCORSMiddleware",
+    "MetricsMiddleware",
+    "record_route"
 ] 
\ No newline at end of file
@@ -1,82 +1,128 @@
-import os
 import logging
-import re
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 from fastapi.responses import JSONResponse
+from utils.route_policy import route_policies
+from utils.jwt_verifier import InvalidTokenError, create_jwt_verifier
+from utils.metrics import auth_rejected_total
 
 logger = logging.getLogger("api_gateway")
 
+# Identity headers the gateway sets from verified token claims: (header, claim).
+# Client-supplied copies are always stripped so services can trust them.
+TRUSTED_CLAIM_HEADERS = (
+    (b"x-user-id", "userId"),
+    (b"x-user-email", "email"),
+    (b"x-user-role", "role"),
+)
+_TRUSTED_HEADER_NAMES = frozenset(name for name, _ in TRUSTED_CLAIM_HEADERS)
+_TRUSTED_AND_AUTHORIZATION = _TRUSTED_HEADER_NAMES | {b"authorization"}
 
-class AuthMiddleware(BaseHTTPMiddleware):
+
+def _bearer_token(auth_header):
+    scheme, _, token = auth_header.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+
+class AuthMiddleware:
     """Middleware for token validation and authentication."""
     
-    def __init__(self, app):
-        super().__init__(app)
-        # Public paths that don't require authentication, can be extended with env var
-        self.public_paths = [
-            "/",
-            "/health",
-            "/info",
-            "/auth/login",
-            "/auth/register",
-            "/auth/forgot-password",
-            "/vehicles",
-            "/rentals/availability",
-            "/uploads",
-            "/api/health",
-            "/api/check-file",
-            "/api/serve-file",
-        ]
-        
-        # Add additional public paths from environment variable if defined
-        additional_paths = os.getenv("PUBLIC_API_PATHS", "")
-        if additional_paths:
-            self.public_paths.extend(additional_paths.split(","))
-            
-        logger.info(f"Auth middleware initialized with {len(self.public_paths)} public paths")
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # Public paths and per-route policies are compiled once into a trie;
+        # PUBLIC_API_PATHS can add more public prefixes
+        self.policies = route_policies
+        # None unless GATEWAY_JWT_VERIFY is enabled
+        self.verifier = create_jwt_verifier()
+        logger.info(f"Auth middleware initialized with {len(self.policies.paths)} route policies")
     
-    def is_public_path(self, path):
+    def is_public_path(self, path, method="GET"):
         """Check if a path is public (doesn't require auth)"""
-        # Exact matches
-        if path in self.public_paths:
-            return True
-            
-        # Path prefixes (for /vehicles/*, /uploads/*, etc.)
-        for public_path in self.public_paths:
-            if path.startswith(public_path + "/") or path.startswith(public_path):
-                return True
-                
-        # Specific path patterns with regex
-        vehicle_pattern = r"^/vehicles/\d+$"
-        if re.match(vehicle_pattern, path):
-            return True
-            
-        return False
+        return self.policies.is_public(method, path)
+
+    def verify(self, auth_header):
+        """Return the token claims, or None if the token is invalid."""
+        token = _bearer_token(auth_header)
+        if token is None:
+            return None
+        try:
+            return self.verifier.verify(token)
+        except InvalidTokenError as e:
+            logger.debug(f"Rejected token: {e}")
+            return None
+
+    @staticmethod
+    def with_identity(scope, claims, drop_authorization=False):
+        """
+        Return a scope with client identity headers replaced by verified
+        claims, and without the Authorization header if ``drop_authorization``.
+        """
+        stripped = _TRUSTED_AND_AUTHORIZATION if drop_authorization else _TRUSTED_HEADER_NAMES
+        headers = [(k, v) for k, v in scope["headers"] if k not in stripped]
+        if not claims and len(headers) == len(scope["headers"]):
+            return scope
+        if claims:
+            for name, claim in TRUSTED_CLAIM_HEADERS:
+                value = claims.get(claim)
+                if value is not None:
+                    headers.append((name, str(value).encode("latin-1", "replace")))
+        return {**scope, "headers": headers}
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # Get the complete request path
-        path = request.url.path
+        path = scope.get("root_path", "") + scope["path"]
         
         # Skip auth for OPTIONS requests (CORS preflight)
-        if request.method == "OPTIONS":
-            return await call_next(request)
-        
-        # Check if the path is public
-        if self.is_public_path(path):
-            return await call_next(request)
+        if scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
         
         # Get the authorization header
-        auth_header = request.headers.get("Authorization")
+        auth_header = Headers(scope=scope).get("Authorization")
+        claims = None
+        if self.verifier is not None and auth_header:
+            claims = self.verify(auth_header)
+        invalid_token = self.verifier is not None and bool(auth_header) and claims is None
+
+        # Check if the path is public
+        if self.is_public_path(path, scope["method"]):
+            # A public route is served anonymously rather than rejected when
+            # the token is bad, but the token is not passed on
+            if invalid_token:
+                logger.debug(f"Dropped invalid token for public path {path}")
+            await self.app(self.with_identity(scope, claims, drop_authorization=invalid_token), receive, send)
+            return
+
+        scope = self.with_identity(scope, claims)
         
         # If no authorization header is present for protected routes, return 401
         if not auth_header:
             logger.warning(f"Unauthorized access attempt: {path}")
-            return JSONResponse(
+            auth_rejected_total.inc(("missing_token",))
+            response = JSONResponse(
                 status_code=401,
                 content={"detail": "Authentication required"}
             )
+            await response(scope, receive, send)
+            return
+
+        # Reject bad tokens at the edge when the gateway verifies them
+        if invalid_token:
+            logger.warning(f"Invalid token for {path}")
+            auth_rejected_total.inc(("invalid_token",))
+            response = JSONResponse(
+                status_code=401,
+                content={"detail": "Invalid or expired token"}
+            )
+            await response(scope, receive, send)
+            return
         
-        # Pass the auth header to the microservice for validation
-        # The actual token validation will be done by the user service
-        return await call_next(request) 
\ No newline at end of file
+        # Pass the auth header on as well; the services still validate it
+        # themselves unless they trust the X-User-* headers set above
+        await self.app(scope, receive, send)
@@ -0,0 +1,26 @@
+from starlette.middleware.cors import CORSMiddleware
+from utils.gateway_config import (
+    gateway_config,
+    CORS_ALLOW_METHODS,
+    CORS_ALLOW_HEADERS,
+    CORS_EXPOSE_HEADERS,
+)
+
+
+class GatewayCORSMiddleware(CORSMiddleware):
+    """
+    Starlette's CORS middleware with the allowed origins taken from the
+    current gateway configuration, so a configuration reload applies to
+    preflight and simple requests without rebuilding the middleware stack.
+    """
+
+    def __init__(self, app, **kwargs):
+        kwargs.setdefault("allow_credentials", True)
+        kwargs.setdefault("allow_methods", CORS_ALLOW_METHODS)
+        kwargs.setdefault("allow_headers", CORS_ALLOW_HEADERS)
+        kwargs.setdefault("expose_headers", CORS_EXPOSE_HEADERS)
+        kwargs.setdefault("max_age", 600)  # Cache preflight requests for 10 minutes
+        super().__init__(app, **kwargs)
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        return origin in gateway_config.current.origin_set
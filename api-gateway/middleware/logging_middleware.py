@@ -1,91 +1,119 @@
 import os
 import time
+import random
 import logging
-import json
 import uuid
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from utils.logging_config import configure_logging, ACCESS_LOGGER_NAME
 
 # Get log level from environment with default to INFO
 log_level_name = os.getenv("LOG_LEVEL", "INFO").upper()
 log_level = getattr(logging, log_level_name, logging.INFO)
 
-# Configure logger
-logging.basicConfig(
-    level=log_level,
-    format="%(asctime)s - %(levelname)s - [%(name)s] %(message)s",
-)
+# Configure logging; records are written by a background thread
+configure_logging(log_level)
 logger = logging.getLogger("api_gateway")
 logger.setLevel(log_level)
 logger.info(f"Logger initialized with level: {log_level_name}")
 
+# Access log lines are independent of LOG_LEVEL and written as JSON
+access_logger = logging.getLogger(ACCESS_LOGGER_NAME)
+access_logger.setLevel(logging.INFO)
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware for logging requests and their processing time."""
-    
-    def __init__(self, app):
-        super().__init__(app)
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class RequestLoggingMiddleware:
+    """
+    Middleware writing one structured access log line per request.
+
+    Successful requests are sampled at ``ACCESS_LOG_SAMPLE_RATE``; client
+    and server errors, and requests slower than ``ACCESS_LOG_SLOW_MS``, are
+    always logged. Health checks are only logged when they fail, are slow,
+    or at DEBUG level.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
         # Define paths that should have minimal logging to reduce noise
-        self.minimal_logging_paths = ["/api/health", "/"]
-    
-    async def dispatch(self, request: Request, call_next):
+        self.minimal_logging_paths = ["/api/health"]
+        self.minimal_logging_exact = ["/"]
+        self.enabled = os.getenv("ACCESS_LOG_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+        self.sample_rate = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", 0.1))
+        self.slow_ms = float(os.getenv("ACCESS_LOG_SLOW_MS", 1000))
+        self.log_health_checks = log_level <= logging.DEBUG
+
+    def is_minimal(self, path):
+        return path in self.minimal_logging_exact or any(path.startswith(p) for p in self.minimal_logging_paths)
+
+    def should_log(self, path, status_code, duration_ms):
+        if status_code >= 400 or duration_ms >= self.slow_ms:
+            return True
+        if self.is_minimal(path):
+            return self.log_health_checks
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # Generate a unique request ID
         request_id = str(uuid.uuid4())
-        
+
         # Add the request ID to the request state
-        request.state.request_id = request_id
-        
-        start_time = time.time()
-        
-        # Get client IP and request details
-        client_host = request.client.host if request.client else "unknown"
-        request_details = f"{request.method} {request.url.path}"
-        path = request.url.path
-        
-        # Determine log level based on path
-        is_health_check = any(path.startswith(p) for p in self.minimal_logging_paths)
-        log_func = logger.debug if is_health_check else logger.info
-        
-        # Create structured log entry
-        log_data = {
-            "request_id": request_id,
-            "method": request.method,
-            "path": path,
-            "client_ip": client_host,
-            "client_agent": request.headers.get("user-agent", "unknown")
-        }
-        
-        # Log the incoming request
-        log_func(f"Request started: {request_details} from {client_host} [{request_id}]")
-        
+        scope.setdefault("state", {})["request_id"] = request_id
+
+        start_time = time.perf_counter()
+        status_code = 500
+        bytes_sent = 0
+        ttfb_ms = None
+
+        async def send_with_request_id(message: Message):
+            nonlocal status_code, bytes_sent, ttfb_ms
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                ttfb_ms = (time.perf_counter() - start_time) * 1000
+                # Add request ID to response headers for tracking
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            elif message["type"] == "http.response.body":
+                bytes_sent += len(message.get("body", b""))
+            await send(message)
+
+        error = None
         try:
             # Process the request
-            response = await call_next(request)
-            
-            # Calculate processing time
-            process_time = (time.time() - start_time) * 1000
-            
-            # Update log data with response info
-            log_data.update({
-                "status_code": response.status_code,
-                "processing_time_ms": round(process_time, 2)
-            })
-            
-            # Log based on status code
-            if response.status_code >= 500:
-                logger.error(f"Request failed: {request_details} - Status: {response.status_code} - [{request_id}] - {process_time:.2f}ms")
-            elif response.status_code >= 400:
-                logger.warning(f"Request error: {request_details} - Status: {response.status_code} - [{request_id}] - {process_time:.2f}ms")
-            else:
-                log_func(f"Request completed: {request_details} - Status: {response.status_code} - [{request_id}] - {process_time:.2f}ms")
-            
-            # Add request ID to response headers for tracking
-            response.headers["X-Request-ID"] = request_id
-            
-            return response
-            
+            await self.app(scope, receive, send_with_request_id)
         except Exception as e:
-            # Log exceptions
-            process_time = (time.time() - start_time) * 1000
-            logger.error(f"Request exception: {request_details} - {str(e)} - [{request_id}] - {process_time:.2f}ms", exc_info=True)
-            raise 
\ No newline at end of file
+            error = e
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            path = scope.get("root_path", "") + scope["path"]
+            if error is not None:
+                logger.error(
+                    f"Request exception: {scope['method']} {path} - {str(error)} - [{request_id}] - {duration_ms:.2f}ms",
+                    exc_info=error
+                )
+            if self.enabled and (error is not None or self.should_log(path, status_code, duration_ms)):
+                client = scope.get("client")
+                # The dict is serialized to JSON by the logging thread
+                access_logger.info({
+                    "ts": round(time.time(), 3),
+                    "request_id": request_id,
+                    "method": scope["method"],
+                    "path": path,
+                    "status": status_code,
+                    "duration_ms": round(duration_ms, 2),
+                    "ttfb_ms": round(ttfb_ms, 2) if ttfb_ms is not None else None,
+                    "bytes_out": bytes_sent,
+                    "client_ip": client[0] if client else None,
+                    "user_agent": _header(scope, b"user-agent"),
+                    "slow": duration_ms >= self.slow_ms,
+                })
@@ -0,0 +1,88 @@
+import time
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from utils.route_policy import route_policies
+from utils.metrics import (
+    KNOWN_METHODS,
+    requests_total,
+    request_duration,
+    requests_in_flight,
+    request_bytes,
+    response_bytes,
+)
+
+# Key of the matched route template in the ASGI scope state
+STATE_KEY = "metrics_route"
+
+
+async def record_route(request: Request):
+    """
+    App-wide dependency passing the path template of the matched route
+    (e.g. ``/api/vehicles/{path:path}``) to ``MetricsMiddleware``. Routing
+    runs inside the middleware stack, on a scope inner middleware may have
+    copied, so the template travels in the shared scope state.
+    """
+    route = request.scope.get("route")
+    if route is not None:
+        request.scope.setdefault("state", {})[STATE_KEY] = route.path
+
+
+class MetricsMiddleware:
+    """
+    Middleware recording request counts, latency and body sizes.
+
+    Requests are labeled with the template of the route that handled them,
+    so the number of series stays bounded no matter which paths clients
+    send. Requests answered before routing (401, 429, 404) are labeled with
+    the name of the route policy they match instead.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.policies = route_policies
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        if method not in KNOWN_METHODS:
+            method = "OTHER"
+        state = scope.setdefault("state", {})
+
+        start_time = time.perf_counter()
+        status_code = 500
+        bytes_in = 0
+        bytes_out = 0
+
+        async def receive_counted():
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                bytes_in += len(message.get("body", b""))
+            return message
+
+        async def send_counted(message: Message):
+            nonlocal status_code, bytes_out
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            requests_in_flight.dec()
+            route = state.get(STATE_KEY)
+            if route is None:
+                path = scope.get("root_path", "") + scope["path"]
+                route = self.policies.match(scope["method"], path).name
+            route_labels = (route,)
+            requests_total.inc((route, method, str(status_code)))
+            request_duration.observe(time.perf_counter() - start_time, (route, method))
+            if bytes_in:
+                request_bytes.inc(route_labels, bytes_in)
+            response_bytes.inc(route_labels, bytes_out)
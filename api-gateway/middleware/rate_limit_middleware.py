@@ -1,20 +1,20 @@
 import os
 import logging
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 from fastapi.responses import JSONResponse
-from collections import defaultdict
-from datetime import datetime, timedelta
+from .rate_limiter import create_rate_limiter
+from utils.route_policy import route_policies
+from utils.metrics import rate_limited_total
 
 logger = logging.getLogger("api_gateway")
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
+class RateLimitMiddleware:
     """Middleware for rate limiting requests by IP address."""
     
     def __init__(
         self, 
-        app, 
+        app: ASGIApp, 
         max_requests=None, 
         window_size=None
     ):
@@ -26,7 +26,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             max_requests: Maximum number of requests allowed in the window
             window_size: Time window in seconds
         """
-        super().__init__(app)
+        self.app = app
         
         # Check if we're in development mode
         self.is_development = os.getenv("ENVIRONMENT", "development").lower() == "development"
@@ -43,58 +43,81 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         
         logger.info(f"Rate limit configured: {self.max_requests} requests per {self.window_size} seconds")
         
-        self.request_counts = defaultdict(list)
-        # Dictionary to track when we last warned about an IP exceeding the rate limit
-        # to prevent log spam
-        self.last_warning = {}
+        # Constant-memory counters per IP, bounded by RATE_LIMIT_MAX_KEYS tracked IPs.
+        # RATE_LIMIT_BACKEND=shared makes all workers on the host share one quota.
+        self.limiter = create_rate_limiter(self.max_requests, self.window_size)
+
+        # Route policies pick a rate limit class. Classes configured with
+        # RATE_LIMIT_<CLASS>_MAX_REQUESTS / _WINDOW_SECONDS get their own
+        # counters; any other class shares the default limiter.
+        self.policies = route_policies
+        self.class_limiters = {}
     
-    async def dispatch(self, request: Request, call_next):
-        # Skip rate limiting for certain paths, like health checks
-        if request.url.path in ["/api/health", "/"]:
-            return await call_next(request)
-        
+    def limiter_for(self, rate_class):
+        """Return (limiter, max_requests, window_size) for a rate limit class."""
+        entry = self.class_limiters.get(rate_class)
+        if entry is None:
+            prefix = f"RATE_LIMIT_{rate_class.upper()}"
+            if rate_class != "default" and f"{prefix}_MAX_REQUESTS" in os.environ:
+                max_requests = int(os.getenv(f"{prefix}_MAX_REQUESTS"))
+                window_size = int(os.getenv(f"{prefix}_WINDOW_SECONDS", self.window_size))
+                limiter = create_rate_limiter(max_requests, window_size, name=rate_class)
+                logger.info(f"Rate limit class {rate_class}: {max_requests} requests per {window_size} seconds")
+                entry = (limiter, max_requests, window_size)
+            else:
+                entry = (self.limiter, self.max_requests, self.window_size)
+            self.class_limiters[rate_class] = entry
+        return entry
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # Skip OPTIONS requests to prevent CORS preflight issues
-        if request.method == "OPTIONS":
-            return await call_next(request)
+        if scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        # Skip rate limiting for exempt routes, like health checks
+        path = scope.get("root_path", "") + scope["path"]
+        rate_class = self.policies.match(scope["method"], path).rate_limit
+        if rate_class == "exempt":
+            await self.app(scope, receive, send)
+            return
             
         # Get client IP
-        client_ip = request.client.host if request.client else "unknown"
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
         
         # In development, don't rate limit localhost
         if self.is_development and client_ip in ["127.0.0.1", "localhost", "::1"]:
-            return await call_next(request)
-        
-        # Get current time
-        now = datetime.now()
-        
-        # Clean up old entries from the window
-        self.request_counts[client_ip] = [
-            timestamp for timestamp in self.request_counts[client_ip]
-            if timestamp > now - timedelta(seconds=self.window_size)
-        ]
+            await self.app(scope, receive, send)
+            return
         
+        limiter, max_requests, window_size = self.limiter_for(rate_class)
+
         # Check if the IP has exceeded the rate limit
-        if len(self.request_counts[client_ip]) >= self.max_requests:
+        if not limiter.hit(client_ip):
+            rate_limited_total.inc((rate_class,))
+
             # Only log a warning once per minute per IP to avoid log spam
-            if (client_ip not in self.last_warning or 
-                now - self.last_warning[client_ip] > timedelta(minutes=1)):
+            if limiter.should_warn(client_ip, 60):
                 logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-                self.last_warning[client_ip] = now
-                
+
             # Return a 429 response with Retry-After header
-            headers = {"Retry-After": str(self.window_size)}
-            return JSONResponse(
+            headers = {"Retry-After": str(window_size)}
+            response = JSONResponse(
                 status_code=429,
                 content={
                     "detail": "Too many requests. Please try again later.",
-                    "limit": self.max_requests,
-                    "window_seconds": self.window_size
+                    "limit": max_requests,
+                    "window_seconds": window_size
                 },
                 headers=headers
             )
-        
-        # Add current timestamp to the request counts
-        self.request_counts[client_ip].append(now)
+            await response(scope, receive, send)
+            return
         
         # Process the request
-        return await call_next(request) 
\ No newline at end of file
+        await self.app(scope, receive, send)
@@ -0,0 +1,382 @@
+import os
+import time
+import mmap
+import struct
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger("api_gateway")
+
+
+class _Window:
+    """Counters for one client key."""
+
+    __slots__ = ("index", "current", "previous", "warned_at")
+
+    def __init__(self, index):
+        self.index = index
+        self.current = 0
+        self.previous = 0
+        self.warned_at = None
+
+
+class SlidingWindowRateLimiter:
+    """
+    In-process sliding-window-counter rate limiter with constant time and
+    memory per key.
+
+    Each key keeps the request count of the current fixed window and of the
+    previous one. The number of requests in the sliding window ending now is
+    estimated as ``previous * (1 - elapsed_fraction) + current``, which needs
+    two integers per key instead of one timestamp per request.
+
+    Keys live in an LRU table bounded by ``max_keys``. Entries that have been
+    idle for more than one full window carry no state worth keeping and are
+    evicted as new requests arrive.
+    """
+
+    def __init__(self, max_requests, window_size, max_keys=100_000, clock=time.monotonic):
+        """
+        Initialize the limiter.
+
+        Args:
+            max_requests: Maximum number of requests allowed in the window
+            window_size: Time window in seconds
+            max_keys: Maximum number of client keys tracked at once
+            clock: Function returning the current time in seconds
+        """
+        self.max_requests = max_requests
+        self.window_size = window_size
+        self.max_keys = max_keys
+        self.clock = clock
+        self._windows = OrderedDict()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def _window(self, key, index):
+        window = self._windows.get(key)
+        if window is None:
+            window = _Window(index)
+            self._windows[key] = window
+            self._evict(index)
+        else:
+            self._windows.move_to_end(key)
+            if window.index != index:
+                # Roll forward: the old current window becomes the previous
+                # one, or both reset after a gap of more than one window
+                window.previous = window.current if window.index == index - 1 else 0
+                window.current = 0
+                window.index = index
+        return window
+
+    def _evict(self, index):
+        # The table is ordered by last use, so idle entries sit at the front
+        windows = self._windows
+        while windows:
+            key, oldest = next(iter(windows.items()))
+            if len(windows) > self.max_keys or oldest.index < index - 1:
+                del windows[key]
+            else:
+                break
+
+    def hit(self, key, now=None):
+        """
+        Record a request for ``key`` if it is within the limit.
+
+        Returns:
+            True if the request is allowed, False if it exceeds the limit
+        """
+        if now is None:
+            now = self.clock()
+        index = int(now // self.window_size)
+        window = self._window(key, index)
+
+        elapsed = (now - index * self.window_size) / self.window_size
+        estimated = window.previous * (1.0 - elapsed) + window.current
+        if estimated >= self.max_requests:
+            return False
+
+        window.current += 1
+        return True
+
+    def should_warn(self, key, interval, now=None):
+        """
+        Return True at most once per ``interval`` seconds for a limited key,
+        so repeated rejections do not flood the logs.
+        """
+        if now is None:
+            now = self.clock()
+        window = self._windows.get(key)
+        if window is None:
+            return True
+        if window.warned_at is None or now - window.warned_at > interval:
+            window.warned_at = now
+            return True
+        return False
+
+
+class SharedMemoryRateLimiter:
+    """
+    Sliding-window-counter limiter whose counters are shared by every gateway
+    worker on the host through a memory-mapped file.
+
+    Workers do not touch the shared table on every request. Each worker counts
+    hits locally and, per key, merges its pending count into the shared slot
+    (under a file lock) at most every ``sync_interval`` seconds or every
+    ``batch_size`` hits, reading back the host-wide totals at the same time.
+    Decisions use the last shared totals plus the local pending count, so the
+    effective limit can overshoot by at most one batch per worker.
+
+    The shared table is open-addressed with a short probe sequence; when all
+    candidate slots belong to other active keys, the slot with the oldest
+    window is reused.
+    """
+
+    # key hash, window index, current count, previous count
+    SLOT = struct.Struct("<QqII")
+    PROBES = 8
+
+    def __init__(
+        self,
+        max_requests,
+        window_size,
+        path,
+        slots=65536,
+        max_keys=100_000,
+        sync_interval=0.05,
+        batch_size=10,
+        clock=time.time,
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            max_requests: Maximum number of requests allowed in the window
+            window_size: Time window in seconds
+            path: Base path of the shared counter file (e.g. under /dev/shm)
+            slots: Number of slots in the shared table
+            max_keys: Maximum number of keys tracked locally by this worker
+            sync_interval: Maximum seconds between merges of a key's local count
+            batch_size: Maximum local hits on a key before it is merged
+            clock: Function returning the current wall-clock time in seconds
+        """
+        self.max_requests = max_requests
+        self.window_size = window_size
+        self.slots = slots
+        self.max_keys = max_keys
+        self.sync_interval = sync_interval
+        self.batch_size = batch_size
+        self.clock = clock
+
+        # The slot count is part of the name so workers never map files of
+        # different sizes
+        self.path = f"{path}-{slots}"
+        size = slots * self.SLOT.size
+        self._file = open(self.path, "a+b")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._file.fileno()).st_size < size:
+                self._file.truncate(size)
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+        # key -> [hash, window index, shared current, shared previous, pending, synced_at, warned_at]
+        self._local = OrderedDict()
+
+    def __len__(self):
+        return len(self._local)
+
+    @staticmethod
+    def _hash(key):
+        # Python's hash() is randomized per process, so use a stable digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") | 1
+
+    @staticmethod
+    def _roll(slot_index, current, previous, index):
+        """Move a slot's counts forward to window ``index``, never back."""
+        if slot_index >= index:
+            return slot_index, current, previous
+        return index, 0, current if slot_index == index - 1 else 0
+
+    def _sync(self, state, index):
+        """
+        Merge the pending count for a key and read back the shared totals.
+        Pending hits are counted in the window they were recorded in
+        (``state[1]``), which may be the previous one by now.
+        """
+        key_hash = state[0]
+        slot_size = self.SLOT.size
+        start = key_hash % self.slots
+
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            chosen = None
+            free = None
+            oldest = None
+            oldest_index = None
+            for probe in range(self.PROBES):
+                offset = ((start + probe) % self.slots) * slot_size
+                slot_hash, slot_index, current, previous = self.SLOT.unpack_from(self._map, offset)
+                if slot_hash == key_hash:
+                    chosen = (offset, slot_index, current, previous)
+                    break
+                if slot_hash == 0:
+                    # Slots are never emptied, so the key's own slot cannot
+                    # lie past an empty one
+                    if free is None:
+                        free = offset
+                    break
+                # Stale slots can be taken over, but only once the key's own
+                # slot is known not to come later in the sequence
+                if slot_index < index - 1:
+                    if free is None:
+                        free = offset
+                elif oldest_index is None or slot_index < oldest_index:
+                    oldest_index = slot_index
+                    oldest = offset
+
+            if chosen is None:
+                chosen = (free if free is not None else oldest, index, 0, 0)
+            offset, slot_index, current, previous = chosen
+            pending, pending_index = state[4], state[1]
+            if pending:
+                if slot_index < pending_index:
+                    slot_index, current, previous = self._roll(slot_index, current, previous, pending_index)
+                if slot_index == pending_index:
+                    current += pending
+                elif slot_index == pending_index + 1:
+                    # Another worker already rolled the slot over
+                    previous += pending
+            slot_index, current, previous = self._roll(slot_index, current, previous, index)
+            self.SLOT.pack_into(self._map, offset, key_hash, slot_index, current, previous)
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+        state[1] = index
+        state[2] = current
+        state[3] = previous
+        state[4] = 0
+
+    def _state(self, key, now, index):
+        state = self._local.get(key)
+        if state is None:
+            state = [self._hash(key), index, 0, 0, 0, 0.0, None]
+            self._local[key] = state
+            while len(self._local) > self.max_keys:
+                _, evicted = self._local.popitem(last=False)
+                # Hand over counts that still matter to the other workers
+                if evicted[4] and evicted[1] >= index - 1:
+                    self._sync(evicted, index)
+            self._sync(state, index)
+            state[5] = now
+        else:
+            self._local.move_to_end(key)
+            if state[1] != index or state[4] >= self.batch_size or now - state[5] >= self.sync_interval:
+                self._sync(state, index)
+                state[5] = now
+        return state
+
+    def hit(self, key, now=None):
+        """
+        Record a request for ``key`` if it is within the host-wide limit.
+
+        Returns:
+            True if the request is allowed, False if it exceeds the limit
+        """
+        if now is None:
+            now = self.clock()
+        index = int(now // self.window_size)
+        state = self._state(key, now, index)
+
+        elapsed = (now - index * self.window_size) / self.window_size
+        estimated = state[3] * (1.0 - elapsed) + state[2] + state[4]
+        if estimated >= self.max_requests:
+            return False
+
+        state[4] += 1
+        return True
+
+    def should_warn(self, key, interval, now=None):
+        """
+        Return True at most once per ``interval`` seconds for a limited key,
+        so repeated rejections do not flood the logs of this worker.
+        """
+        if now is None:
+            now = self.clock()
+        state = self._local.get(key)
+        if state is None:
+            return True
+        if state[6] is None or now - state[6] > interval:
+            state[6] = now
+            return True
+        return False
+
+    def close(self):
+        """Hand pending counts to the other workers and unmap the shared file."""
+        if self._map.closed:
+            return
+        for state in self._local.values():
+            if state[4]:
+                self._sync(state, state[1])
+        self._local.clear()
+        self._map.close()
+        self._file.close()
+
+
+# Shared limiters created by this worker, closed on shutdown
+_shared_limiters = []
+
+
+def close_rate_limiters():
+    """Close the shared counter files of every limiter created so far."""
+    while _shared_limiters:
+        _shared_limiters.pop().close()
+
+
+def create_rate_limiter(max_requests, window_size, name="default"):
+    """
+    Build the rate limiter backend selected by ``RATE_LIMIT_BACKEND``.
+
+    ``name`` identifies the rate limit class, so each class gets its own
+    shared counter file.
+
+    ``memory`` (default) keeps counters in this process. ``shared`` keeps them
+    in a memory-mapped file so every worker on the host enforces one quota.
+    """
+    max_keys = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+
+    if backend == "shared":
+        if fcntl is None:
+            logger.warning("Shared rate limit backend needs fcntl, falling back to in-process counters")
+        else:
+            default_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            path = os.getenv("RATE_LIMIT_SHARED_PATH", os.path.join(default_dir, "api-gateway-ratelimit"))
+            if name != "default":
+                path = f"{path}-{name}"
+            limiter = SharedMemoryRateLimiter(
+                max_requests,
+                window_size,
+                path,
+                slots=int(os.getenv("RATE_LIMIT_SHARED_SLOTS", 65536)),
+                max_keys=max_keys,
+                sync_interval=float(os.getenv("RATE_LIMIT_SYNC_INTERVAL", 0.05)),
+                batch_size=int(os.getenv("RATE_LIMIT_SYNC_BATCH", 10)),
+            )
+            logger.info(f"Using shared rate limit counters at {limiter.path}")
+            _shared_limiters.append(limiter)
+            return limiter
+    elif backend != "memory":
+        logger.warning(f"Unknown RATE_LIMIT_BACKEND {backend!r}, using in-process counters")
+
+    return SlidingWindowRateLimiter(max_requests, window_size, max_keys=max_keys)
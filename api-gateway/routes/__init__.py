@@ -9,6 +9,9 @@ from .admin_routes import router as admin_router
 from .support_routes import router as support_router
 from .health_routes import router as health_router
 from .rating_routes import router as rating_router
+from .gateway_routes import router as gateway_router
+from .batch_routes import router as batch_router
+from .file_routes import router as file_router
 
 __all__ = [
     "user_router",
@@ -19,5 +22,8 @@ __all__ = [
     "admin_router",
     "support_router",
     "health_router",
-    "rating_router"
+    "rating_router",
+    "gateway_router",
+    "batch_router",
+    "file_router"
 ]
\ No newline at end of file
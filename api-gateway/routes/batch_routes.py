@@ -0,0 +1,68 @@
+import json
+import logging
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from starlette.responses import Response, StreamingResponse
+from utils.batch import BatchSettings, BatchTooLarge, parse_batch, read_body, run_batch
+from utils.proxy_request import encode_body
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+router = APIRouter(tags=["Batch"])
+
+settings = BatchSettings.from_env()
+
+
+def _wants_stream(request, payload):
+    value = request.query_params.get("stream", "")
+    return value.lower() in ("1", "true", "yes", "on") or payload.get("stream") is True
+
+
+@router.post("/api/batch")
+async def batch(request: Request):
+    """
+    Run several gateway requests in one round trip.
+
+    Each sub-request goes through the same middleware (auth, rate limiting)
+    and routes as if it had been sent on its own, inheriting this request's
+    headers unless it sets its own. Up to ``BATCH_CONCURRENCY`` run at once.
+    Results come back in request order as ``{"responses": [...]}``, each with
+    its ``id``, ``status``, ``headers`` and ``body``; with ``stream`` set
+    (in the body or the query string), they are sent as newline-delimited
+    JSON as soon as each one completes.
+    """
+    try:
+        body = await read_body(request, settings.max_body_bytes)
+    except BatchTooLarge as e:
+        return JSONResponse(status_code=413, content={"detail": str(e)})
+    try:
+        payload = json.loads(body or b"null")
+        items = parse_batch(payload, settings)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"detail": f"Invalid batch request: {e}"})
+
+    logger.info(f"Running batch of {len(items)} requests")
+    results = run_batch(request.app, request.scope, items, settings.concurrency)
+
+    if _wants_stream(request, payload):
+        async def lines():
+            try:
+                async for _, result in results:
+                    yield json.dumps(result).encode("utf-8") + b"\n"
+            finally:
+                # Cancels sub-requests still running if the client went away
+                await results.aclose()
+
+        # Not compressed: the compressor would hold results back until its
+        # buffer fills, defeating streaming
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    responses = [None] * len(items)
+    async for index, result in results:
+        responses[index] = result
+
+    headers = {}
+    content = json.dumps({"responses": responses}).encode("utf-8")
+    content = await encode_body(request, 200, headers, content, "application/json")
+    return Response(content=content, status_code=200, headers=headers, media_type="application/json")
@@ -0,0 +1,87 @@
+import logging
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from utils.file_server import file_server
+from utils.image_derivatives import image_derivatives
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+router = APIRouter(tags=["Files"])
+
+# /api/check-file and /api/serve-file take paths relative to the app
+# directory; only those inside the uploads tree are served
+UPLOADS_PREFIX = "uploads"
+
+
+def uploads_relative(file_path):
+    """Return ``file_path`` relative to the uploads root, or None if it is outside it."""
+    first, _, rest = file_path.lstrip("/").partition("/")
+    return rest if first == UPLOADS_PREFIX else None
+
+
+@router.api_route("/uploads/{file_path:path}", methods=["GET", "HEAD"])
+async def serve_upload(request: Request, file_path: str):
+    """
+    Serve an uploaded file with validators, conditional and range support.
+    """
+    return await file_server.response(request, file_path)
+
+
+@router.api_route("/api/images/{file_path:path}", methods=["GET", "HEAD"])
+async def serve_image(request: Request, file_path: str):
+    """
+    Serve a resized copy of an uploaded image, e.g.
+    ``/api/images/vehicles/1.jpg?w=320&format=webp&q=75``. ``w`` is rounded
+    up to the next width preset; without ``format`` WebP is sent to clients
+    that accept it and JPEG to the others.
+    """
+    return await image_derivatives.response(request, file_path)
+
+
+@router.get("/api/check-file/{file_path:path}")
+async def check_file(file_path: str):
+    """
+    Check if a file exists and return its information.
+    """
+    relative = uploads_relative(file_path)
+    path = file_server.resolve(relative) if relative is not None else None
+    if path is None:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid file path"}
+        )
+
+    logger.debug(f"Checking file: {path}")
+
+    entry = await file_server.stat(path)
+    if not entry.exists:
+        return {"exists": False, "path": path}
+
+    file_info = {
+        "exists": True,
+        "path": path,
+        "size": entry.size,
+        "is_file": entry.is_file,
+        "is_directory": entry.is_dir
+    }
+
+    # If it's a directory, list contents
+    if entry.is_dir:
+        file_info["contents"] = await file_server.listdir(path)
+
+    return file_info
+
+
+@router.api_route("/api/serve-file/{file_path:path}", methods=["GET", "HEAD"])
+async def serve_file(request: Request, file_path: str):
+    """
+    Serve a file from the uploads tree, e.g. ``/api/serve-file/uploads/vehicles/1.jpg``.
+    """
+    relative = uploads_relative(file_path)
+    if relative is None:
+        return JSONResponse(
+            status_code=404,
+            content={"error": f"File not found: {file_path}"}
+        )
+    return await file_server.response(request, relative)
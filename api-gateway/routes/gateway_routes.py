@@ -0,0 +1,33 @@
+import logging
+from fastapi import APIRouter, Request
+from utils.gateway_config import gateway_config
+from utils.operator_auth import authorize
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+router = APIRouter(prefix="/api/gateway", tags=["Gateway"])
+
+
+@router.get("/config")
+async def get_config(request: Request):
+    """
+    Show the active gateway configuration (origins and service URLs).
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return gateway_config.current.describe()
+
+
+@router.post("/config/reload")
+async def reload_config(request: Request):
+    """
+    Re-read the environment file and atomically swap in the new configuration.
+    Requests already in flight finish on the previous one. Other workers
+    follow within a second through the shared reload file.
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return gateway_config.reload().describe()
@@ -1,8 +1,19 @@
-import os
 import logging
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
 from datetime import datetime
+from utils.response_cache import response_cache
+from utils.single_flight import single_flight
+from utils.circuit_breaker import circuit_breakers
+from utils.concurrency_limiter import concurrency_limiters
+from utils.retry_policy import retry_policies
+from utils.load_balancer import load_balancers
+from utils.compression import response_compressor
+from utils.metrics import metrics, CONTENT_TYPE
+from utils.file_server import file_server
+from utils.image_derivatives import image_derivatives
+from utils.health_checker import upstream_health
+from utils.operator_auth import authorize, is_operator
 
 # Configure logging
 logger = logging.getLogger("api_gateway")
@@ -41,61 +52,122 @@ async def health_check():
         "service": "api-gateway"
     }
 
-@router.get("/api/check-file/{file_path:path}")
-async def check_file(file_path: str):
-    """
-    Check if a file exists and return its information.
-    """
-    # Check for directory traversal attacks
-    if '..' in file_path:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "Invalid file path"}
-        )
-    
-    # Construct the full path
-    full_path = f"/app/{file_path}"
-    
-    logger.info(f"Checking file: {full_path}")
-    
-    if os.path.exists(full_path):
-        file_info = {
-            "exists": True,
-            "path": full_path,
-            "size": os.path.getsize(full_path),
-            "is_file": os.path.isfile(full_path),
-            "is_directory": os.path.isdir(full_path)
-        }
-        
-        # If it's a directory, list contents
-        if os.path.isdir(full_path):
-            file_info["contents"] = os.listdir(full_path)
-            
-        return file_info
-    else:
-        return {"exists": False, "path": full_path}
+@router.get("/api/health/ready")
+async def readiness_check(request: Request):
+    """
+    Readiness check from the background health checks. Answers 503 until
+    the services the gateway needs are up. Operators also get per-service
+    status and probe latency.
+    """
+    status_code, body = upstream_health.ready_response(detailed=is_operator(request))
+    return Response(
+        content=body, status_code=status_code, media_type="application/json",
+        headers={"Cache-Control": "no-store"},
+    )
+
+@router.get("/api/health/cache")
+async def cache_stats(request: Request):
+    """
+    Report hit/miss/eviction counters for the gateway response cache.
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return response_cache.stats()
+
+@router.get("/api/health/coalescing")
+async def coalescing_stats(request: Request):
+    """
+    Report how many proxied reads started or joined a shared upstream call.
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return single_flight.stats()
+
+@router.get("/api/health/circuits")
+async def circuit_stats(request: Request):
+    """
+    Report the circuit breaker state and rolling-window counts per upstream.
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return circuit_breakers.stats()
+
+@router.get("/api/health/concurrency")
+async def concurrency_stats(request: Request):
+    """
+    Report the adaptive concurrency limit, in-flight and queued requests,
+    and shed requests by priority per upstream.
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return concurrency_limiters.stats()
+
+@router.get("/api/health/retries")
+async def retry_stats(request: Request):
+    """
+    Report retries, hedged requests and retry budgets per upstream, and the
+    current hedge delay per route.
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return retry_policies.stats()
+
+@router.get("/api/health/endpoints")
+async def endpoint_stats(request: Request):
+    """
+    Report load, latency and ejection state of each instance of services
+    configured with several endpoints.
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return load_balancers.stats()
+
+@router.get("/api/health/compression")
+async def compression_stats(request: Request):
+    """
+    Report how many responses were compressed or passed through compressed,
+    and the bytes saved.
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return response_compressor.stats()
 
-@router.get("/api/serve-file/{file_path:path}")
-async def serve_file(file_path: str):
-    """
-    Directly serve a file from the filesystem.
-    """
-    # Check for directory traversal attacks
-    if '..' in file_path:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "Invalid file path"}
-        )
-    
-    # Construct the full path
-    full_path = f"/app/{file_path}"
-    
-    logger.info(f"Serving file: {full_path}")
-    
-    if os.path.exists(full_path) and os.path.isfile(full_path):
-        return FileResponse(path=full_path)
-    else:
-        return JSONResponse(
-            status_code=404,
-            content={"error": f"File not found: {file_path}"}
-        ) 
\ No newline at end of file
+@router.get("/api/health/files")
+async def file_stats(request: Request):
+    """
+    Report stat cache usage and conditional/range responses of the uploads
+    file server.
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return file_server.stats()
+
+@router.get("/api/health/images")
+async def image_stats(request: Request):
+    """
+    Report the image derivative cache: entries, bytes on disk, encodes,
+    coalesced requests and evictions.
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return image_derivatives.stats()
+
+@router.get("/api/metrics")
+async def metrics_endpoint(request: Request):
+    """
+    Expose request, upstream and connection pool metrics in the Prometheus
+    text format.
+    """
+    error = authorize(request)
+    if error is not None:
+        return error
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
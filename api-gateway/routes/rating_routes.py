@@ -1,33 +1,31 @@
-import os
 import logging
 from fastapi import APIRouter, Request
 from utils.proxy_request import proxy_request
+from utils.gateway_config import service_url
 
 logger = logging.getLogger("api_gateway")
 
-RATING_SERVICE_URL = os.getenv("RATING_SERVICE_URL", "http://rating-service:3008")
-
 router = APIRouter(tags=["Ratings"])
 
 @router.api_route("/ratings", methods=["GET", "POST"])
 async def rating_service_root(request: Request):
     logger.info("Routing rating root request")
-    return await proxy_request(request, f"{RATING_SERVICE_URL}/")
+    return await proxy_request(request, f"{service_url('rating')}/")
 
 # Add specific route for user ratings
 @router.api_route("/ratings/user/{user_id}", methods=["GET"])
 async def rating_service_user_ratings(request: Request, user_id: str):
     logger.info(f"Routing rating request for user: {user_id}")
-    return await proxy_request(request, f"{RATING_SERVICE_URL}/user/{user_id}")
+    return await proxy_request(request, f"{service_url('rating')}/user/{user_id}")
 
 # Special route for user/all to get all user ratings
 @router.api_route("/ratings/user/all", methods=["GET"])
 async def rating_service_all_user_ratings(request: Request):
     logger.info("Routing request for all user ratings")
-    return await proxy_request(request, f"{RATING_SERVICE_URL}/all-ratings")
+    return await proxy_request(request, f"{service_url('rating')}/all-ratings")
 
 @router.api_route("/ratings/{path:path}", methods=["GET", "DELETE"])
 @router.api_route("/ratings/{path:path}", methods=["GET", "PUT", "DELETE"])
 async def rating_service_routes(request: Request, path: str):
     logger.info(f"Routing rating request to: {path}")
-    return await proxy_request(request, f"{RATING_SERVICE_URL}/{path}")
\ No newline at end of file
+    return await proxy_request(request, f"{service_url('rating')}/{path}", coalesce=True)
\ No newline at end of file
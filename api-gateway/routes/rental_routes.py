@@ -1,14 +1,11 @@
-import os
 import logging
 from fastapi import APIRouter, Request
 from utils.proxy_request import proxy_request
+from utils.gateway_config import service_url
 
 # Configure logging
 logger = logging.getLogger("api_gateway")
 
-# Load environment variables
-RENTAL_SERVICE_URL = os.getenv("RENTAL_SERVICE_URL", "http://rental-service:3003")
-
 # Create router without prefix
 router = APIRouter(tags=["Rentals"])
 
@@ -17,7 +14,7 @@ router = APIRouter(tags=["Rentals"])
 async def check_rental_availability(request: Request):
     """Handle rental availability check requests"""
     logger.info("Routing rental availability request")
-    target_url = f"{RENTAL_SERVICE_URL}/rentals/availability"
+    target_url = f"{service_url('rental')}/rentals/availability"
     logger.info(f"Proxying to: {target_url}")
     return await proxy_request(request, target_url)
 
@@ -26,6 +23,6 @@ async def check_rental_availability(request: Request):
 async def rental_service_routes(request: Request, path: str):
     """Handle all other rental-related requests"""
     logger.info(f"Routing rental request to path: {path}")
-    target_url = f"{RENTAL_SERVICE_URL}/rentals/{path}"
+    target_url = f"{service_url('rental')}/rentals/{path}"
     logger.info(f"Proxying to: {target_url}")
     return await proxy_request(request, target_url) 
\ No newline at end of file
@@ -1,14 +1,11 @@
-import os
 import logging
 from fastapi import APIRouter, Request
 from utils.proxy_request import proxy_request
+from utils.gateway_config import service_url
 
 # Configure logging
 logger = logging.getLogger("api_gateway")
 
-# Load environment variables
-USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user-service:3001")
-
 router = APIRouter(tags=["Users"])
 
 # Special Routes
@@ -18,7 +15,7 @@ async def get_user_profile(request: Request):
     Route profile requests to the user service endpoint.
     """
     logger.info("Routing user profile request to user service")
-    return await proxy_request(request, f"{USER_SERVICE_URL}/users/profile")
+    return await proxy_request(request, f"{service_url('user')}/users/profile")
 
 # User Routes
 @router.api_route("/users/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
@@ -34,7 +31,7 @@ async def user_service_routes(request: Request, path: str):
         Response from the user service
     """
     logger.info(f"Routing user request to: {path}")
-    return await proxy_request(request, f"{USER_SERVICE_URL}/users/{path}")
+    return await proxy_request(request, f"{service_url('user')}/users/{path}")
 
 # Auth Routes - Map to the correct endpoints in user service
 @router.post("/auth/login")
@@ -43,7 +40,7 @@ async def auth_login(request: Request):
     Route login requests to the user service login endpoint.
     """
     logger.info("Routing login request to user service")
-    return await proxy_request(request, f"{USER_SERVICE_URL}/users/login")
+    return await proxy_request(request, f"{service_url('user')}/users/login")
 
 @router.post("/auth/register")
 async def auth_register(request: Request):
@@ -51,7 +48,7 @@ async def auth_register(request: Request):
     Route register requests to the user service register endpoint.
     """
     logger.info("Routing register request to user service")
-    return await proxy_request(request, f"{USER_SERVICE_URL}/users/register")
+    return await proxy_request(request, f"{service_url('user')}/users/register")
 
 # Fallback for other auth routes
 @router.api_route("/auth/{path:path}", methods=["GET", "POST", "PATCH", "DELETE"])
@@ -67,4 +64,4 @@ async def auth_routes(request: Request, path: str):
         Response from the user service
     """
     logger.info(f"Routing auth request to: {path}")
-    return await proxy_request(request, f"{USER_SERVICE_URL}/users/{path}") 
\ No newline at end of file
+    return await proxy_request(request, f"{service_url('user')}/users/{path}") 
\ No newline at end of file
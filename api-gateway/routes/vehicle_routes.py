@@ -1,23 +1,65 @@
-import os
+import json
 import logging
+from urllib.parse import quote, urlencode
 from fastapi import APIRouter, Request
-from utils.proxy_request import proxy_request
+from starlette.responses import Response
+from utils.proxy_request import proxy_request, encode_body
+from utils.gateway_config import service_url
+from utils.composition import Part, compose, part_timeout
 
 # Configure logging
 logger = logging.getLogger("api_gateway")
 
-# Load environment variables
-VEHICLE_SERVICE_URL = os.getenv("VEHICLE_SERVICE_URL", "http://vehicle-service:3002")
-
 router = APIRouter(tags=["Vehicles"])
 
 # Vehicle Routes
 @router.api_route("/vehicles", methods=["GET", "POST", "PATCH"])
 async def vehicle_service_root(request: Request):
     logger.info("Routing vehicle root request")
-    return await proxy_request(request, f"{VEHICLE_SERVICE_URL}/vehicles")
+    return await proxy_request(request, f"{service_url('vehicle')}/vehicles", coalesce=True)
 
 @router.api_route("/vehicles/{path:path}", methods=["GET", "POST", "DELETE", "PATCH"])
 async def vehicle_service_routes(request: Request, path: str):
     logger.info(f"Routing vehicle request to: {path}")
-    return await proxy_request(request, f"{VEHICLE_SERVICE_URL}/vehicles/{path}")
\ No newline at end of file
+    return await proxy_request(request, f"{service_url('vehicle')}/vehicles/{path}", coalesce=True)
+
+# Composed vehicle page: vehicle, ratings and (for a date range) availability
+@router.get("/api/vehicles/{vehicle_id}/details")
+async def vehicle_details(request: Request, vehicle_id: str):
+    """
+    Fetch a vehicle, its ratings and, when ``startDate`` and ``endDate`` are
+    given, its availability in parallel and return them as one document.
+    Each part has its own timeout (``VEHICLE_DETAILS_<PART>_TIMEOUT``, else
+    ``VEHICLE_DETAILS_TIMEOUT``, default 2s); a slow or failing ratings or
+    availability part is reported under ``errors`` instead of failing the
+    page, while a failing vehicle part fails it with that part's status.
+    """
+    # Quoted for path segments only; urlencode quotes the query itself
+    segment = quote(vehicle_id, safe="")
+    parts = [
+        Part(
+            "vehicle", f"/vehicles/{segment}", f"{service_url('vehicle')}/vehicles/{segment}",
+            timeout=part_timeout("VEHICLE_DETAILS", "vehicle", 2.0), required=True
+        ),
+        Part(
+            "ratings", f"/ratings/{segment}", f"{service_url('rating')}/{segment}",
+            timeout=part_timeout("VEHICLE_DETAILS", "ratings", 2.0)
+        ),
+    ]
+    start_date = request.query_params.get("startDate")
+    end_date = request.query_params.get("endDate")
+    if start_date and end_date:
+        query = urlencode({"vehicleId": vehicle_id, "startDate": start_date, "endDate": end_date})
+        parts.append(Part(
+            "availability", "/rentals/availability", f"{service_url('rental')}/rentals/availability",
+            query=query, timeout=part_timeout("VEHICLE_DETAILS", "availability", 2.0)
+        ))
+
+    logger.info(f"Composing vehicle details for: {vehicle_id}")
+    status_code, payload = await compose(request, parts)
+    # Availability is null when no date range was asked for
+    payload = {"vehicle": None, "ratings": None, "availability": None, **payload}
+
+    headers = {}
+    content = await encode_body(request, status_code, headers, json.dumps(payload).encode("utf-8"), "application/json")
+    return Response(content=content, status_code=status_code, headers=headers, media_type="application/json")
@@ -0,0 +1,154 @@
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from middleware.auth_middleware import AuthMiddleware
+from utils.jwt_verifier import InvalidTokenError, JWTVerifier
+
+SECRET = "test-secret"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def make_token(claims, secret=SECRET, alg="HS256"):
+    header = b64(json.dumps({"alg": alg, "typ": "JWT"}).encode("utf-8"))
+    payload = b64(json.dumps(claims).encode("utf-8"))
+    digest = {"HS256": hashlib.sha256, "HS512": hashlib.sha512}.get(alg, hashlib.sha256)
+    signature = b64(hmac.new(secret.encode("utf-8"), f"{header}.{payload}".encode("ascii"), digest).digest())
+    return f"{header}.{payload}.{signature}"
+
+
+def make_verifier(**kwargs):
+    return JWTVerifier(SECRET, clock=FakeClock(), **kwargs)
+
+
+class TestJWTVerifier:
+    def test_valid_token_returns_its_claims(self):
+        verifier = make_verifier()
+        claims = {"userId": "u1", "exp": verifier.clock.now + 60}
+
+        assert verifier.verify(make_token(claims)) == claims
+        assert verifier.verify(make_token(claims, alg="HS512")) == claims
+
+    @pytest.mark.parametrize("token, message", [
+        ("not-a-token", "Malformed"),
+        ("a.b.c", "Malformed"),
+        (make_token({"userId": "u1"}, secret="other-secret"), "Invalid signature"),
+        (make_token({"userId": "u1"}, alg="none"), "Unsupported algorithm"),
+    ])
+    def test_bad_tokens_are_rejected(self, token, message):
+        verifier = make_verifier()
+
+        with pytest.raises(InvalidTokenError, match=message):
+            verifier.verify(token)
+        assert verifier.stats()["rejected"] == 1
+
+    def test_tampered_claims_break_the_signature(self):
+        header, _, signature = make_token({"userId": "u1", "role": "user"}).split(".")
+        forged = b64(json.dumps({"userId": "u1", "role": "admin"}).encode("utf-8"))
+
+        with pytest.raises(InvalidTokenError, match="Invalid signature"):
+            make_verifier().verify(f"{header}.{forged}.{signature}")
+
+    def test_expired_and_not_yet_valid_tokens_are_rejected(self):
+        verifier = make_verifier()
+        now = verifier.clock.now
+
+        with pytest.raises(InvalidTokenError, match="expired"):
+            verifier.verify(make_token({"exp": now - 1}))
+        with pytest.raises(InvalidTokenError, match="not yet valid"):
+            verifier.verify(make_token({"nbf": now + 60}))
+
+    def test_leeway_tolerates_clock_skew(self):
+        verifier = make_verifier(leeway=30)
+        now = verifier.clock.now
+
+        assert verifier.verify(make_token({"exp": now - 10}))
+        with pytest.raises(InvalidTokenError):
+            verifier.verify(make_token({"exp": now - 31}))
+
+    def test_cached_token_is_rejected_once_it_expires(self):
+        verifier = make_verifier()
+        token = make_token({"userId": "u1", "exp": verifier.clock.now + 60})
+        verifier.verify(token)
+        verifier.verify(token)
+        assert verifier.stats()["hits"] == 1
+
+        verifier.clock.now += 61
+        with pytest.raises(InvalidTokenError, match="expired"):
+            verifier.verify(token)
+        assert verifier.stats()["cached_tokens"] == 0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """An AuthMiddleware verifying tokens in front of an app that echoes the headers it got."""
+    monkeypatch.setenv("GATEWAY_JWT_VERIFY", "true")
+    monkeypatch.setenv("JWT_SECRET", SECRET)
+
+    async def echo(scope, receive, send):
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        body = json.dumps(headers).encode("utf-8")
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    middleware = AuthMiddleware(echo)
+    middleware.verifier.clock = FakeClock()
+    return TestClient(middleware)
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_protected_route_requires_a_token(client):
+    response = client.get("/rentals/5")
+
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Authentication required"}
+
+
+@pytest.mark.parametrize("token", [
+    "garbage",
+    make_token({"userId": "u1"}, secret="other-secret"),
+    make_token({"userId": "u1", "exp": 1_600_000_000}),
+])
+def test_protected_route_rejects_bad_or_expired_tokens(client, token):
+    response = client.get("/rentals/5", headers=bearer(token))
+
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Invalid or expired token"}
+
+
+def test_valid_token_sets_identity_headers_and_strips_forged_ones(client):
+    token = make_token({"userId": "u1", "email": "a@example.com", "role": "user"})
+    response = client.get("/rentals/5", headers={**bearer(token), "X-User-Role": "admin"})
+
+    headers = response.json()
+    assert response.status_code == 200
+    assert headers["x-user-id"] == "u1"
+    assert headers["x-user-role"] == "user"
+    assert headers["authorization"] == f"Bearer {token}"
+
+
+def test_public_route_drops_a_bad_token_instead_of_rejecting(client):
+    response = client.get("/vehicles", headers={**bearer("garbage"), "X-User-Id": "u2"})
+
+    headers = response.json()
+    assert response.status_code == 200
+    assert "authorization" not in headers
+    assert "x-user-id" not in headers
@@ -0,0 +1,168 @@
+import asyncio
+import json
+from dataclasses import replace
+
+import pytest
+from fastapi import FastAPI, Request
+from starlette.testclient import TestClient
+
+from routes import batch_routes
+from utils.batch import BatchError, BatchSettings, build_scope, parse_batch, run_batch
+
+PARENT = {
+    "type": "http",
+    "method": "POST",
+    "scheme": "http",
+    "server": ("testserver", 80),
+    "client": ("10.0.0.1", 5000),
+    "root_path": "",
+    "path": "/api/batch",
+    "headers": [
+        (b"authorization", b"Bearer parent"),
+        (b"content-type", b"application/json"),
+        (b"content-length", b"512"),
+        (b"accept-encoding", b"gzip"),
+    ],
+}
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.api_route("/echo/{name}", methods=["GET", "POST"])
+    async def echo(name: str, request: Request):
+        return {
+            "name": name,
+            "raw_path": request.scope["raw_path"].decode(),
+            "authorization": request.headers.get("authorization"),
+            "body": (await request.body()).decode(),
+        }
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(0.05)
+        return {"slow": True}
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    return app
+
+
+def run(app, requests, concurrency=6):
+    items = parse_batch({"requests": requests}, BatchSettings())
+
+    async def scenario():
+        return [(index, result) async for index, result in run_batch(app, PARENT, items, concurrency)]
+
+    return asyncio.run(scenario())
+
+
+def by_id(completed):
+    return {result["id"]: result for _, result in completed}
+
+
+def test_invalid_items_are_answered_in_place():
+    items = parse_batch({"requests": [
+        {"id": "a", "path": "/echo/x"},
+        {"id": "b", "path": "no-slash"},
+        {"id": "c", "method": "TRACE", "path": "/echo/x"},
+        {"id": "d", "path": "/api/batch"},
+        "not an object",
+    ]}, BatchSettings())
+
+    assert [item.error is None for item in items] == [True, False, False, False, False]
+    assert [item.id for item in items] == ["a", "b", "c", "d", "4"]
+
+
+@pytest.mark.parametrize("payload", [None, {}, {"requests": []}, {"requests": [{"path": "/x"}] * 3}])
+def test_unusable_batches_are_refused(payload):
+    with pytest.raises(BatchError):
+        parse_batch(payload, BatchSettings(max_requests=2))
+
+
+def test_scope_inherits_parent_headers_unless_the_item_sets_its_own():
+    inherited, overridden = parse_batch({"requests": [
+        {"path": "/echo/a%20b?x=1"},
+        {"path": "/echo/c", "headers": {"Authorization": "Bearer item"}, "body": {"n": 1}},
+    ]}, BatchSettings())
+
+    scope = build_scope(PARENT, inherited)
+    headers = dict(scope["headers"])
+    assert headers[b"authorization"] == b"Bearer parent"
+    assert headers[b"accept-encoding"] == b"identity"
+    assert b"content-length" not in headers and b"content-type" not in headers
+    assert (scope["path"], scope["raw_path"], scope["query_string"]) == ("/echo/a b", b"/echo/a%20b", b"x=1")
+
+    headers = build_scope(PARENT, overridden)["headers"]
+    assert [v for k, v in headers if k == b"authorization"] == [b"Bearer item"]
+    assert (b"content-length", b"8") in headers and (b"content-type", b"application/json") in headers
+
+
+def test_each_sub_request_gets_only_its_own_headers_and_body():
+    completed = by_id(run(make_app(), [
+        {"id": "a", "method": "POST", "path": "/echo/a", "body": "first"},
+        {"id": "b", "method": "POST", "path": "/echo/b", "body": "second", "headers": {"Authorization": "Bearer b"}},
+        {"id": "c", "path": "/echo/c"},
+    ]))
+
+    assert completed["a"]["body"] == {"name": "a", "raw_path": "/echo/a", "authorization": "Bearer parent", "body": "first"}
+    assert completed["b"]["body"]["authorization"] == "Bearer b"
+    assert completed["b"]["body"]["body"] == "second"
+    assert completed["c"]["body"]["body"] == ""
+
+
+def test_failing_sub_request_does_not_affect_the_others():
+    completed = by_id(run(make_app(), [
+        {"id": "ok", "path": "/echo/a"},
+        {"id": "boom", "path": "/boom"},
+        {"id": "missing", "path": "/nowhere"},
+        {"id": "bad", "path": "relative"},
+    ]))
+
+    assert completed["ok"]["status"] == 200
+    assert completed["boom"]["status"] == 500
+    assert completed["missing"]["status"] == 404
+    assert completed["bad"]["status"] == 400
+
+
+def test_results_arrive_as_they_complete():
+    completed = run(make_app(), [{"id": "slow", "path": "/slow"}, {"id": "fast", "path": "/echo/a"}])
+
+    assert [result["id"] for _, result in completed] == ["fast", "slow"]
+    assert [index for index, _ in completed] == [1, 0]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(batch_routes, "settings", replace(batch_routes.settings, max_body_bytes=200))
+    app = make_app()
+    app.include_router(batch_routes.router)
+    return TestClient(app)
+
+
+def test_batch_route_returns_responses_in_request_order(client):
+    response = client.post("/api/batch", json={"requests": [{"path": "/slow"}, {"path": "/echo/a"}]})
+
+    assert response.status_code == 200
+    assert [r["id"] for r in response.json()["responses"]] == ["0", "1"]
+
+
+def test_batch_route_streams_ndjson(client):
+    response = client.post("/api/batch?stream=1", json={"requests": [{"path": "/slow"}, {"path": "/echo/a"}]})
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [line["id"] for line in lines] == ["1", "0"]
+
+
+def test_oversized_batch_body_is_refused(client):
+    assert client.post("/api/batch", content=b"x" * 500).status_code == 413
+
+    def chunked():
+        for _ in range(10):
+            yield b"x" * 100
+
+    # Without a Content-Length the cap applies while reading
+    assert client.post("/api/batch", content=chunked()).status_code == 413
@@ -0,0 +1,111 @@
+import pytest
+
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, BreakerSettings, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(**settings):
+    settings = {"min_calls": 4, "failure_rate": 0.5, "open_seconds": 5.0, "half_open_probes": 2, **settings}
+    return CircuitBreaker("vehicle", BreakerSettings(**settings), clock=FakeClock())
+
+
+def call(breaker, success=True, latency=0.01):
+    """One call through the breaker; returns whether it was admitted."""
+    if not breaker.allow():
+        return False
+    breaker.record(success, latency)
+    return True
+
+
+def open_circuit(breaker):
+    for success in (True, False, True, False):
+        call(breaker, success)
+    assert breaker.state == OPEN
+
+
+def test_failures_below_min_calls_keep_the_circuit_closed():
+    breaker = make_breaker()
+    for _ in range(3):
+        call(breaker, success=False)
+
+    assert breaker.state == CLOSED
+
+
+def test_failure_rate_opens_the_circuit_and_rejects_calls():
+    breaker = make_breaker()
+    open_circuit(breaker)
+
+    assert not call(breaker)
+    assert breaker.is_open()
+    assert breaker.stats()["rejected"] == 1
+    assert breaker.retry_after() == pytest.approx(5.0)
+
+
+def test_slow_calls_open_the_circuit():
+    breaker = make_breaker(slow_call_rate=0.75, slow_call_seconds=1.0)
+    for latency in (2.0, 2.0, 0.1, 2.0):
+        call(breaker, latency=latency)
+
+    assert breaker.state == OPEN
+
+
+def test_old_failures_slide_out_of_the_window():
+    breaker = make_breaker(window=10.0)
+    call(breaker, success=False)
+    call(breaker, success=False)
+
+    breaker.clock.now += 11.0
+    call(breaker, success=False)
+    call(breaker)
+    call(breaker)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["calls"] == 3
+
+
+def test_half_open_probes_close_the_circuit():
+    breaker = make_breaker()
+    open_circuit(breaker)
+
+    breaker.clock.now += 5.0
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert breaker.allow()
+    # Only half_open_probes calls at a time
+    assert not breaker.allow()
+
+    breaker.record(True, 0.01)
+    breaker.record(True, 0.01)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["calls"] == 0
+
+
+def test_failed_probe_opens_the_circuit_again():
+    breaker = make_breaker()
+    open_circuit(breaker)
+
+    breaker.clock.now += 5.0
+    assert call(breaker, success=False)
+
+    assert breaker.state == OPEN
+    assert breaker.stats()["times_opened"] == 2
+    assert not call(breaker)
+
+
+def test_released_probe_frees_its_slot():
+    breaker = make_breaker(half_open_probes=1)
+    open_circuit(breaker)
+
+    breaker.clock.now += 5.0
+    assert breaker.allow()
+    # Cancelled without an outcome
+    breaker.release()
+
+    assert breaker.state == HALF_OPEN
+    assert call(breaker)
+    assert breaker.state == CLOSED
@@ -0,0 +1,42 @@
+import asyncio
+import zlib
+
+from utils import compression
+from utils.compression import CompressionSettings, ResponseCompressor
+
+
+def compress_stream(chunks, monkeypatch, **settings):
+    """Stream ``chunks`` through gzip, returning the body and the sizes sent to the threadpool."""
+    offloaded = []
+
+    async def run_in_threadpool(func, data):
+        offloaded.append(len(data))
+        return func(data)
+
+    monkeypatch.setattr(compression, "run_in_threadpool", run_in_threadpool)
+    compressor = ResponseCompressor(CompressionSettings(**settings))
+
+    async def scenario():
+        async def source():
+            for chunk in chunks:
+                yield chunk
+
+        return b"".join([data async for data in compressor.compress_stream("gzip", source())])
+
+    return asyncio.run(scenario()), offloaded
+
+
+def test_small_stream_chunks_are_collected_before_offloading(monkeypatch):
+    chunks = [bytes([n]) * 4096 for n in range(40)]
+    body, offloaded = compress_stream(chunks, monkeypatch, threadpool_min_size=64 * 1024)
+
+    assert zlib.decompress(body, 16 + zlib.MAX_WBITS) == b"".join(chunks)
+    # 40 chunks of 4 KiB: two runs of 64 KiB go to the threadpool, the 32 KiB tail does not
+    assert offloaded == [64 * 1024, 64 * 1024]
+
+
+def test_short_stream_stays_on_the_event_loop(monkeypatch):
+    body, offloaded = compress_stream([b"{}"] * 3, monkeypatch)
+
+    assert zlib.decompress(body, 16 + zlib.MAX_WBITS) == b"{}{}{}"
+    assert offloaded == []
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from utils.concurrency_limiter import CRITICAL, LOW, NORMAL, ConcurrencyLimiter, LimiterSettings, OverloadedError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(**settings):
+    return ConcurrencyLimiter("vehicle", LimiterSettings(**settings), clock=FakeClock())
+
+
+def request(limiter, latency, overloaded=False, sample=True, priority=NORMAL):
+    """One sequential request: take a slot, wait ``latency`` and give it back."""
+    started = asyncio.run(limiter.acquire(priority))
+    limiter.clock.now += latency
+    limiter.release(started, overloaded=overloaded, sample=sample)
+
+
+def test_mixed_traffic_with_uploads_keeps_the_limit():
+    limiter = make_limiter(initial_limit=100)
+    for n in range(1000):
+        if n % 200 == 199:
+            request(limiter, 3.0, sample=False)
+        else:
+            request(limiter, 0.05)
+
+    assert limiter.current_limit == 100
+    assert limiter.decreases == 0
+
+
+def test_overload_cuts_at_most_once_per_round_trip():
+    limiter = make_limiter(initial_limit=100)
+    for _ in range(20):
+        request(limiter, 0.05)
+
+    # Ten concurrent calls fail at once: one cut, not ten
+    clock = limiter.clock
+    started = [asyncio.run(limiter.acquire()) for _ in range(10)]
+    clock.now += 0.05
+    for slot in started:
+        limiter.release(slot, overloaded=True)
+    assert limiter.decreases == 1
+    assert limiter.current_limit == 90
+
+    # A slow response right after, within one round trip, does not cut again
+    request(limiter, 0.02, overloaded=True)
+    assert limiter.decreases == 1
+
+    clock.now += 1.0
+    request(limiter, 0.05, overloaded=True)
+    assert limiter.decreases == 2
+    assert limiter.current_limit == 81
+
+
+def test_slow_responses_lower_the_limit():
+    limiter = make_limiter(initial_limit=100)
+    for _ in range(50):
+        request(limiter, 0.05)
+    for _ in range(50):
+        request(limiter, 1.0)
+
+    assert limiter.decreases > 0
+    assert limiter.current_limit < 100
+
+
+def test_lowered_limit_recovers_under_light_healthy_traffic():
+    limiter = make_limiter(initial_limit=100, min_limit=2)
+    limiter.limit = 2.0
+    for _ in range(120):
+        request(limiter, 0.05)
+
+    assert limiter.current_limit == 100
+
+
+def test_lowered_limit_resets_after_idling():
+    limiter = make_limiter(initial_limit=100, idle_reset=30.0)
+    request(limiter, 0.05)
+    limiter.limit = 10.0
+
+    limiter.clock.now += 31.0
+    asyncio.run(limiter.acquire(LOW))
+
+    assert limiter.current_limit == 100
+
+
+def test_burst_of_low_priority_reads_after_recovery_is_not_shed():
+    limiter = make_limiter(initial_limit=100)
+    limiter.limit = 2.0
+    limiter.clock.now += 60.0
+
+    async def burst():
+        return await asyncio.gather(*(limiter.acquire(LOW) for _ in range(30)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+
+    assert not [r for r in results if isinstance(r, OverloadedError)]
+    assert limiter.shed[LOW] == 0
+
+
+def test_low_priority_waits_for_headroom_and_is_shed_past_its_queue_share():
+    limiter = make_limiter(initial_limit=4, min_limit=2, max_queue=8, low_priority_share=0.5, queue_timeout=5.0)
+
+    async def scenario():
+        slots = [await limiter.acquire(CRITICAL) for _ in range(2)]
+        # At half the limit, low priority requests queue (up to a quarter of the queue)...
+        waiting = [asyncio.ensure_future(limiter.acquire(LOW)) for _ in range(2)]
+        await asyncio.sleep(0)
+        # ...and are shed beyond that
+        with pytest.raises(OverloadedError):
+            await limiter.acquire(LOW)
+        # Normal priority still has room under the full limit
+        normal = await limiter.acquire(NORMAL)
+        assert len(limiter._queue) == 2
+
+        limiter.release(normal)
+        limiter.release(slots[0])
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # One slot under the low priority share is free again: one starts
+        return [w.done() for w in waiting]
+
+    assert asyncio.run(scenario()) == [True, False]
+    assert limiter.shed[LOW] == 1
+
+
+def test_errors_count_even_for_unsampled_requests():
+    limiter = make_limiter(initial_limit=100)
+    request(limiter, 0.05)
+    request(limiter, 0.5, overloaded=True, sample=False)
+
+    assert limiter.decreases == 1
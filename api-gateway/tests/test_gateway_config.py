@@ -0,0 +1,30 @@
+from utils.gateway_config import GatewayConfig, GatewayConfigStore
+
+
+def test_reload_reaches_workers_sharing_the_reload_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("VEHICLE_SERVICE_URL", "http://vehicle-a:3002")
+    env_file = tmp_path / ".env"
+    env_file.write_text("VEHICLE_SERVICE_URL=http://vehicle-b:3002\n")
+    monkeypatch.setenv("GATEWAY_ENV_FILE", str(env_file))
+    reload_file = str(tmp_path / "reload")
+
+    first = GatewayConfigStore(GatewayConfig.from_env(), reload_file=reload_file)
+    second = GatewayConfigStore(GatewayConfig.from_env(), reload_file=reload_file)
+    assert not second.check_reload()
+
+    first.reload()
+    assert not first.check_reload()
+    assert second.current.services["vehicle"] == "http://vehicle-a:3002"
+
+    assert second.check_reload()
+    assert second.current.services["vehicle"] == "http://vehicle-b:3002"
+    assert not second.check_reload()
+
+
+def test_reload_without_a_reload_file_stays_local(tmp_path, monkeypatch):
+    monkeypatch.setenv("VEHICLE_SERVICE_URL", "http://vehicle-a:3002")
+    monkeypatch.setenv("GATEWAY_ENV_FILE", str(tmp_path / "missing.env"))
+    store = GatewayConfigStore(GatewayConfig.from_env())
+
+    assert store.reload().generation == 1
+    assert not store.check_reload()
@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from utils import health_checker
+from utils.gateway_config import GatewayConfig
+from utils.health_checker import DOWN, UNKNOWN, UP, EndpointHealth, HealthChecker, HealthCheckSettings, ProbeSettings
+
+VEHICLE = "http://vehicle.test"
+RENTAL = "http://rental.test"
+
+
+def record(health, success, settings, now=0.0):
+    health.status = health.record(success, 0.01, 200 if success else 503, None, settings, now)
+    return health.status
+
+
+class TestEndpointHealth:
+    settings = ProbeSettings(unhealthy_after=2, healthy_after=2)
+
+    def test_first_success_marks_up(self):
+        health = EndpointHealth(VEHICLE)
+        assert health.status == UNKNOWN
+        assert record(health, True, self.settings) == UP
+
+    def test_down_from_unknown_takes_unhealthy_after_failures(self):
+        health = EndpointHealth(VEHICLE)
+        assert record(health, False, self.settings) == UNKNOWN
+        assert record(health, False, self.settings) == DOWN
+
+    def test_one_failure_does_not_mark_an_up_endpoint_down(self):
+        health = EndpointHealth(VEHICLE)
+        record(health, True, self.settings)
+        assert record(health, False, self.settings) == UP
+        assert record(health, True, self.settings) == UP
+        assert record(health, False, self.settings) == UP
+        assert record(health, False, self.settings) == DOWN
+
+    def test_recovery_takes_healthy_after_successes_in_a_row(self):
+        health = EndpointHealth(VEHICLE)
+        record(health, False, self.settings)
+        record(health, False, self.settings)
+        assert record(health, True, self.settings) == DOWN
+        assert record(health, False, self.settings) == DOWN
+        assert record(health, True, self.settings) == DOWN
+        assert record(health, True, self.settings) == UP
+
+    def test_unhealthy_after_one_marks_down_at_once(self):
+        health = EndpointHealth(VEHICLE)
+        assert record(health, False, ProbeSettings(unhealthy_after=1)) == DOWN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def config(monkeypatch):
+    config = GatewayConfig.from_env({"VEHICLE_SERVICE_URL": VEHICLE, "RENTAL_SERVICE_URL": RENTAL})
+    monkeypatch.setattr(health_checker.gateway_config, "current", config)
+    return config
+
+
+def make_checker(responses, probed, **settings):
+    """A checker whose probes are answered by ``responses``: host -> status code or exception."""
+
+    def handler(request):
+        probed.append(request.url.host)
+        answer = responses[request.url.host]
+        if isinstance(answer, Exception):
+            raise answer
+        return httpx.Response(answer)
+
+    checker = HealthChecker(HealthCheckSettings(interval=10.0, **settings), clock=FakeClock())
+    checker.services = frozenset({"vehicle", "rental"})
+    checker._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return checker
+
+
+def probe(checker, rounds=1):
+    async def scenario():
+        for _ in range(rounds):
+            await checker.probe_all()
+
+    asyncio.run(scenario())
+
+
+def test_probes_only_routed_and_configured_services(config):
+    probed = []
+    checker = make_checker({"vehicle.test": 200, "rental.test": 200}, probed)
+    probe(checker)
+
+    assert sorted(probed) == ["rental.test", "vehicle.test"]
+
+
+def test_readiness_and_fail_fast_follow_probe_results(config):
+    probed = []
+    checker = make_checker({"vehicle.test": 200, "rental.test": httpx.ConnectError("refused")}, probed)
+    probe(checker)
+    assert not checker.is_down(RENTAL)
+
+    probe(checker)
+    status_code, body = checker.ready_response()
+    assert status_code == 200
+    assert json.loads(body) == {"status": "degraded", "ready": True}
+    assert checker.is_down(RENTAL)
+    assert not checker.is_down(VEHICLE)
+
+    _, detailed = checker.ready_response(detailed=True)
+    services = json.loads(detailed)["services"]
+    assert services["vehicle"]["status"] == UP
+    assert services["rental"]["status"] == DOWN
+    assert "refused" in services["rental"]["endpoints"][RENTAL]["error"]
+
+
+def test_server_errors_fail_and_client_errors_pass(config):
+    probed = []
+    checker = make_checker({"vehicle.test": 404, "rental.test": 503}, probed)
+    probe(checker, rounds=2)
+
+    assert not checker.is_down(VEHICLE)
+    assert checker.is_down(RENTAL)
+
+
+def test_ready_services_must_all_be_up(config):
+    probed = []
+    checker = make_checker(
+        {"vehicle.test": 200, "rental.test": httpx.ReadTimeout("slow")}, probed, ready_services=("rental",)
+    )
+    probe(checker, rounds=2)
+
+    status_code, body = checker.ready_response()
+    assert status_code == 503
+    assert json.loads(body) == {"status": "unavailable", "ready": False}
+
+
+def test_stale_or_disabled_results_do_not_fail_fast(config):
+    probed = []
+    checker = make_checker({"vehicle.test": 200, "rental.test": 503}, probed)
+    probe(checker, rounds=2)
+    assert checker.is_down(RENTAL)
+
+    checker.clock.now += checker.settings.interval * 3 + 1
+    assert not checker.is_down(RENTAL)
+
+    checker = make_checker({"vehicle.test": 200, "rental.test": 503}, probed, fail_fast=False)
+    probe(checker, rounds=2)
+    assert not checker.is_down(RENTAL)
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+import time
+
+from utils import image_derivatives
+from utils.image_derivatives import ImageDerivatives, ImageSettings
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def write(directory, name, age=0.0):
+    path = directory / name
+    path.write_bytes(b"x" * 10)
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_startup_keeps_partial_files_of_live_workers(tmp_path):
+    live = write(tmp_path, f"a.webp.{os.getppid()}.tmp")
+    dead = write(tmp_path, f"b.webp.{dead_pid()}.tmp")
+    own = write(tmp_path, f"c.webp.{os.getpid()}.tmp")
+    old = write(tmp_path, f"d.webp.{os.getppid()}.tmp", age=image_derivatives.STALE_PARTIAL_SECONDS + 60)
+    done = write(tmp_path, "e.webp")
+
+    entries = ImageDerivatives(ImageSettings(cache_dir=str(tmp_path)))._load_sync()
+
+    assert live.exists()
+    assert not dead.exists() and not own.exists() and not old.exists()
+    assert [name for _, name, _ in entries] == [done.name]
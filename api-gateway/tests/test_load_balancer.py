@@ -0,0 +1,123 @@
+import random
+from collections import Counter
+
+import pytest
+
+from utils.circuit_breaker import circuit_breakers
+from utils.load_balancer import BalancerSettings, LoadBalancer, LoadBalancerRegistry
+
+URLS = ["http://vehicle-1.test", "http://vehicle-2.test", "http://vehicle-3.test"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def seeded():
+    random.seed(1)
+
+
+def make_balancer(urls=URLS, **settings):
+    return LoadBalancer("vehicle", urls, BalancerSettings(**settings), clock=FakeClock())
+
+
+def respond(balancer, url, latency, success=True, times=1):
+    endpoint = next(e for e in balancer.endpoints if e.url == url)
+    for _ in range(times):
+        balancer.start(endpoint)
+        balancer.finish(endpoint, success, latency)
+    return endpoint
+
+
+def picks(balancer, count=300):
+    return Counter(balancer.pick().url for _ in range(count))
+
+
+def test_faster_endpoint_wins_the_pair():
+    balancer = make_balancer(URLS[:2])
+    respond(balancer, URLS[0], 0.02)
+    respond(balancer, URLS[1], 0.2)
+
+    assert picks(balancer) == {URLS[0]: 300}
+
+
+def test_outstanding_requests_weigh_against_a_fast_endpoint():
+    balancer = make_balancer(URLS[:2])
+    fast = respond(balancer, URLS[0], 0.02)
+    respond(balancer, URLS[1], 0.05)
+    # Twenty requests in flight: 0.02 * 21 > 0.05 * 1
+    fast.outstanding = 20
+
+    assert balancer.pick().url == URLS[1]
+
+
+def test_slowest_of_three_never_wins_but_the_others_share():
+    balancer = make_balancer()
+    respond(balancer, URLS[0], 0.02)
+    respond(balancer, URLS[1], 0.05)
+    respond(balancer, URLS[2], 0.5)
+
+    counts = picks(balancer)
+    assert counts[URLS[2]] == 0
+    # The middle one wins whenever it is sampled with the slowest
+    assert 50 < counts[URLS[1]] < 150
+
+
+def test_idle_endpoint_is_tried_again_after_its_latency_decays():
+    balancer = make_balancer(URLS[:2], ewma_decay_seconds=10.0)
+    respond(balancer, URLS[1], 2.0)
+    balancer.clock.now += 60.0
+    respond(balancer, URLS[0], 0.05)
+
+    assert balancer.pick().url == URLS[1]
+
+
+def test_failures_count_as_slow_and_eject_with_backoff():
+    balancer = make_balancer(URLS[:2], eject_after=3, eject_seconds=10.0, failure_penalty=1.0)
+    respond(balancer, URLS[1], 0.1)
+    failing = respond(balancer, URLS[0], 0.001, success=False)
+    assert failing.ewma == 1.0
+
+    respond(balancer, URLS[0], 0.001, success=False, times=2)
+    assert failing.ejected_until == balancer.clock.now + 10.0
+    assert picks(balancer, 50) == {URLS[1]: 50}
+
+    # Readmitted after the ejection; failing again doubles the ejection
+    balancer.clock.now += 11.0
+    respond(balancer, URLS[0], 0.001, success=False, times=3)
+    assert failing.ejected_until == balancer.clock.now + 20.0
+    assert failing.times_ejected == 2
+
+
+def test_all_endpoints_are_used_when_every_one_is_ejected():
+    balancer = make_balancer(URLS[:2], eject_after=1)
+    respond(balancer, URLS[0], 0.05, success=False)
+    respond(balancer, URLS[1], 0.05, success=False)
+
+    assert set(picks(balancer, 50)) == set(URLS[:2])
+
+
+def test_endpoint_with_an_open_circuit_is_skipped():
+    urls = ["http://rating-1.test", "http://rating-2.test"]
+    balancer = make_balancer(urls)
+    breaker = circuit_breakers.breaker_for(urls[0])
+    breaker._open(breaker.clock(), "test")
+    try:
+        assert picks(balancer, 50) == {urls[1]: 50}
+    finally:
+        breaker._close()
+
+
+def test_registry_routes_only_urls_of_the_primary_endpoint():
+    registry = LoadBalancerRegistry({"vehicle": ["http://vehicle:1", "http://vehicle-b:1"]})
+
+    url, balancer, endpoint = registry.route("http://vehicle:1/vehicles/7?full=1")
+    assert balancer is not None
+    assert url == endpoint.url + "/vehicles/7?full=1"
+    # Same prefix, different port
+    assert registry.route("http://vehicle:10/vehicles") == ("http://vehicle:10/vehicles", None, None)
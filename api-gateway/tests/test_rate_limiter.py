@@ -0,0 +1,59 @@
+import pytest
+
+from middleware.rate_limiter import SharedMemoryRateLimiter, fcntl
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="the shared backend needs fcntl")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_workers(tmp_path, count=2, **settings):
+    """Limiters sharing one counter file, as the workers of one host do."""
+    clock = FakeClock()
+    settings = {"max_requests": 10, "window_size": 60, "slots": 64, **settings}
+    workers = [SharedMemoryRateLimiter(path=str(tmp_path / "counters"), clock=clock, **settings) for _ in range(count)]
+    return clock, workers
+
+
+def allowed(limiter, key, attempts):
+    return sum(limiter.hit(key) for _ in range(attempts))
+
+
+def test_workers_share_one_quota(tmp_path):
+    clock, (first, second) = make_workers(tmp_path, batch_size=1)
+
+    assert allowed(first, "client", 6) == 6
+    # The first worker's last hit is still pending: one batch of overshoot
+    assert allowed(second, "client", 10) == 5
+
+
+def test_pending_hits_stay_in_their_window_on_rollover(tmp_path):
+    clock, (first, second) = make_workers(tmp_path, sync_interval=1000, batch_size=100)
+    assert allowed(first, "client", 6) == 6
+
+    # The six hits are merged late, after the window rolled over: they count
+    # in the previous window, which has nearly slid out of the estimate
+    clock.now = 119.0
+    assert allowed(first, "client", 1) == 1
+    assert allowed(second, "client", 20) == 10
+
+
+def test_pending_hits_reach_a_slot_another_worker_rolled_over(tmp_path):
+    clock, (first, second) = make_workers(tmp_path, sync_interval=1000, batch_size=100)
+    assert allowed(first, "client", 1) == 1
+    assert allowed(second, "client", 5) == 5
+
+    clock.now = 60.0
+    assert allowed(first, "client", 1) == 1
+    # The second worker hands over its five hits after the first one rolled
+    # the shared slot over; they still count, in the previous window
+    second.close()
+    _, (third,) = make_workers(tmp_path, count=1)
+    third.clock.now = 60.0
+    assert allowed(third, "client", 20) == 4
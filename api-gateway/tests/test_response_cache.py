@@ -0,0 +1,155 @@
+from starlette.requests import Request
+
+from utils.response_cache import CacheRule, ResponseCache
+
+RULE = CacheRule(name="test", ttl=60)
+
+
+def make_request(path, query="", headers=None, method="GET"):
+    return Request({
+        "type": "http",
+        "method": method,
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "root_path": "",
+        "path": path,
+        "query_string": query.encode("latin-1"),
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in (headers or {}).items()],
+    })
+
+
+def make_cache(**kwargs):
+    return ResponseCache(max_bytes=1024 * 1024, rules={RULE.name: RULE}, **kwargs)
+
+
+def store(cache, request, body=b"{}", headers=None, status_code=200, generation=None):
+    cache.store(request, RULE, status_code, headers or {}, body, "application/json", generation)
+
+
+def test_hit_ignores_query_parameter_order():
+    cache = make_cache()
+    store(cache, make_request("/vehicles", "type=suv&page=2"), b"suvs")
+
+    entry = cache.get(make_request("/vehicles", "page=2&type=suv"))
+
+    assert entry is not None and entry.body == b"suvs"
+    assert cache.get(make_request("/vehicles", "page=3&type=suv")) is None
+
+
+def test_vary_header_selects_the_variant():
+    cache = make_cache()
+    store(cache, make_request("/vehicles", headers={"Accept-Language": "en"}), b"en", {"Vary": "Accept-Language"})
+
+    assert cache.get(make_request("/vehicles", headers={"Accept-Language": "fr"})) is None
+    assert cache.get(make_request("/vehicles", headers={"Accept-Language": "en"})).body == b"en"
+
+    store(cache, make_request("/vehicles", headers={"Accept-Language": "fr"}), b"fr", {"Vary": "Accept-Language"})
+
+    assert cache.get(make_request("/vehicles", headers={"Accept-Language": "fr"})).body == b"fr"
+    assert cache.get(make_request("/vehicles", headers={"Accept-Language": "en"})).body == b"en"
+    assert cache.stats()["entries"] == 2
+
+
+def test_vary_is_case_insensitive_and_ignores_unlisted_headers():
+    cache = make_cache()
+    store(cache, make_request("/vehicles", headers={"Accept": "application/json"}), headers={"vary": "ACCEPT"})
+
+    assert cache.get(make_request("/vehicles", headers={"Accept": "application/json", "User-Agent": "x"})) is not None
+    assert cache.get(make_request("/vehicles", headers={"Accept": "text/html"})) is None
+
+
+def test_vary_star_set_cookie_and_private_are_not_stored():
+    cache = make_cache()
+    store(cache, make_request("/a"), headers={"Vary": "*"})
+    store(cache, make_request("/b"), headers={"Set-Cookie": "session=1"})
+    store(cache, make_request("/c"), headers={"Cache-Control": "private, max-age=60"})
+    store(cache, make_request("/d"), status_code=404)
+
+    assert cache.stats()["entries"] == 0
+
+
+def test_request_no_cache_bypasses_the_entry():
+    cache = make_cache()
+    store(cache, make_request("/vehicles"))
+
+    assert cache.get(make_request("/vehicles", headers={"Cache-Control": "no-cache"})) is None
+    assert cache.get(make_request("/vehicles")) is not None
+
+
+def test_vehicle_write_invalidates_vehicles_and_availability():
+    cache = make_cache()
+    store(cache, make_request("/vehicles"))
+    store(cache, make_request("/vehicles/7"))
+    store(cache, make_request("/rentals/availability", "vehicleId=7"))
+    store(cache, make_request("/ratings/7"))
+
+    assert cache.invalidate("/vehicles/7") == 3
+
+    assert cache.get(make_request("/vehicles")) is None
+    assert cache.get(make_request("/rentals/availability", "vehicleId=7")) is None
+    assert cache.get(make_request("/ratings/7")) is not None
+    assert cache.stats()["invalidations"] == 3
+
+
+def test_fetch_overtaken_by_a_write_is_not_stored():
+    cache = make_cache()
+    request = make_request("/vehicles/7")
+    generation = cache.generation(request.url.path)
+
+    # A write lands while the read is in flight
+    cache.invalidate("/vehicles/7")
+    store(cache, request, b"before the write", generation=generation)
+
+    assert cache.get(request) is None
+
+    generation = cache.generation(request.url.path)
+    store(cache, request, b"after the write", generation=generation)
+    assert cache.get(request).body == b"after the write"
+
+
+def test_unrelated_write_does_not_drop_an_in_flight_fetch():
+    cache = make_cache()
+    request = make_request("/vehicles/7")
+    generation = cache.generation(request.url.path)
+
+    # Rental writes only invalidate availability answers
+    cache.invalidate("/rentals/12")
+    store(cache, request, generation=generation)
+
+    assert cache.get(request) is not None
+
+
+def test_rental_write_keeps_vehicle_entries():
+    cache = make_cache()
+    store(cache, make_request("/vehicles/7"))
+    store(cache, make_request("/rentals/availability", "vehicleId=7"))
+
+    assert cache.invalidate("/rentals/12") == 1
+    assert cache.get(make_request("/vehicles/7")) is not None
+    # Paths that only share a prefix string are not affected
+    assert cache.invalidate("/vehicles-admin/7") == 0
+
+
+def test_invalidation_forgets_the_vary_spec():
+    cache = make_cache()
+    store(cache, make_request("/vehicles", headers={"Accept-Language": "en"}), headers={"Vary": "Accept-Language"})
+    cache.invalidate("/vehicles")
+
+    # Stored again without Vary, one entry serves every language
+    store(cache, make_request("/vehicles", headers={"Accept-Language": "en"}), b"all")
+
+    assert cache.get(make_request("/vehicles", headers={"Accept-Language": "fr"})).body == b"all"
+
+
+def test_lru_eviction_keeps_size_bounded():
+    cache = ResponseCache(max_bytes=80, rules={RULE.name: RULE})
+    for n in range(4):
+        store(cache, make_request(f"/vehicles/{n}"), b"x" * 10)
+    cache.get(make_request("/vehicles/0"))
+    for n in range(4, 8):
+        store(cache, make_request(f"/vehicles/{n}"), b"x" * 10)
+    store(cache, make_request("/vehicles/8"), b"x" * 10)
+
+    assert cache.stats()["size_bytes"] <= 80
+    assert cache.get(make_request("/vehicles/0")) is not None
+    assert cache.get(make_request("/vehicles/1")) is None
@@ -0,0 +1,136 @@
+import asyncio
+
+import httpx
+import pytest
+
+from utils.retry_policy import RetryBudget, RetryPolicy, RetrySettings
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Upstream:
+    """
+    Answers each call with the next status code or exception in ``answers``,
+    then 200, after the next delay in ``delays`` (none once they run out).
+    """
+
+    def __init__(self, *answers, delays=()):
+        self.answers = list(answers)
+        self.delays = list(delays)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.calls += 1
+        answer = self.answers.pop(0) if self.answers else 200
+        delay = self.delays.pop(0) if self.delays else 0.0
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if isinstance(answer, Exception):
+            raise answer
+        return httpx.Response(answer)
+
+
+def make_policy(ratio=0.2, min_per_second=5.0, **settings):
+    policy = RetryPolicy("vehicle", RetrySettings(backoff_base=0.0, **settings))
+    policy.budget = RetryBudget(ratio, min_per_second, clock=FakeClock())
+    return policy
+
+
+def send(policy, upstream, hedge_delay=None):
+    return asyncio.run(policy.send(upstream, hedge_delay))
+
+
+def test_retries_a_failed_status_until_it_succeeds():
+    policy = make_policy(attempts=3)
+    upstream = Upstream(503, 502)
+
+    assert send(policy, upstream).status_code == 200
+    assert upstream.calls == 3
+    assert policy.retries == 2
+
+
+def test_last_answer_is_returned_when_attempts_run_out():
+    policy = make_policy(attempts=2)
+    upstream = Upstream(503, 504, 503)
+
+    assert send(policy, upstream).status_code == 504
+    assert upstream.calls == 2
+
+
+def test_connection_errors_are_retried_then_raised():
+    policy = make_policy(attempts=2)
+    upstream = Upstream(httpx.ConnectError("refused"), httpx.ConnectError("refused"))
+
+    with pytest.raises(httpx.ConnectError):
+        send(policy, upstream)
+    assert upstream.calls == 2
+
+
+def test_other_errors_are_not_retried():
+    policy = make_policy(attempts=3)
+    upstream = Upstream(httpx.ReadTimeout("slow"))
+
+    with pytest.raises(httpx.ReadTimeout):
+        send(policy, upstream)
+    assert upstream.calls == 1
+
+
+def test_budget_caps_retries_during_an_outage():
+    # Without refill, retries are bounded by the initial token plus ratio per request
+    policy = make_policy(attempts=3, ratio=0.2, min_per_second=0.0)
+    upstream = Upstream(*[503] * 1000)
+
+    for _ in range(50):
+        assert send(policy, upstream).status_code == 503
+
+    assert policy.retries <= 1 + 50 * 0.2
+    assert upstream.calls == 50 + policy.retries
+    assert policy.budget.exhausted > 0
+    assert policy.stats()["budget_exhausted"] == policy.budget.exhausted
+
+
+def test_budget_refills_over_time():
+    budget = RetryBudget(ratio=0.0, min_per_second=2.0, clock=FakeClock())
+    while budget.withdraw():
+        pass
+    assert budget.exhausted == 1
+
+    budget.clock.now += 1.0
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+
+
+def test_slow_first_attempt_is_hedged_and_the_hedge_wins():
+    policy = make_policy(hedge_min_delay=0.01)
+    # The first attempt hangs; the hedge answers at once
+    upstream = Upstream(delays=[10.0])
+
+    async def scenario():
+        response = await policy.send(upstream, hedge_delay=0.0)
+        # Let the losing attempt observe its cancellation
+        await asyncio.sleep(0)
+        return response
+
+    assert asyncio.run(scenario()).status_code == 200
+    assert policy.hedges == 1 and policy.hedge_wins == 1
+    assert upstream.calls == 2 and upstream.cancelled == 1
+
+
+def test_no_hedge_without_budget():
+    policy = make_policy(hedge_min_delay=0.01, min_per_second=0.0)
+    policy.budget.tokens = 0.0
+    upstream = Upstream(delays=[0.05])
+
+    assert send(policy, upstream, hedge_delay=0.0).status_code == 200
+    assert policy.hedges == 0
+    assert upstream.calls == 1
@@ -0,0 +1,102 @@
+import pytest
+
+from utils.route_policy import DEFAULT_POLICY, RoutePolicy, RoutePolicyTable, build_route_policies
+
+
+@pytest.fixture(scope="module")
+def policies():
+    return build_route_policies()
+
+
+@pytest.mark.parametrize("method, path, name", [
+    ("GET", "/", "root"),
+    ("GET", "/api/health", "api_health"),
+    ("GET", "/api/health/ready", "api_health_ready"),
+    ("GET", "/api/health/cache", "api_health_detail"),
+    ("GET", "/vehicles", "vehicle_list"),
+    ("GET", "/vehicles/", "vehicle_list"),
+    ("GET", "/vehicles/123", "vehicle_detail"),
+    ("GET", "/vehicles/123/images", "vehicle_browse"),
+    ("POST", "/vehicles/123", "vehicles"),
+    ("GET", "/rentals/availability", "rental_availability"),
+    ("POST", "/rentals", "rental_write"),
+    ("GET", "/rentals/5", "default"),
+    ("GET", "/users/profile", "user_profile"),
+    ("GET", "/users/42", "user_public_profile"),
+    ("GET", "/users/42/avatar", "user_avatar"),
+    ("POST", "/payments/momo/ipn", "momo_ipn"),
+    ("POST", "/payments/checkout", "payments"),
+    ("GET", "/vehicles-admin", "default"),
+    ("GET", "/anything/else", "default"),
+])
+def test_match(policies, method, path, name):
+    assert policies.match(method, path).name == name
+
+
+def test_admin_reads_require_auth(policies):
+    read = policies.match("GET", "/api/admin/users")
+    assert read.name == "admin_read"
+    assert read.auth_required and read.priority == "low"
+    # Admin writes keep the default policy, which also requires auth
+    assert policies.match("DELETE", "/api/admin/users/1") is DEFAULT_POLICY
+
+
+@pytest.mark.parametrize("method, path, name", [
+    ("POST", "/auth/login", "auth_login"),
+    ("POST", "/auth/register", "auth_register"),
+    ("POST", "/auth/logout", "auth"),
+    ("POST", "/auth/reset-password/abc", "auth"),
+    ("GET", "/auth/verify-email", "auth"),
+])
+def test_auth_routes_are_public_and_auth_rate_limited(policies, method, path, name):
+    policy = policies.match(method, path)
+    assert policy.name == name
+    assert not policy.auth_required
+    assert policy.rate_limit == "auth"
+
+
+def test_only_listed_paths_are_public(policies):
+    assert policies.is_public("GET", "/")
+    assert not policies.is_public("GET", "/rentals/5")
+    assert not policies.is_public("GET", "/some/unknown/path")
+
+
+def test_literal_segment_wins_over_param():
+    table = RoutePolicyTable([
+        ("/items/{id}", False, None, RoutePolicy("item")),
+        ("/items/new", False, None, RoutePolicy("new_item")),
+    ])
+    assert table.match("GET", "/items/new").name == "new_item"
+    assert table.match("GET", "/items/7").name == "item"
+    assert table.match("GET", "/items/7/parts") is DEFAULT_POLICY
+
+
+def test_method_specific_entry_wins_over_catch_all():
+    table = RoutePolicyTable([
+        ("/items", True, None, RoutePolicy("items_any")),
+        ("/items", True, ("GET",), RoutePolicy("items_read")),
+    ])
+    assert table.match("GET", "/items/7").name == "items_read"
+    assert table.match("POST", "/items/7").name == "items_any"
+
+
+def test_deepest_prefix_wins():
+    table = RoutePolicyTable([
+        ("/a", True, None, RoutePolicy("a")),
+        ("/a/b", True, None, RoutePolicy("a_b")),
+    ])
+    assert table.match("GET", "/a/x").name == "a"
+    assert table.match("GET", "/a/b/c").name == "a_b"
+    assert table.match("GET", "/ab") is DEFAULT_POLICY
+
+
+def test_environment_adds_public_paths_and_timeouts(monkeypatch):
+    monkeypatch.setenv("PUBLIC_API_PATHS", "/promo, /faq")
+    monkeypatch.setenv("ROUTE_TIMEOUT_AUTH_LOGIN", "3")
+    monkeypatch.setenv("ROUTE_TIMEOUT_PAYMENTS", "0")
+    table = build_route_policies()
+
+    assert table.is_public("GET", "/promo/summer")
+    assert table.is_public("POST", "/faq")
+    assert table.match("POST", "/auth/login").timeout == 3.0
+    assert table.match("POST", "/payments/checkout").timeout is None
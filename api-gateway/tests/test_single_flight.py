@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from utils.single_flight import CLIENT_DISCONNECTED, SingleFlight
+
+KEY = ("GET", "http://vehicle-service/vehicles", "")
+
+
+class Upstream:
+    """A slow upstream call that records how often it ran and how it ended."""
+
+    def __init__(self, result="ok", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.finished = False
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        self.finished = True
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        group = SingleFlight()
+        upstream = Upstream()
+        callers = [asyncio.ensure_future(group.do(KEY, upstream)) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(*callers)
+        return group, upstream, results
+
+    group, upstream, results = run(scenario())
+
+    assert results == ["ok", "ok", "ok"]
+    assert upstream.calls == 1
+    assert group.stats() == {"in_flight": 0, "leaders": 1, "followers": 2}
+
+
+def test_exception_reaches_every_caller():
+    async def scenario():
+        group = SingleFlight()
+        upstream = Upstream(error=RuntimeError("boom"))
+        callers = [asyncio.ensure_future(group.do(KEY, upstream)) for _ in range(2)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return await asyncio.gather(*callers, return_exceptions=True)
+
+    results = run(scenario())
+
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+
+
+def test_leaving_caller_does_not_cancel_the_others():
+    async def scenario():
+        group = SingleFlight()
+        upstream = Upstream()
+        leader = asyncio.ensure_future(group.do(KEY, upstream))
+        follower = asyncio.ensure_future(group.do(KEY, upstream))
+        await asyncio.sleep(0)
+        leader.cancel(CLIENT_DISCONNECTED)
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return leader, await follower, upstream
+
+    leader, result, upstream = run(scenario())
+
+    assert leader.cancelled()
+    assert result == "ok"
+    assert not upstream.cancelled
+
+
+@pytest.mark.parametrize("message", [None, "deadline exceeded"])
+def test_call_survives_when_callers_give_up_for_other_reasons(message):
+    async def scenario():
+        group = SingleFlight()
+        upstream = Upstream()
+        callers = [asyncio.ensure_future(group.do(KEY, upstream)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel(message)
+        await asyncio.sleep(0)
+        in_flight = group.stats()["in_flight"]
+        upstream.release.set()
+        # Let the shared call run to completion in the background
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return upstream, in_flight, group.stats()["in_flight"]
+
+    upstream, in_flight_after_leaving, in_flight_after_finishing = run(scenario())
+
+    assert in_flight_after_leaving == 1
+    assert upstream.finished and not upstream.cancelled
+    assert in_flight_after_finishing == 0
+
+
+def test_call_is_cancelled_when_the_last_client_disconnects():
+    async def scenario():
+        group = SingleFlight()
+        upstream = Upstream()
+        first = asyncio.ensure_future(group.do(KEY, upstream))
+        second = asyncio.ensure_future(group.do(KEY, upstream))
+        await asyncio.sleep(0)
+        # A caller giving up on a timeout does not count as a disconnect...
+        first.cancel()
+        await asyncio.sleep(0)
+        assert not upstream.cancelled
+        # ...but the last caller's client going away cancels the call
+        second.cancel(CLIENT_DISCONNECTED)
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return group, upstream
+
+    group, upstream = run(scenario())
+
+    assert upstream.cancelled and not upstream.finished
+    assert group.stats()["in_flight"] == 0
+
+
+def test_new_caller_after_completion_starts_a_new_call():
+    async def scenario():
+        group = SingleFlight()
+        upstream = Upstream()
+        upstream.release.set()
+        await group.do(KEY, upstream)
+        await group.do(KEY, upstream)
+        return group, upstream
+
+    group, upstream = run(scenario())
+
+    assert upstream.calls == 2
+    assert group.stats()["leaders"] == 2
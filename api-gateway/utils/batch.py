@@ -0,0 +1,260 @@
+import os
+import json
+import base64
+import asyncio
+import logging
+from urllib.parse import unquote
+from dataclasses import dataclass
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+BATCH_PATH = "/api/batch"
+
+BATCH_METHODS = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE")
+
+# Request headers of the batch call that are not passed on to sub-requests;
+# they describe the batch body, not the sub-request's
+EXCLUDED_REQUEST_HEADERS = frozenset((
+    b"content-length", b"content-type", b"transfer-encoding", b"accept-encoding", b"expect",
+))
+
+# Response headers left out of each item; the batch response has its own
+EXCLUDED_ITEM_HEADERS = ("content-length", "content-encoding", "transfer-encoding", "vary")
+
+
+class BatchError(ValueError):
+    """Raised for a batch request that cannot be run at all."""
+
+
+class BatchTooLarge(BatchError):
+    """Raised when the batch body is over ``max_body_bytes``."""
+
+
+@dataclass(frozen=True)
+class BatchSettings:
+    """Limits for ``POST /api/batch``."""
+
+    # Sub-requests allowed in one batch
+    max_requests: int = 20
+    # Sub-requests running at the same time within one batch
+    concurrency: int = 6
+    # Size limit of the batch request body
+    max_body_bytes: int = 1024 * 1024
+
+    @classmethod
+    def from_env(cls):
+        defaults = cls()
+        return cls(
+            max_requests=int(os.getenv("BATCH_MAX_REQUESTS", defaults.max_requests)),
+            concurrency=max(1, int(os.getenv("BATCH_CONCURRENCY", defaults.concurrency))),
+            max_body_bytes=int(os.getenv("BATCH_MAX_BODY_BYTES", defaults.max_body_bytes)),
+        )
+
+
+@dataclass(frozen=True)
+class BatchItem:
+    """One validated sub-request."""
+
+    id: str
+    method: str
+    path: str
+    query: str
+    headers: tuple
+    body: bytes = b""
+    # Set when the item is invalid; it is answered with 400 without being sent
+    error: str = None
+
+
+def _parse_item(index, raw):
+    if not isinstance(raw, dict):
+        return BatchItem(str(index), "GET", "", "", (), error="Each request must be an object")
+    item_id = str(raw.get("id", index))
+    method = str(raw.get("method", "GET")).upper()
+    target = raw.get("path")
+
+    def invalid(message):
+        return BatchItem(item_id, method, str(target or ""), "", (), error=message)
+
+    if method not in BATCH_METHODS:
+        return invalid(f"Unsupported method: {method}")
+    if not isinstance(target, str) or not target.startswith("/"):
+        return invalid("path must be a string starting with '/'")
+    path, _, query = target.partition("?")
+    if path.rstrip("/") == BATCH_PATH:
+        return invalid("Batch requests cannot be nested")
+
+    headers = raw.get("headers") or {}
+    if not isinstance(headers, dict):
+        return invalid("headers must be an object")
+    encoded_headers = tuple(
+        (str(name).lower().encode("latin-1"), str(value).encode("latin-1"))
+        for name, value in headers.items()
+    )
+
+    body = b""
+    if "body" in raw and raw["body"] is not None:
+        if isinstance(raw["body"], str):
+            body = raw["body"].encode("utf-8")
+        else:
+            body = json.dumps(raw["body"]).encode("utf-8")
+            if not any(name == b"content-type" for name, _ in encoded_headers):
+                encoded_headers += ((b"content-type", b"application/json"),)
+
+    return BatchItem(item_id, method, path, query, encoded_headers, body)
+
+
+async def read_body(request, max_bytes):
+    """
+    Read the batch body, raising ``BatchTooLarge`` as soon as it is known to
+    be over ``max_bytes``: up front from Content-Length, otherwise once the
+    streamed chunks pass the limit, without reading the rest.
+    """
+    declared = request.headers.get("content-length", "").strip()
+    if declared.isdigit() and int(declared) > max_bytes:
+        raise BatchTooLarge(f"Batch body exceeds {max_bytes} bytes")
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise BatchTooLarge(f"Batch body exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def parse_batch(payload, settings):
+    """
+    Validate a batch body of the form ``{"requests": [{"id", "method",
+    "path", "headers", "body"}, ...]}``. ``path`` may include a query
+    string; a non-string ``body`` is sent as JSON. Invalid items are kept
+    and reported with status 400, so ids still line up.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("requests"), list):
+        raise BatchError("Body must be an object with a 'requests' list")
+    raw_items = payload["requests"]
+    if not raw_items:
+        raise BatchError("'requests' must not be empty")
+    if len(raw_items) > settings.max_requests:
+        raise BatchError(f"At most {settings.max_requests} requests are allowed per batch")
+    return [_parse_item(index, raw) for index, raw in enumerate(raw_items)]
+
+
+def build_scope(parent, item):
+    """
+    Build the ASGI scope of a sub-request. It inherits the batch call's
+    client address and headers (e.g. Authorization, Origin), overridden by
+    the item's own headers.
+    """
+    overridden = {name for name, _ in item.headers}
+    headers = [
+        (name, value) for name, value in parent["headers"]
+        if name not in EXCLUDED_REQUEST_HEADERS and name not in overridden
+    ]
+    headers.extend(item.headers)
+    # Items are returned decoded inside the batch response
+    headers.append((b"accept-encoding", b"identity"))
+    if item.body:
+        headers.append((b"content-length", str(len(item.body)).encode("latin-1")))
+
+    return {
+        "type": "http",
+        "asgi": parent.get("asgi", {"version": "3.0"}),
+        "http_version": parent.get("http_version", "1.1"),
+        "method": item.method,
+        "scheme": parent.get("scheme", "http"),
+        "server": parent.get("server"),
+        "client": parent.get("client"),
+        "root_path": parent.get("root_path", ""),
+        # Like a server does: ``path`` is decoded, ``raw_path`` as sent
+        "path": unquote(item.path),
+        "raw_path": item.path.encode("utf-8"),
+        "query_string": item.query.encode("latin-1"),
+        "headers": headers,
+    }
+
+
+def _decode_body(media_type, body):
+    """Represent a sub-response body in JSON: parsed JSON, text or base64."""
+    if not body:
+        return {"body": None}
+    media_type = (media_type or "").split(";", 1)[0].strip().lower()
+    if media_type == "application/json" or media_type.endswith("+json"):
+        try:
+            return {"body": json.loads(body)}
+        except ValueError:
+            pass
+    if media_type.startswith("text/") or media_type.endswith(("json", "xml")):
+        try:
+            return {"body": body.decode("utf-8")}
+        except UnicodeDecodeError:
+            pass
+    return {"body": base64.b64encode(body).decode("ascii"), "body_encoding": "base64"}
+
+
+async def dispatch(app, parent_scope, item):
+    """Run one sub-request through the full ASGI app and return its result."""
+    if item.error is not None:
+        return {"id": item.id, "status": 400, "headers": {}, "body": {"detail": item.error}}
+
+    scope = build_scope(parent_scope, item)
+    body_sent = False
+    finished = asyncio.Event()
+    status_code = 500
+    response_headers = []
+    chunks = []
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": item.body, "more_body": False}
+        # Nobody disconnects from a sub-request; wait until it is done
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status_code, response_headers
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            response_headers = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    except Exception as e:
+        logger.error(f"Batch item {item.id} ({item.method} {item.path}) failed: {e}", exc_info=True)
+        return {"id": item.id, "status": 500, "headers": {}, "body": {"detail": "Internal server error"}}
+    finally:
+        finished.set()
+
+    headers = {}
+    for name, value in response_headers:
+        name = name.decode("latin-1").lower()
+        if name not in EXCLUDED_ITEM_HEADERS and not name.startswith("access-control-"):
+            headers[name] = value.decode("latin-1")
+    result = {"id": item.id, "status": status_code, "headers": headers}
+    result.update(_decode_body(headers.get("content-type"), b"".join(chunks)))
+    return result
+
+
+async def run_batch(app, parent_scope, items, concurrency):
+    """
+    Run the sub-requests with at most ``concurrency`` at a time, yielding
+    (index, result) pairs as they complete. Unfinished sub-requests are
+    cancelled if the caller stops iterating (e.g. the client went away).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index, item):
+        async with semaphore:
+            return index, await dispatch(app, parent_scope, item)
+
+    tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,234 @@
+import time
+import logging
+from dataclasses import dataclass
+from utils.upstream_pools import upstream_pools, upstream_setting, origin_of
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Upstream statuses that mean the service itself is unhealthy
+FAILURE_STATUSES = (502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit open for {name}")
+        self.name = name
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class BreakerSettings:
+    """Thresholds for one upstream's circuit breaker."""
+
+    # Rolling window length in seconds and the number of buckets it is split into
+    window: float = 30.0
+    buckets: int = 10
+    # Calls needed in the window before the rates are acted on
+    min_calls: int = 20
+    # Open when this share of calls failed...
+    failure_rate: float = 0.5
+    # ...or when this share of calls took longer than slow_call_seconds
+    slow_call_rate: float = 0.8
+    slow_call_seconds: float = 10.0
+    # Seconds to stay open before letting probes through
+    open_seconds: float = 5.0
+    # Concurrent probes allowed while half-open; this many successes close the circuit
+    half_open_probes: int = 3
+
+    @classmethod
+    def from_env(cls, service):
+        """Build settings from ``<SERVICE>_SERVICE_CIRCUIT_*`` / ``UPSTREAM_CIRCUIT_*``."""
+        defaults = cls()
+        return cls(
+            window=upstream_setting(service, "CIRCUIT_WINDOW", defaults.window, float),
+            buckets=defaults.buckets,
+            min_calls=upstream_setting(service, "CIRCUIT_MIN_CALLS", defaults.min_calls, int),
+            failure_rate=upstream_setting(service, "CIRCUIT_FAILURE_RATE", defaults.failure_rate, float),
+            slow_call_rate=upstream_setting(service, "CIRCUIT_SLOW_CALL_RATE", defaults.slow_call_rate, float),
+            slow_call_seconds=upstream_setting(service, "CIRCUIT_SLOW_CALL_SECONDS", defaults.slow_call_seconds, float),
+            open_seconds=upstream_setting(service, "CIRCUIT_OPEN_SECONDS", defaults.open_seconds, float),
+            half_open_probes=upstream_setting(service, "CIRCUIT_HALF_OPEN_PROBES", defaults.half_open_probes, int),
+        )
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream, driven by a rolling window of outcomes.
+
+    The window is split into buckets of [calls, failures, slow calls] that
+    are reused as time moves on, so recording an outcome is O(1). While
+    closed, the circuit opens once the window holds at least ``min_calls``
+    and the failure or slow-call rate crosses its threshold. While open,
+    calls fail immediately. After ``open_seconds`` the circuit turns
+    half-open and admits up to ``half_open_probes`` concurrent calls: as many
+    successes close it, any failure opens it again.
+    """
+
+    def __init__(self, name, settings=None, clock=time.monotonic):
+        self.name = name
+        self.settings = settings or BreakerSettings()
+        self.clock = clock
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._bucket_width = self.settings.window / self.settings.buckets
+        # bucket -> [bucket index, calls, failures, slow]
+        self._buckets = [[0, 0, 0, 0] for _ in range(self.settings.buckets)]
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    def _bucket(self, now):
+        index = int(now // self._bucket_width)
+        bucket = self._buckets[index % len(self._buckets)]
+        if bucket[0] != index:
+            bucket[:] = [index, 0, 0, 0]
+        return bucket
+
+    def _totals(self, now):
+        oldest = int(now // self._bucket_width) - len(self._buckets) + 1
+        calls = failures = slow = 0
+        for index, c, f, s in self._buckets:
+            if index >= oldest:
+                calls += c
+                failures += f
+                slow += s
+        return calls, failures, slow
+
+    def _open(self, now, reason):
+        self.state = OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        logger.warning(f"Circuit for {self.name} opened: {reason}")
+
+    def _close(self):
+        self.state = CLOSED
+        for bucket in self._buckets:
+            bucket[:] = [0, 0, 0, 0]
+        logger.info(f"Circuit for {self.name} closed")
+
+    def is_open(self, now=None):
+        """True while the circuit rejects calls, without reserving a probe."""
+        return self.state == OPEN and self.retry_after(now) > 0
+
+    def retry_after(self, now=None):
+        """Seconds until an open circuit admits probes again."""
+        if now is None:
+            now = self.clock()
+        return max(0.0, self.opened_at + self.settings.open_seconds - now)
+
+    def allow(self, now=None):
+        """
+        Return True if a call may go to the upstream. A True result in the
+        half-open state reserves a probe slot, which must be given back
+        through ``record`` or ``release``.
+        """
+        if self.state == CLOSED:
+            return True
+        if now is None:
+            now = self.clock()
+        if self.state == OPEN:
+            if self.retry_after(now) > 0:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+            logger.info(f"Circuit for {self.name} half-open, probing")
+        if self._probes_in_flight >= self.settings.half_open_probes:
+            self.rejected += 1
+            return False
+        self._probes_in_flight += 1
+        return True
+
+    def record(self, success, latency, now=None):
+        """Record the outcome of a call that ``allow`` admitted."""
+        if now is None:
+            now = self.clock()
+        settings = self.settings
+        slow = latency >= settings.slow_call_seconds
+
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if not success or slow:
+                self._open(now, "probe failed" if not success else "probe was slow")
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= settings.half_open_probes:
+                self._close()
+            return
+        if self.state == OPEN:
+            # A call admitted before the circuit opened
+            return
+
+        bucket = self._bucket(now)
+        bucket[1] += 1
+        if not success:
+            bucket[2] += 1
+        if slow:
+            bucket[3] += 1
+
+        if success and not slow:
+            return
+        calls, failures, slow_calls = self._totals(now)
+        if calls < settings.min_calls:
+            return
+        if failures / calls >= settings.failure_rate:
+            self._open(now, f"{failures}/{calls} calls failed in the last {settings.window:g}s")
+        elif slow_calls / calls >= settings.slow_call_rate:
+            self._open(now, f"{slow_calls}/{calls} calls slower than {settings.slow_call_seconds:g}s")
+
+    def release(self):
+        """Give back a probe slot for a call that ended without an outcome (e.g. cancelled)."""
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def stats(self, now=None):
+        if now is None:
+            now = self.clock()
+        calls, failures, slow = self._totals(now)
+        result = {
+            "state": self.state,
+            "calls": calls,
+            "failures": failures,
+            "slow_calls": slow,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
+        if self.state == OPEN:
+            result["retry_after"] = round(self.retry_after(now), 3)
+        return result
+
+
+class CircuitBreakerRegistry:
+    """One circuit breaker per upstream origin (i.e. per service endpoint)."""
+
+    def __init__(self):
+        self._breakers = {}
+
+    def breaker_for(self, url):
+        origin = origin_of(url)
+        breaker = self._breakers.get(origin)
+        if breaker is None:
+            service = upstream_pools.service_for(url)
+            breaker = CircuitBreaker(upstream_pools.label_for(url), BreakerSettings.from_env(service or "default"))
+            self._breakers[origin] = breaker
+        return breaker
+
+    def stats(self):
+        return {breaker.name: breaker.stats() for breaker in self._breakers.values()}
+
+
+# Shared registry used by proxy_request
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,115 @@
+import os
+import json
+import asyncio
+import logging
+from dataclasses import dataclass
+from fastapi import Request
+from utils.batch import BatchItem, build_scope
+from utils.proxy_request import proxy_request
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+
+@dataclass(frozen=True)
+class Part:
+    """One upstream read that contributes to a composed response."""
+
+    name: str
+    # Gateway path of the read; it decides the route policy and cache rule
+    path: str
+    destination_url: str
+    query: str = ""
+    timeout: float = 2.0
+    # The composed response fails with this part's status if it fails
+    required: bool = False
+
+
+def part_timeout(prefix, name, default):
+    """Read ``<PREFIX>_<NAME>_TIMEOUT``, falling back to ``<PREFIX>_TIMEOUT``."""
+    for key in (f"{prefix}_{name.upper()}_TIMEOUT", f"{prefix}_TIMEOUT"):
+        value = os.getenv(key)
+        if value not in (None, ""):
+            try:
+                return float(value)
+            except ValueError:
+                logger.warning(f"Ignoring invalid value for {key}: {value!r}")
+    return default
+
+
+def _decode(response):
+    if not response.body:
+        return None
+    try:
+        return json.loads(response.body)
+    except ValueError:
+        return response.body.decode("utf-8", "replace")
+
+
+async def fetch_part(request: Request, part: Part):
+    """
+    Proxy one GET for ``part`` as if the client had sent it to the gateway
+    path, with the client's headers. The response cache and request
+    coalescing apply as usual. Returns (status code, decoded body).
+
+    Each part gets a receive channel of its own that never reports a
+    disconnect, so parts do not compete for the client's. When ``compose``
+    gives up on a part, the coalesced upstream call keeps running and still
+    fills the response cache.
+    """
+    scope = build_scope(request.scope, BatchItem(part.name, "GET", part.path, part.query, ()))
+    finished = asyncio.Event()
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Nobody disconnects from a part; wait until it is done
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    try:
+        response = await proxy_request(Request(scope, receive), part.destination_url, buffered=True, coalesce=True)
+    finally:
+        finished.set()
+    return response.status_code, _decode(response)
+
+
+async def compose(request: Request, parts):
+    """
+    Fetch all parts concurrently and merge them into one payload keyed by
+    part name. A part that fails or exceeds its timeout is set to None and
+    described under ``errors``; the others are still returned.
+
+    Returns (status code, payload): 200, or the status of a failed required part.
+    """
+    async def run(part):
+        try:
+            return await asyncio.wait_for(fetch_part(request, part), part.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Part {part.name} timed out after {part.timeout:g}s")
+            return 504, {"detail": f"Timed out after {part.timeout:g}s"}
+        except Exception as e:
+            logger.error(f"Part {part.name} failed: {e}", exc_info=True)
+            return 500, {"detail": "Internal server error"}
+
+    results = await asyncio.gather(*(run(part) for part in parts))
+
+    payload = {}
+    errors = {}
+    status_code = 200
+    for part, (part_status, body) in zip(parts, results):
+        if 200 <= part_status < 300:
+            payload[part.name] = body
+            continue
+        payload[part.name] = None
+        detail = body.get("detail", body) if isinstance(body, dict) else body
+        errors[part.name] = {"status": part_status, "detail": detail}
+        if part.required and status_code == 200:
+            status_code = part_status
+    payload["partial"] = bool(errors)
+    if errors:
+        payload["errors"] = errors
+    return status_code, payload
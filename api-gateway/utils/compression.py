@@ -0,0 +1,260 @@
+import os
+import zlib
+import logging
+from dataclasses import dataclass
+
+from starlette.concurrency import run_in_threadpool
+
+# Optional codecs; gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# Encodings the gateway can produce, in order of preference when the client
+# accepts several with the same weight
+AVAILABLE_ENCODINGS = tuple(
+    name for name, codec in (("br", brotli), ("zstd", zstandard), ("gzip", zlib)) if codec is not None
+)
+
+# Encodings httpx can decode, sent upstream as Accept-Encoding so that any
+# compressed upstream body can be read or passed through
+UPSTREAM_ACCEPT_ENCODING = ", ".join(["gzip", "deflate"] + (["br"] if brotli is not None else []))
+
+# Media types worth compressing; images, video and archives are already compressed
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/problem+json",
+    "image/svg+xml",
+)
+
+# Statuses whose responses have no body or a partial one
+UNCOMPRESSIBLE_STATUSES = (204, 206, 304)
+
+
+def _bool(value):
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class CompressionSettings:
+    """When and how the gateway compresses responses."""
+
+    enabled: bool = True
+    # Smaller bodies are sent as-is; the headers would eat most of the gain
+    min_size: int = 1024
+    gzip_level: int = 6
+    brotli_quality: int = 4
+    zstd_level: int = 3
+    # Bodies (or runs of stream chunks) at least this large are compressed
+    # in a worker thread so the event loop keeps serving other requests
+    threadpool_min_size: int = 64 * 1024
+
+    @classmethod
+    def from_env(cls):
+        defaults = cls()
+        return cls(
+            enabled=_bool(os.getenv("COMPRESSION_ENABLED", "true")),
+            min_size=int(os.getenv("COMPRESSION_MIN_SIZE", defaults.min_size)),
+            gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", defaults.gzip_level)),
+            brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", defaults.brotli_quality)),
+            zstd_level=int(os.getenv("COMPRESSION_ZSTD_LEVEL", defaults.zstd_level)),
+            threadpool_min_size=int(os.getenv("COMPRESSION_THREADPOOL_MIN_SIZE", defaults.threadpool_min_size)),
+        )
+
+
+def parse_accept_encoding(value):
+    """Parse an Accept-Encoding header into a dict of coding -> q-value."""
+    accepted = {}
+    for part in (value or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, arg = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(arg)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(accept_encoding, available=AVAILABLE_ENCODINGS):
+    """Return the best encoding the client accepts, or None for identity."""
+    accepted = parse_accept_encoding(accept_encoding)
+    if not accepted:
+        return None
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def accepts(accept_encoding, encoding):
+    """True if the client accepts ``encoding`` (e.g. to pass an upstream body through)."""
+    accepted = parse_accept_encoding(accept_encoding)
+    return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+
+def is_compressible(media_type):
+    if not media_type:
+        return False
+    media_type = media_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+def add_vary(headers, name="Accept-Encoding"):
+    """Add ``name`` to the Vary header in a dict of response headers."""
+    for key in headers:
+        if key.lower() == "vary":
+            values = [v.strip() for v in headers[key].split(",")]
+            if name.lower() not in (v.lower() for v in values) and "*" not in values:
+                headers[key] = f"{headers[key]}, {name}"
+            return
+    headers["Vary"] = name
+
+
+def weaken_etag(headers):
+    """A compressed body is not byte-identical to the upstream's, so its ETag must be weak."""
+    for key in headers:
+        if key.lower() == "etag":
+            if not headers[key].startswith("W/"):
+                headers[key] = "W/" + headers[key]
+            return
+
+
+class StreamCompressor:
+    """Incremental compressor for one response body."""
+
+    def __init__(self, encoding, settings):
+        self.encoding = encoding
+        if encoding == "gzip":
+            codec = zlib.compressobj(settings.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress, self._flush = codec.compress, codec.flush
+        elif encoding == "br":
+            codec = brotli.Compressor(quality=settings.brotli_quality)
+            self._compress, self._flush = codec.process, codec.finish
+        elif encoding == "zstd":
+            codec = zstandard.ZstdCompressor(level=settings.zstd_level).compressobj()
+            self._compress, self._flush = codec.compress, codec.flush
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data):
+        return self._compress(data)
+
+    def flush(self):
+        return self._flush()
+
+
+class ResponseCompressor:
+    """
+    Negotiates and applies response compression for the proxy layer.
+
+    Buffered bodies are compressed in one go; streamed bodies are collected
+    into runs of ``threadpool_min_size`` bytes, each compressed in the
+    threadpool, so work on large bodies never runs on the event loop.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = settings or CompressionSettings.from_env()
+        self.compressed = 0
+        self.passed_through = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def choose(self, request, status_code, headers, media_type, size=None):
+        """
+        Return the encoding to apply to a response, or None to send it as-is.
+        ``size`` is the body length when known.
+        """
+        settings = self.settings
+        if not settings.enabled or request.method == "HEAD":
+            return None
+        if status_code < 200 or status_code in UNCOMPRESSIBLE_STATUSES:
+            return None
+        if size is not None and size < settings.min_size:
+            return None
+        if not is_compressible(media_type):
+            return None
+        lowered = {name.lower(): value for name, value in headers.items()}
+        if "content-encoding" in lowered or "content-range" in lowered:
+            return None
+        if "no-transform" in lowered.get("cache-control", "").lower():
+            return None
+        return negotiate(request.headers.get("accept-encoding"))
+
+    def _compress(self, encoding, body):
+        compressor = StreamCompressor(encoding, self.settings)
+        return compressor.compress(body) + compressor.flush()
+
+    async def compress(self, encoding, body):
+        """Compress a whole body."""
+        if len(body) >= self.settings.threadpool_min_size:
+            compressed = await run_in_threadpool(self._compress, encoding, body)
+        else:
+            compressed = self._compress(encoding, body)
+        self.compressed += 1
+        self.bytes_in += len(body)
+        self.bytes_out += len(compressed)
+        return compressed
+
+    async def compress_stream(self, encoding, chunks):
+        """
+        Compress an async iterator of body chunks. Upstream chunks are often
+        a few KiB, so they are collected up to the threadpool threshold
+        before being compressed; the codecs hold small inputs back anyway.
+        """
+        compressor = StreamCompressor(encoding, self.settings)
+        threshold = self.settings.threadpool_min_size
+        self.compressed += 1
+        pending = []
+        pending_size = 0
+        async for chunk in chunks:
+            self.bytes_in += len(chunk)
+            pending.append(chunk)
+            pending_size += len(chunk)
+            if pending_size < threshold:
+                continue
+            data = await run_in_threadpool(compressor.compress, b"".join(pending))
+            pending.clear()
+            pending_size = 0
+            if data:
+                self.bytes_out += len(data)
+                yield data
+        # The tail is below the threshold
+        data = compressor.compress(b"".join(pending)) + compressor.flush()
+        self.bytes_out += len(data)
+        yield data
+
+    def stats(self):
+        return {
+            "enabled": self.settings.enabled,
+            "encodings": list(AVAILABLE_ENCODINGS),
+            "compressed": self.compressed,
+            "passed_through": self.passed_through,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+        }
+
+
+# Shared compressor used by proxy_request
+response_compressor = ResponseCompressor()
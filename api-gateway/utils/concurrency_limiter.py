@@ -0,0 +1,298 @@
+import time
+import heapq
+import asyncio
+import logging
+from dataclasses import dataclass
+from utils.upstream_pools import upstream_pools, upstream_setting, origin_of, _bool
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# Route priority classes, most important first
+CRITICAL = "critical"
+NORMAL = "normal"
+LOW = "low"
+PRIORITIES = (CRITICAL, NORMAL, LOW)
+RANKS = {priority: rank for rank, priority in enumerate(PRIORITIES)}
+
+# Weight of each response in the recent latency average (about the last 10)
+RECENT_ALPHA = 0.1
+
+# A recent average below this never counts as a sign of overload, however
+# small the baseline; it keeps jitter on a fast upstream from shrinking the limit
+SLOW_LATENCY_FLOOR = 0.01
+
+
+class OverloadedError(Exception):
+    """Raised instead of calling an upstream that has no capacity left for the request."""
+
+    def __init__(self, name, priority, retry_after):
+        super().__init__(f"{name} is overloaded, shed {priority} request")
+        self.name = name
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class LimiterSettings:
+    """Adaptive concurrency limit and queueing for one upstream."""
+
+    enabled: bool = True
+    # Starts at the upstream's pool size unless set (see from_env), so a
+    # cold process does not shed requests its pool could carry
+    initial_limit: int = 100
+    min_limit: int = 2
+    max_limit: int = 200
+    # Recent latency above this multiple of the baseline latency counts as overload
+    latency_tolerance: float = 2.0
+    # The limit is multiplied by this on overload, at most once per round trip
+    backoff: float = 0.9
+    # Responses the baseline latency is averaged over; it follows slow,
+    # lasting changes such as a deploy, not a burst of queueing
+    baseline_samples: int = 500
+    # Requests waiting for a slot; normal priority may use half of it, low
+    # priority a quarter
+    max_queue: int = 50
+    # Seconds a queued request waits for a slot before it is shed
+    queue_timeout: float = 1.0
+    # Low priority requests only start while in-flight requests are below
+    # this share of the limit, keeping headroom for the other classes
+    low_priority_share: float = 0.75
+    # Retry-After sent with a shed request
+    retry_after: int = 1
+    # Seconds without a measured response after which a lowered limit is
+    # reset to its initial value, as what it was based on is out of date
+    idle_reset: float = 30.0
+
+    @classmethod
+    def from_env(cls, service, pool_size=None):
+        """
+        Build settings from ``<SERVICE>_SERVICE_CONCURRENCY_*`` /
+        ``UPSTREAM_CONCURRENCY_*``. The initial limit defaults to
+        ``pool_size``, the upstream pool's ``max_connections``, when given.
+        """
+        defaults = cls()
+        initial_limit = pool_size if pool_size is not None else defaults.initial_limit
+        return cls(
+            enabled=upstream_setting(service, "CONCURRENCY_LIMIT_ENABLED", defaults.enabled, _bool),
+            initial_limit=upstream_setting(service, "CONCURRENCY_INITIAL_LIMIT", initial_limit, int),
+            min_limit=upstream_setting(service, "CONCURRENCY_MIN_LIMIT", defaults.min_limit, int),
+            max_limit=upstream_setting(service, "CONCURRENCY_MAX_LIMIT", defaults.max_limit, int),
+            latency_tolerance=upstream_setting(service, "CONCURRENCY_LATENCY_TOLERANCE", defaults.latency_tolerance, float),
+            backoff=upstream_setting(service, "CONCURRENCY_BACKOFF", defaults.backoff, float),
+            baseline_samples=upstream_setting(service, "CONCURRENCY_BASELINE_SAMPLES", defaults.baseline_samples, int),
+            max_queue=upstream_setting(service, "CONCURRENCY_MAX_QUEUE", defaults.max_queue, int),
+            queue_timeout=upstream_setting(service, "CONCURRENCY_QUEUE_TIMEOUT", defaults.queue_timeout, float),
+            low_priority_share=upstream_setting(service, "CONCURRENCY_LOW_PRIORITY_SHARE", defaults.low_priority_share, float),
+            retry_after=upstream_setting(service, "CONCURRENCY_RETRY_AFTER", defaults.retry_after, int),
+            idle_reset=upstream_setting(service, "CONCURRENCY_IDLE_RESET", defaults.idle_reset, float),
+        )
+
+
+class ConcurrencyLimiter:
+    """
+    Adaptive limit on concurrent requests to one upstream (AIMD).
+
+    Response latency of bodiless requests is tracked as two moving
+    averages: a recent one over about ten responses and a baseline over
+    ``baseline_samples``. Requests with a body (uploads, writes) only count
+    for their errors, as their latency depends on what they send. While the
+    recent average stays within ``latency_tolerance`` times the baseline and
+    the limit is actually used, the limit grows by about one per round trip;
+    a limit below its initial value that is not fully used grows by one per
+    response instead, and is reset after ``idle_reset`` seconds without
+    responses. Queueing upstream shows up as the recent average pulling
+    away from the baseline; that, a transport error or a 502/503/504
+    multiplies the limit by ``backoff``, at most once per round trip.
+    Averages rather than the minimum keep an upstream's slower routes from
+    looking like overload.
+
+    Requests over the limit wait in a bounded queue served by priority, then
+    arrival order. Critical requests may fill the whole queue, normal ones
+    half of it and low priority ones a quarter. Low priority requests only
+    start while in-flight requests are below ``low_priority_share`` of the
+    limit, keeping headroom for the others.
+    """
+
+    def __init__(self, name, settings=None, clock=time.monotonic):
+        self.name = name
+        self.settings = settings or LimiterSettings()
+        self.clock = clock
+
+        self.initial_limit = float(min(max(self.settings.initial_limit, self.settings.min_limit), self.settings.max_limit))
+        self.limit = self.initial_limit
+        self.in_flight = 0
+        # (priority rank, arrival, future) of waiting requests
+        self._queue = []
+        self._arrivals = 0
+        self._last_decrease = 0.0
+        self._last_sample = clock()
+        self.recent_latency = None
+        self.baseline_latency = None
+
+        self.shed = {priority: 0 for priority in PRIORITIES}
+        self.queued = 0
+        self.decreases = 0
+
+    @property
+    def current_limit(self):
+        return int(self.limit)
+
+    def _has_room(self, rank):
+        limit = self.current_limit
+        if rank == RANKS[LOW]:
+            limit *= self.settings.low_priority_share
+        return self.in_flight < limit
+
+    def _admits(self, rank):
+        # Nobody overtakes a waiting request of the same or a higher priority
+        return self._has_room(rank) and not (self._queue and self._queue[0][0] <= rank)
+
+    def _queue_room(self, rank):
+        if rank == RANKS[CRITICAL]:
+            return self.settings.max_queue
+        if rank == RANKS[NORMAL]:
+            return self.settings.max_queue // 2
+        return self.settings.max_queue // 4
+
+    def _reject(self, priority):
+        self.shed[priority] += 1
+        raise OverloadedError(self.name, priority, self.settings.retry_after)
+
+    async def acquire(self, priority=NORMAL):
+        """
+        Take a slot for one upstream call, waiting in the queue if needed.
+        Raises OverloadedError when the request is shed. The start time to
+        pass to ``release`` is returned.
+        """
+        rank = RANKS[priority]
+        if self.limit < self.initial_limit and self.clock() - self._last_sample >= self.settings.idle_reset:
+            self.limit = self.initial_limit
+            logger.debug(f"Concurrency limit for {self.name} reset to {self.current_limit} after idling")
+        if self._admits(rank):
+            self.in_flight += 1
+            return self.clock()
+        if len(self._queue) >= self._queue_room(rank):
+            self._reject(priority)
+
+        future = asyncio.get_running_loop().create_future()
+        self._arrivals += 1
+        entry = (rank, self._arrivals, future)
+        heapq.heappush(self._queue, entry)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.settings.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._remove(entry)
+                future.cancel()
+                self._reject(priority)
+        except BaseException:
+            self._remove(entry)
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller went away
+                self.in_flight -= 1
+                self._wake()
+            raise
+        return self.clock()
+
+    def _remove(self, entry):
+        try:
+            self._queue.remove(entry)
+        except ValueError:
+            return
+        heapq.heapify(self._queue)
+
+    def _wake(self):
+        # The head of the queue has the highest priority waiting
+        while self._queue and self._has_room(self._queue[0][0]):
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def release(self, started, overloaded=None, now=None, sample=True):
+        """
+        Give back a slot taken at ``started``. ``overloaded`` is True for an
+        error response or transport failure, False for a normal response, and
+        None for a call that ended without an outcome (e.g. cancelled).
+        ``sample=False`` keeps a normal response's latency out of the
+        averages, for requests whose time depends on the body they send.
+        """
+        if now is None:
+            now = self.clock()
+        in_flight = self.in_flight
+        self.in_flight = max(0, in_flight - 1)
+        if overloaded or (overloaded is not None and sample):
+            self._update(now - started, overloaded, started, now, in_flight)
+        self._wake()
+
+    def _update(self, latency, overloaded, started, now, in_flight):
+        settings = self.settings
+        self._last_sample = now
+        if not overloaded:
+            if self.baseline_latency is None:
+                self.recent_latency = self.baseline_latency = latency
+            else:
+                self.recent_latency += RECENT_ALPHA * (latency - self.recent_latency)
+                self.baseline_latency += (latency - self.baseline_latency) / max(1, settings.baseline_samples)
+                # The baseline follows improvements at once, so one measured
+                # under load does not hide the next overload
+                self.baseline_latency = min(self.baseline_latency, self.recent_latency)
+            threshold = max(self.baseline_latency * settings.latency_tolerance, SLOW_LATENCY_FLOOR)
+            overloaded = self.recent_latency > threshold
+
+        if overloaded:
+            # Cut at most once per round trip: calls started before the last
+            # cut saw the old limit, and the recent average needs a round
+            # trip of responses to show whether the cut helped
+            round_trip = self.recent_latency if self.recent_latency is not None else latency
+            if started >= self._last_decrease and now - self._last_decrease >= round_trip:
+                self.limit = max(float(settings.min_limit), self.limit * settings.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+                logger.debug(f"Concurrency limit for {self.name} lowered to {self.current_limit}")
+        elif in_flight * 2 >= self.limit:
+            # Grow by one per limit's worth of responses, i.e. about one per round trip
+            self.limit = min(float(settings.max_limit), self.limit + 1.0 / self.limit)
+        elif self.limit < self.initial_limit:
+            # A lowered limit that is not even half used says nothing about
+            # capacity; healthy responses bring it back toward the pool size
+            self.limit = min(self.initial_limit, self.limit + 1.0)
+
+    def stats(self):
+        return {
+            "limit": self.current_limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._queue),
+            "recent_latency": round(self.recent_latency, 4) if self.recent_latency is not None else None,
+            "baseline_latency": round(self.baseline_latency, 4) if self.baseline_latency is not None else None,
+            "queued_total": self.queued,
+            "shed": dict(self.shed),
+            "decreases": self.decreases,
+        }
+
+
+class ConcurrencyLimiterRegistry:
+    """One concurrency limiter per upstream origin, or None where disabled."""
+
+    def __init__(self):
+        self._limiters = {}
+
+    def limiter_for(self, url):
+        origin = origin_of(url)
+        if origin in self._limiters:
+            return self._limiters[origin]
+        service = upstream_pools.service_for(url)
+        pool_size = upstream_pools.settings_for(url).max_connections
+        settings = LimiterSettings.from_env(service or "default", pool_size)
+        limiter = ConcurrencyLimiter(upstream_pools.label_for(url), settings) if settings.enabled else None
+        self._limiters[origin] = limiter
+        return limiter
+
+    def stats(self):
+        return {limiter.name: limiter.stats() for limiter in self._limiters.values() if limiter is not None}
+
+
+# Shared registry used by proxy_request
+concurrency_limiters = ConcurrencyLimiterRegistry()
@@ -0,0 +1,144 @@
+import time
+import asyncio
+import logging
+from fastapi import Request
+from utils.route_policy import route_policies
+from utils.single_flight import CLIENT_DISCONNECTED
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# Remaining time budget in milliseconds. Read from clients (and from
+# services calling the gateway) and sent to upstreams with what is left.
+DEADLINE_HEADER = "x-request-timeout-ms"
+
+# Key of the request's deadline in the ASGI scope state
+STATE_KEY = "deadline"
+
+# Methods whose upstream call is abandoned when the client disconnects.
+# Writes are left to finish, so a booking or payment is not cut off halfway.
+CANCELLABLE_METHODS = ("GET", "HEAD")
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's time budget runs out before the upstream answered."""
+
+    def __init__(self, budget):
+        super().__init__(f"Deadline of {budget:g}s exceeded")
+        self.budget = budget
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away while the gateway was waiting for the upstream."""
+
+
+class Deadline:
+    """A point in time (on the monotonic clock) by which a request must be answered."""
+
+    __slots__ = ("budget", "expires_at", "clock")
+
+    def __init__(self, budget, clock=time.monotonic):
+        self.budget = budget
+        self.clock = clock
+        self.expires_at = clock() + budget
+
+    def remaining(self):
+        return self.expires_at - self.clock()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def header_value(self):
+        return str(max(1, int(self.remaining() * 1000)))
+
+
+def _header_budget(request: Request):
+    value = request.headers.get(DEADLINE_HEADER)
+    if value is None:
+        return None
+    try:
+        budget = int(value.strip()) / 1000
+    except ValueError:
+        logger.debug(f"Ignoring invalid {DEADLINE_HEADER} header: {value!r}")
+        return None
+    return max(0.0, budget)
+
+
+def deadline_for(request: Request):
+    """
+    Return the request's deadline, or None when it has no budget. The
+    budget is the route policy's timeout, shortened by the client's
+    ``X-Request-Timeout-Ms`` header. It is fixed on first use and kept in
+    the scope state, so retries, hedges and sub-calls share it.
+    """
+    state = request.scope.setdefault("state", {})
+    if STATE_KEY in state:
+        return state[STATE_KEY]
+
+    budgets = [
+        budget for budget in (
+            route_policies.match(request.method, request.url.path).timeout,
+            _header_budget(request),
+        )
+        if budget is not None
+    ]
+    deadline = Deadline(min(budgets)) if budgets else None
+    state[STATE_KEY] = deadline
+    return deadline
+
+
+async def _disconnected(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+def _abandon(task, msg=None):
+    """Cancel an upstream call nobody waits for, closing its response if it already has one."""
+    def close(t):
+        if not t.cancelled() and t.exception() is None:
+            aclose = getattr(t.result(), "aclose", None)
+            if aclose is not None:
+                asyncio.ensure_future(aclose())
+
+    task.cancel(msg)
+    task.add_done_callback(close)
+
+
+async def within_deadline(request: Request, deadline, awaitable, watch_disconnect=False):
+    """
+    Await an upstream call, giving up when ``deadline`` passes (raising
+    DeadlineExceeded) or, with ``watch_disconnect``, when the client
+    disconnects (raising ClientDisconnected). The call is cancelled either
+    way; only a disconnect also cancels a coalesced call the request was the
+    last one waiting for (see SingleFlight).
+
+    Only watch for disconnects on requests without a body: the body is read
+    by the upstream call, and listening at the same time would steal its
+    messages.
+    """
+    task = asyncio.ensure_future(awaitable)
+    watcher = None
+    waiting = {task}
+    if watch_disconnect:
+        watcher = asyncio.ensure_future(_disconnected(request.receive))
+        waiting.add(watcher)
+
+    disconnected = False
+    try:
+        timeout = max(0.0, deadline.remaining()) if deadline is not None else None
+        done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if task in done:
+            return task.result()
+        if watcher is not None and watcher in done:
+            disconnected = True
+            raise ClientDisconnected()
+        raise DeadlineExceeded(deadline.budget)
+    finally:
+        if not task.done():
+            _abandon(task, CLIENT_DISCONNECTED if disconnected else None)
+        if watcher is not None:
+            watcher.cancel()
+            if watcher.done() and not watcher.cancelled():
+                watcher.exception()
@@ -0,0 +1,329 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import mimetypes
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.types import Receive, Scope, Send
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# Upload names that never change content once written: multer's
+# "<timestamp>-<random>.<ext>" and hex content hashes
+IMMUTABLE_NAME = re.compile(r"^(\d{10,}-\d+|[0-9a-f]{16,})(\.[A-Za-z0-9]+)?$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# The ASGI extension for handing a file to the server instead of its bytes
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+@dataclass(frozen=True)
+class FileServerSettings:
+    """Where uploads live and how they are cached."""
+
+    root: str = "/app/uploads"
+    # Seconds a stat result is trusted before the file is checked again
+    stat_ttl: float = 2.0
+    max_entries: int = 10_000
+    # Cache-Control max-age for names that may be overwritten (e.g. user.png)
+    max_age: int = 3600
+    # Bytes read per chunk when the server cannot send the file itself
+    chunk_size: int = 256 * 1024
+
+    @classmethod
+    def from_env(cls):
+        defaults = cls()
+        return cls(
+            root=os.getenv("UPLOADS_DIR", defaults.root),
+            stat_ttl=float(os.getenv("UPLOADS_STAT_TTL", defaults.stat_ttl)),
+            max_entries=int(os.getenv("UPLOADS_STAT_CACHE_ENTRIES", defaults.max_entries)),
+            max_age=int(os.getenv("UPLOADS_CACHE_MAX_AGE", defaults.max_age)),
+            chunk_size=int(os.getenv("UPLOADS_CHUNK_SIZE", defaults.chunk_size)),
+        )
+
+
+class FileStat:
+    """Cached metadata of one path under the root; ``exists`` is False for misses."""
+
+    __slots__ = ("path", "exists", "is_file", "is_dir", "size", "mtime", "etag", "last_modified", "media_type", "checked_at")
+
+    def __init__(self, path, st=None, checked_at=0.0):
+        self.path = path
+        self.checked_at = checked_at
+        self.exists = st is not None
+        self.is_file = self.exists and (st.st_mode & 0o170000) == 0o100000
+        self.is_dir = self.exists and (st.st_mode & 0o170000) == 0o040000
+        self.size = st.st_size if self.exists else 0
+        self.mtime = st.st_mtime if self.exists else 0.0
+        # Changes whenever the file is replaced or rewritten
+        self.etag = f'"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"' if self.exists else None
+        self.last_modified = formatdate(st.st_mtime, usegmt=True) if self.exists else None
+        self.media_type = (mimetypes.guess_type(path)[0] or "application/octet-stream") if self.is_file else None
+
+
+def _etag_matches(header, etag):
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _not_modified_since(header, mtime):
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return since is not None and int(mtime) <= since.timestamp()
+
+
+def parse_range(header, size):
+    """
+    Parse a single ``bytes=`` range against a file of ``size`` bytes.
+    Returns (start, end) inclusive, None to ignore the header (malformed or
+    several ranges, answered with the whole file), or "unsatisfiable".
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+class FileRangeResponse(Response):
+    """
+    Sends ``count`` bytes of a file from ``offset``. Uses the server's
+    zero-copy send when it offers the ASGI extension, otherwise large reads
+    in the threadpool.
+    """
+
+    def __init__(self, path, offset, count, status_code, headers, media_type, chunk_size, send_body=True, server=None):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.server = server
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.chunk_size = chunk_size
+        self.send_body = send_body
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not self.send_body:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        # Open before sending headers, so a file removed since the stat is a 404
+        try:
+            fd = await run_in_threadpool(os.open, self.path, os.O_RDONLY)
+        except OSError:
+            (self.server or file_server).invalidate_path(self.path)
+            await JSONResponse(status_code=404, content={"error": "File not found"})(scope, receive, send)
+            return
+
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                with os.fdopen(fd, "rb", closefd=False) as file:
+                    await send({
+                        "type": ZEROCOPY_EXTENSION, "file": file,
+                        "offset": self.offset, "count": self.count, "more_body": False,
+                    })
+                return
+
+            position, remaining = self.offset, self.count
+            while remaining > 0:
+                chunk = await run_in_threadpool(os.pread, fd, min(self.chunk_size, remaining), position)
+                if not chunk:
+                    break
+                position += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # The file shrank underneath us; end the body
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            os.close(fd)
+
+
+class FileServer:
+    """
+    Serves files below one root directory.
+
+    Metadata comes from an LRU stat cache whose entries are trusted for
+    ``stat_ttl`` seconds and refreshed in the threadpool, with concurrent
+    lookups of the same path sharing one ``stat``; the event loop never
+    touches the filesystem. Responses carry a strong ETag and Last-Modified,
+    answer conditional requests with 304, support single byte ranges, and
+    mark content-addressed upload names as immutable.
+    """
+
+    def __init__(self, settings=None, clock=time.monotonic):
+        self.settings = settings or FileServerSettings.from_env()
+        self.root = os.path.realpath(self.settings.root)
+        self.clock = clock
+        self._stats = OrderedDict()
+        self._pending = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.partial = 0
+
+    def resolve(self, relative):
+        """Map a request path to an absolute path under the root, or None."""
+        if "\x00" in relative:
+            return None
+        path = os.path.normpath(os.path.join(self.root, relative.lstrip("/")))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None
+        return path
+
+    def _stat_sync(self, path):
+        # Symlinks must not lead out of the root either
+        real = os.path.realpath(path)
+        if real != self.root and not real.startswith(self.root + os.sep):
+            return FileStat(path, None, self.clock())
+        try:
+            return FileStat(path, os.stat(real), self.clock())
+        except OSError:
+            return FileStat(path, None, self.clock())
+
+    async def stat(self, path):
+        """Return the (possibly cached) FileStat of an absolute path under the root."""
+        entry = self._stats.get(path)
+        if entry is not None and self.clock() - entry.checked_at < self.settings.stat_ttl:
+            self._stats.move_to_end(path)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        pending = self._pending.get(path)
+        if pending is None:
+            pending = asyncio.ensure_future(run_in_threadpool(self._stat_sync, path))
+            self._pending[path] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(path, None))
+        entry = await asyncio.shield(pending)
+
+        self._stats[path] = entry
+        self._stats.move_to_end(path)
+        while len(self._stats) > self.settings.max_entries:
+            self._stats.popitem(last=False)
+        return entry
+
+    def invalidate(self, relative=None):
+        """Forget cached metadata for one request path, or for everything."""
+        if relative is None:
+            self._stats.clear()
+            return
+        path = self.resolve(relative)
+        if path is not None:
+            self.invalidate_path(path)
+
+    def invalidate_path(self, path):
+        self._stats.pop(path, None)
+
+    async def listdir(self, path):
+        return sorted(await run_in_threadpool(os.listdir, path))
+
+    def cache_control(self, path):
+        if IMMUTABLE_NAME.match(os.path.basename(path)):
+            return IMMUTABLE_CACHE_CONTROL
+        return f"public, max-age={self.settings.max_age}"
+
+    async def response(self, request, relative, cache_control=None, extra_headers=None):
+        """
+        Build the response for a GET or HEAD of ``relative`` under the root.
+        ``cache_control`` replaces the Cache-Control chosen from the file name.
+        """
+        path = self.resolve(relative)
+        entry = await self.stat(path) if path is not None else None
+        if entry is None or not entry.is_file:
+            return JSONResponse(status_code=404, content={"error": f"File not found: {relative}"})
+
+        headers = {
+            "ETag": entry.etag,
+            "Last-Modified": entry.last_modified,
+            "Cache-Control": cache_control or self.cache_control(path),
+            "Accept-Ranges": "bytes",
+        }
+        if extra_headers:
+            headers.update(extra_headers)
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, entry.etag)
+        else:
+            if_modified_since = request.headers.get("if-modified-since")
+            not_modified = if_modified_since is not None and _not_modified_since(if_modified_since, entry.mtime)
+        if not_modified:
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        send_body = request.method != "HEAD"
+        start, end = 0, entry.size - 1
+        status_code = 200
+        range_header = request.headers.get("range")
+        if range_header and entry.size > 0 and self._if_range_matches(request.headers.get("if-range"), entry):
+            byte_range = parse_range(range_header, entry.size)
+            if byte_range == "unsatisfiable":
+                headers["Content-Range"] = f"bytes */{entry.size}"
+                return Response(status_code=416, headers=headers)
+            if byte_range is not None:
+                start, end = byte_range
+                status_code = 206
+                headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+                self.partial += 1
+
+        count = max(0, end - start + 1)
+        headers["Content-Length"] = str(count)
+        return FileRangeResponse(
+            path, start, count, status_code, headers, entry.media_type, self.settings.chunk_size, send_body, self
+        )
+
+    @staticmethod
+    def _if_range_matches(if_range, entry):
+        # A range only applies to the representation the client already has
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            return if_range == entry.etag
+        return _not_modified_since(if_range, entry.mtime)
+
+    def stats(self):
+        return {
+            "root": self.root,
+            "cached_entries": len(self._stats),
+            "stat_hits": self.hits,
+            "stat_misses": self.misses,
+            "not_modified": self.not_modified,
+            "partial": self.partial,
+        }
+
+
+# Shared file server for the uploads tree
+file_server = FileServer()
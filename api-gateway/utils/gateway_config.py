@@ -0,0 +1,270 @@
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+from dotenv import dotenv_values
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# Backend services and the environment variables holding their base URLs
+SERVICE_URL_ENV = {
+    "user": ("USER_SERVICE_URL", "http://user-service:3001"),
+    "vehicle": ("VEHICLE_SERVICE_URL", "http://vehicle-service:3002"),
+    "rental": ("RENTAL_SERVICE_URL", "http://rental-service:3003"),
+    "payment": ("PAYMENT_SERVICE_URL", "http://payment-service:3004"),
+    "notification": ("NOTIFICATION_SERVICE_URL", "http://notification-service:3005"),
+    "admin": ("ADMIN_SERVICE_URL", "http://admin-service:3006"),
+    "support": ("SUPPORT_SERVICE_URL", "http://support-service:3007"),
+    "rating": ("RATING_SERVICE_URL", "http://rating-service:3008"),
+}
+
+# Seconds between checks of the reload marker file shared by the workers
+RELOAD_POLL_INTERVAL = 1.0
+
+# Origins of the local frontend, always allowed
+DEFAULT_ORIGINS = ("http://localhost:4000", "http://127.0.0.1:4000")
+
+CORS_ALLOW_METHODS = ("GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS")
+CORS_ALLOW_HEADERS = ("Content-Type", "Authorization", "Accept", "Origin", "X-Requested-With")
+CORS_EXPOSE_HEADERS = ("Content-Length",)
+
+# CORS headers added to proxied responses, minus the allowed origin
+PROXY_CORS_HEADERS = {
+    "Access-Control-Allow-Credentials": "true",
+    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, PATCH, OPTIONS",
+    "Access-Control-Allow-Headers": ", ".join(CORS_ALLOW_HEADERS),
+    "Access-Control-Expose-Headers": ", ".join(CORS_EXPOSE_HEADERS),
+}
+
+# Gateway error responses echo the request origin and do not expose headers
+ERROR_CORS_HEADERS = {
+    "Access-Control-Allow-Credentials": "true",
+    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, PATCH, OPTIONS",
+    "Access-Control-Allow-Headers": ", ".join(CORS_ALLOW_HEADERS),
+}
+
+
+@dataclass(frozen=True)
+class GatewayConfig:
+    """
+    Immutable snapshot of the configuration the request path depends on.
+
+    Everything is parsed and precomputed once, so handling a request never
+    reads the environment. A new snapshot replaces the old one as a whole;
+    requests that already hold a reference keep using the old one.
+    """
+
+    environment: str
+    # Allowed CORS origins; the first is the fallback outside development
+    origins: tuple
+    # Service name -> base URL used to build destination URLs (the first endpoint)
+    services: MappingProxyType
+    # Service name -> all endpoint base URLs the load balancer spreads requests over
+    endpoints: MappingProxyType
+    # Services whose URL is set in the environment rather than defaulted
+    configured: frozenset = frozenset()
+    generation: int = 0
+    origin_set: frozenset = field(init=False, repr=False)
+    _cors_by_origin: MappingProxyType = field(init=False, repr=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "origin_set", frozenset(self.origins))
+        object.__setattr__(self, "_cors_by_origin", MappingProxyType({
+            origin: MappingProxyType({"Access-Control-Allow-Origin": origin, **PROXY_CORS_HEADERS})
+            for origin in self.origins
+        }))
+
+    @classmethod
+    def from_env(cls, env=None, generation=0):
+        """Build a snapshot from environment variables (``os.environ`` by default)."""
+        env = os.environ if env is None else env
+
+        origins = list(DEFAULT_ORIGINS)
+        origins.append(env.get("FRONTEND_URL") or "http://frontend:4000")
+        for origin in env.get("ADDITIONAL_CORS_ORIGINS", "").split(","):
+            origin = origin.strip()
+            if origin:
+                origins.append(origin)
+
+        # A service URL may list several instances, separated by commas
+        endpoints = {}
+        for name, (env_var, default_url) in SERVICE_URL_ENV.items():
+            urls = [url.strip().rstrip("/") for url in (env.get(env_var) or default_url).split(",")]
+            endpoints[name] = tuple(dict.fromkeys(url for url in urls if url)) or (default_url,)
+        services = {name: urls[0] for name, urls in endpoints.items()}
+        configured = frozenset(name for name, (env_var, _) in SERVICE_URL_ENV.items() if env.get(env_var))
+
+        return cls(
+            environment=env.get("ENVIRONMENT", "development").lower(),
+            origins=tuple(dict.fromkeys(origins)),
+            services=MappingProxyType(services),
+            endpoints=MappingProxyType(endpoints),
+            configured=configured,
+            generation=generation,
+        )
+
+    @property
+    def is_development(self):
+        return self.environment == "development"
+
+    def cors_headers(self, origin):
+        """
+        Return the CORS headers for a proxied response. Allowed origins are
+        echoed; other origins are echoed in development and replaced by the
+        first configured origin elsewhere. The result must not be modified.
+        """
+        headers = self._cors_by_origin.get(origin)
+        if headers is not None:
+            return headers
+        if self.is_development:
+            return {"Access-Control-Allow-Origin": origin, **PROXY_CORS_HEADERS}
+        return self._cors_by_origin[self.origins[0]]
+
+    def error_cors_headers(self, origin):
+        """Return the CORS headers for an error generated by the gateway."""
+        return {"Access-Control-Allow-Origin": origin, **ERROR_CORS_HEADERS}
+
+    def service_url(self, name):
+        return self.services[name]
+
+    def describe(self):
+        return {
+            "generation": self.generation,
+            "environment": self.environment,
+            "origins": list(self.origins),
+            "services": dict(self.services),
+            "endpoints": {name: list(urls) for name, urls in self.endpoints.items()},
+            "configured": sorted(self.configured),
+        }
+
+
+class GatewayConfigStore:
+    """
+    Holds the current ``GatewayConfig`` and swaps it atomically on reload.
+
+    Readers take ``store.current`` once per request and use that snapshot
+    throughout, so a reload never mixes old and new values within a request.
+    Listeners are called with ``(old, new)`` after each swap, e.g. to retire
+    connection pools of upstreams that are no longer configured.
+
+    With several workers, ``reload_file`` names a marker file they share. A
+    reload writes a new token to it, and every worker watching the file
+    reloads as well when it sees the token change.
+    """
+
+    def __init__(self, config, reload_file=None):
+        self.current = config
+        self._listeners = []
+        self.reload_file = reload_file
+        # Marker token this worker has caught up with; None before any reload
+        self._seen = None
+        self._watcher = None
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def reload(self, env_file=None, announce=True):
+        """
+        Re-read the environment file (``GATEWAY_ENV_FILE``, default ``.env``)
+        and swap in a new snapshot built from it.
+
+        Values in the file override the process environment, which is
+        updated as well so settings read lazily elsewhere see them too.
+        Unless ``announce`` is False, the other workers are told to reload.
+
+        Returns:
+            The new configuration
+        """
+        env_file = env_file or os.getenv("GATEWAY_ENV_FILE", ".env")
+        if os.path.isfile(env_file):
+            values = {k: v for k, v in dotenv_values(env_file).items() if v is not None}
+            os.environ.update(values)
+            logger.info(f"Loaded {len(values)} settings from {env_file}")
+        else:
+            logger.warning(f"Environment file {env_file} not found, reloading from the process environment")
+
+        old = self.current
+        new = GatewayConfig.from_env(generation=old.generation + 1)
+        self.current = new
+
+        changed = sorted(name for name, urls in new.endpoints.items() if old.endpoints.get(name) != urls)
+        logger.info(
+            f"Gateway configuration reloaded (generation {new.generation}); "
+            f"changed services: {', '.join(changed) or 'none'}"
+        )
+
+        for listener in self._listeners:
+            try:
+                listener(old, new)
+            except Exception as e:
+                logger.error(f"Configuration listener failed: {str(e)}", exc_info=True)
+        if announce:
+            self._announce()
+        return new
+
+    def _read_marker(self):
+        try:
+            with open(self.reload_file) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _announce(self):
+        if not self.reload_file:
+            return
+        token = f"{os.getpid()}-{time.time_ns()}"
+        partial = f"{self.reload_file}.{os.getpid()}.tmp"
+        try:
+            with open(partial, "w") as f:
+                f.write(token)
+            os.replace(partial, self.reload_file)
+            self._seen = token
+        except OSError as e:
+            logger.error(f"Could not tell the other workers to reload via {self.reload_file}: {e}")
+
+    def check_reload(self):
+        """Reload if another worker announced a reload since the last check."""
+        if not self.reload_file:
+            return False
+        marker = self._read_marker()
+        if marker != self._seen:
+            self._seen = marker
+            logger.info("Reloading configuration after a reload in another worker")
+            self.reload(announce=False)
+            return True
+        return False
+
+    def start_watching(self, interval=RELOAD_POLL_INTERVAL):
+        """Follow reloads of the other workers; a no-op without a reload file."""
+        if self.reload_file and self._watcher is None:
+            self._watcher = asyncio.ensure_future(self._watch(interval))
+
+    async def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    async def _watch(self, interval):
+        while True:
+            try:
+                self.check_reload()
+            except Exception as e:
+                logger.error(f"Following a configuration reload failed: {e}", exc_info=True)
+            await asyncio.sleep(interval)
+
+
+# Built once at import; main.py loads .env before importing the gateway modules
+gateway_config = GatewayConfigStore(GatewayConfig.from_env(), reload_file=os.getenv("GATEWAY_RELOAD_FILE") or None)
+
+
+def service_url(name):
+    """Return the base URL of a backend service from the current configuration."""
+    return gateway_config.current.services[name]
@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime, timezone
+from dataclasses import dataclass
+
+import httpx
+
+from utils.gateway_config import gateway_config
+from utils.upstream_pools import upstream_pools, upstream_setting, origin_of, shared_ssl_context, _bool
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+UNKNOWN = "unknown"
+UP = "up"
+DOWN = "down"
+
+# Probe rounds start up to this share of the interval early or late, so the
+# workers of one host do not probe in lockstep
+INTERVAL_JITTER = 0.1
+
+# A down result older than this many intervals no longer fails requests
+# fast, e.g. if probing stopped
+STALE_AFTER_INTERVALS = 3
+
+
+@dataclass(frozen=True)
+class ProbeSettings:
+    """How one service's endpoints are probed."""
+
+    path: str = "/health"
+    timeout: float = 2.0
+    # Consecutive failed probes that mark an endpoint down...
+    unhealthy_after: int = 2
+    # ...and consecutive successful ones that mark it up again
+    healthy_after: int = 1
+
+    @classmethod
+    def from_env(cls, service):
+        """Build settings from ``<SERVICE>_SERVICE_HEALTH_*`` / ``UPSTREAM_HEALTH_*``."""
+        defaults = cls()
+        return cls(
+            path=upstream_setting(service, "HEALTH_PATH", defaults.path, str),
+            timeout=upstream_setting(service, "HEALTH_TIMEOUT", defaults.timeout, float),
+            unhealthy_after=upstream_setting(service, "HEALTH_UNHEALTHY_AFTER", defaults.unhealthy_after, int),
+            healthy_after=upstream_setting(service, "HEALTH_HEALTHY_AFTER", defaults.healthy_after, int),
+        )
+
+
+@dataclass(frozen=True)
+class HealthCheckSettings:
+    """Gateway-wide probing and readiness settings."""
+
+    enabled: bool = True
+    # Seconds between the starts of two probe rounds
+    interval: float = 10.0
+    # Fail requests to endpoints reported down at once, instead of waiting
+    # for a connect error or timeout
+    fail_fast: bool = True
+    # Services that must be up for /api/health/ready to succeed; when empty,
+    # any service being up is enough
+    ready_services: tuple = ()
+
+    @classmethod
+    def from_env(cls):
+        defaults = cls()
+        ready_services = os.getenv("HEALTH_READY_SERVICES", "")
+        return cls(
+            enabled=_bool(os.getenv("HEALTH_CHECK_ENABLED", str(defaults.enabled))),
+            interval=max(0.5, float(os.getenv("HEALTH_CHECK_INTERVAL", defaults.interval))),
+            fail_fast=_bool(os.getenv("HEALTH_FAIL_FAST", str(defaults.fail_fast))),
+            ready_services=tuple(s.strip().lower() for s in ready_services.split(",") if s.strip()),
+        )
+
+
+class EndpointHealth:
+    """Latest probe results of one service endpoint."""
+
+    __slots__ = (
+        "url", "status", "latency", "status_code", "error",
+        "checked_at", "checked_at_wall", "consecutive_failures", "consecutive_successes",
+    )
+
+    def __init__(self, url):
+        self.url = url
+        self.status = UNKNOWN
+        self.latency = None
+        self.status_code = None
+        self.error = None
+        self.checked_at = 0.0
+        self.checked_at_wall = None
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+
+    def record(self, success, latency, status_code, error, settings, now):
+        self.latency = latency
+        self.status_code = status_code
+        self.error = error
+        self.checked_at = now
+        self.checked_at_wall = datetime.now(timezone.utc).isoformat()
+        if success:
+            self.consecutive_failures = 0
+            self.consecutive_successes += 1
+            if self.status != UP and (self.status == UNKNOWN or self.consecutive_successes >= settings.healthy_after):
+                return UP
+        else:
+            self.consecutive_successes = 0
+            self.consecutive_failures += 1
+            if self.status != DOWN and self.consecutive_failures >= settings.unhealthy_after:
+                return DOWN
+        return self.status
+
+    def stats(self):
+        return {
+            "status": self.status,
+            "latency_ms": round(self.latency * 1000, 2) if self.latency is not None else None,
+            "status_code": self.status_code,
+            "error": self.error,
+            "checked_at": self.checked_at_wall,
+        }
+
+
+class HealthChecker:
+    """
+    Probes the endpoints of the gateway's services in the background.
+
+    A service is probed when its URL is set in the environment or when the
+    gateway routes to it (the ``services`` passed to ``start``); defaulted
+    URLs of services nothing routes to are left alone. Each round sends
+    ``GET <endpoint><path>`` to all those endpoints at once, every
+    ``interval`` seconds, through a small client of its own so a saturated
+    service pool does not make a healthy service look down. A response below
+    500 counts as a success; 5xx, transport errors and timeouts as failures.
+    The first success marks an endpoint up. It takes ``unhealthy_after``
+    failures in a row to mark it down, from the start too, so one slow probe
+    during a cold start does not fail requests, and ``healthy_after``
+    successes to mark it up again.
+
+    The readiness response is rebuilt after every round, so serving it does
+    no work. Endpoints reported down are skipped by the load balancer, and
+    requests to a service whose endpoints are all down fail at once.
+    Endpoints are read from the current gateway configuration each round.
+    """
+
+    def __init__(self, settings=None, clock=time.monotonic):
+        self.settings = settings or HealthCheckSettings.from_env()
+        self.clock = clock
+        # Endpoint origin -> EndpointHealth
+        self._endpoints = {}
+        self._probe_settings = {}
+        self._task = None
+        self._client = None
+        # Services the gateway routes to; None probes every service
+        self.services = None
+        self.rounds = 0
+        self._ready = self._responses(503, {"status": "starting", "ready": False, "services": {}})
+
+    @staticmethod
+    def _encode(body):
+        return json.dumps(body).encode("utf-8")
+
+    @classmethod
+    def _responses(cls, status_code, body):
+        """Encode the detailed and the public readiness body once."""
+        summary = {"status": body["status"], "ready": body["ready"]}
+        return status_code, cls._encode(body), cls._encode(summary)
+
+    def start(self, services=None):
+        """
+        Start probing in the background; a no-op when disabled or already
+        running. ``services`` names the services the gateway routes to.
+        """
+        if not self.settings.enabled or self._task is not None:
+            return
+        self.services = frozenset(services) if services is not None else None
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=self.settings.interval * 2),
+            verify=shared_ssl_context(),
+            follow_redirects=False,
+        )
+        self._task = asyncio.ensure_future(self._run())
+        logger.info(f"Probing upstream health every {self.settings.interval:g}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self):
+        interval = self.settings.interval
+        while True:
+            started = self.clock()
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.error(f"Upstream health check round failed: {e}", exc_info=True)
+            jitter = random.uniform(-INTERVAL_JITTER, INTERVAL_JITTER) * interval
+            await asyncio.sleep(max(0.0, interval + jitter - (self.clock() - started)))
+
+    def _settings_for(self, service):
+        settings = self._probe_settings.get(service)
+        if settings is None:
+            settings = self._probe_settings[service] = ProbeSettings.from_env(service)
+        return settings
+
+    async def probe_all(self):
+        """Probe every configured endpoint once and rebuild the readiness response."""
+        config = gateway_config.current
+        endpoints = {
+            service: urls for service, urls in config.endpoints.items()
+            if self.services is None or service in self.services or service in config.configured
+        }
+        targets = [(service, url) for service, urls in endpoints.items() for url in urls]
+        # Forget endpoints dropped by a configuration reload
+        configured = {origin_of(url) for _, url in targets}
+        for origin in [o for o in self._endpoints if o not in configured]:
+            del self._endpoints[origin]
+
+        await asyncio.gather(*(self._probe(service, url) for service, url in targets))
+        self.rounds += 1
+        self._ready = self._build_ready(endpoints)
+
+    async def _probe(self, service, url):
+        settings = self._settings_for(service)
+        origin = origin_of(url)
+        health = self._endpoints.get(origin)
+        if health is None:
+            health = self._endpoints[origin] = EndpointHealth(url)
+
+        status_code = error = None
+        started = self.clock()
+        try:
+            response = await self._client.get(url + settings.path, timeout=settings.timeout)
+            status_code = response.status_code
+            success = status_code < 500
+            if not success:
+                error = f"HTTP {status_code}"
+        except httpx.TimeoutException:
+            success, error = False, f"timed out after {settings.timeout:g}s"
+        except httpx.RequestError as e:
+            success, error = False, (f"{type(e).__name__}: {e}" if str(e) else type(e).__name__)
+        now = self.clock()
+
+        status = health.record(success, now - started, status_code, error, settings, now)
+        if status != health.status:
+            if status == DOWN:
+                logger.warning(f"Upstream {upstream_pools.label_for(url)} is down: {error}")
+            elif health.status == DOWN:
+                logger.info(f"Upstream {upstream_pools.label_for(url)} is up again")
+            health.status = status
+
+    def _build_ready(self, endpoints):
+        services = {}
+        for service, urls in endpoints.items():
+            results = {url: self._endpoints[origin_of(url)].stats() for url in urls}
+            statuses = {r["status"] for r in results.values()}
+            if UP in statuses:
+                status = UP
+            elif statuses == {DOWN}:
+                status = DOWN
+            else:
+                status = UNKNOWN
+            services[service] = {"status": status, "endpoints": results}
+
+        up = {service for service, s in services.items() if s["status"] == UP}
+        if self.settings.ready_services:
+            ready = all(service in up for service in self.settings.ready_services)
+        else:
+            ready = bool(up)
+        if len(up) == len(services):
+            status = "ok"
+        else:
+            status = "degraded" if ready else "unavailable"
+
+        body = {
+            "status": status,
+            "ready": ready,
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "services": services,
+        }
+        return self._responses(200 if ready else 503, body)
+
+    def ready_response(self, detailed=False):
+        """
+        Return the cached ``(status code, JSON body)`` of /api/health/ready.
+        Only the detailed body lists services, endpoints and probe errors.
+        """
+        if not self.settings.enabled:
+            return 200, self._encode({"status": "ok", "ready": True, "checks": "disabled"})
+        status_code, body, summary = self._ready
+        return status_code, (body if detailed else summary)
+
+    def is_down(self, url, now=None):
+        """
+        True when the latest probes report the endpoint of ``url`` down and
+        are recent enough to trust. Always False with fail-fast disabled.
+        """
+        if not self.settings.fail_fast:
+            return False
+        health = self._endpoints.get(origin_of(url))
+        if health is None or health.status != DOWN:
+            return False
+        if now is None:
+            now = self.clock()
+        return now - health.checked_at <= self.settings.interval * STALE_AFTER_INTERVALS
+
+    def retry_after(self):
+        """Seconds a client should wait before retrying a request that failed fast."""
+        return self.settings.interval
+
+    def stats(self):
+        return {
+            upstream_pools.label_for(health.url): health.stats()
+            for health in self._endpoints.values()
+        }
+
+
+# Shared checker, started with the application
+upstream_health = HealthChecker()
@@ -0,0 +1,355 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import importlib.util
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from utils.file_server import FileServer, FileServerSettings, IMMUTABLE_CACHE_CONTROL, IMMUTABLE_NAME, file_server
+from utils.single_flight import SingleFlight
+
+# Pillow is optional. It is only imported by the encoder processes, which
+# keeps its import time off the gateway's startup.
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# Source types that can be resized; anything else is refused with 415
+SOURCE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp")
+
+# Output formats: query value -> (Pillow format, file extension)
+FORMATS = {
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+    "jpg": ("JPEG", "jpg"),
+}
+
+EXIF_ORIENTATION = 0x0112
+
+# Quality is rounded to this step so the number of variants per image stays small
+QUALITY_STEP = 5
+MIN_QUALITY = 30
+MAX_QUALITY = 95
+
+# Partial files older than this are removed on startup even if the worker
+# that wrote them is still running; no encode takes this long
+STALE_PARTIAL_SECONDS = 3600
+
+
+@dataclass(frozen=True)
+class ImageSettings:
+    """Presets and cache limits for ``/api/images``."""
+
+    # Requested widths are rounded up to the next preset
+    widths: tuple = (160, 320, 640, 1024, 1600)
+    quality: int = 75
+    cache_dir: str = os.path.join(tempfile.gettempdir(), "api-gateway-images")
+    # Total size of derivatives kept on disk; least recently used go first.
+    # Each gateway worker enforces it over the files it knows about, so with
+    # several workers sharing cache_dir it can grow to workers times this
+    max_cache_bytes: int = 256 * 1024 * 1024
+    # Encoder processes
+    workers: int = 2
+
+    @classmethod
+    def from_env(cls):
+        defaults = cls()
+        widths = os.getenv("IMAGE_WIDTHS")
+        return cls(
+            widths=tuple(sorted(int(w) for w in widths.split(",") if w.strip())) if widths else defaults.widths,
+            quality=int(os.getenv("IMAGE_QUALITY", defaults.quality)),
+            cache_dir=os.getenv("IMAGE_CACHE_DIR", defaults.cache_dir),
+            max_cache_bytes=int(os.getenv("IMAGE_CACHE_MAX_BYTES", defaults.max_cache_bytes)),
+            workers=max(1, int(os.getenv("IMAGE_WORKERS", defaults.workers))),
+        )
+
+
+def render_derivative(source, target, width, image_format, quality):
+    """
+    Resize ``source`` to at most ``width`` pixels wide and encode it to
+    ``target``. Runs in a worker process; returns the size of the output.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        oriented_width = image.width
+        if image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+            oriented_width = image.height
+        if oriented_width > width:
+            # JPEG can decode straight to 1/2, 1/4 or 1/8 of its size
+            scale = width / oriented_width
+            image.draft("RGB", (max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+        image = ImageOps.exif_transpose(image)
+
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+
+    has_alpha = "A" in image.getbands() or "transparency" in image.info
+    if image_format == "JPEG":
+        if has_alpha:
+            # JPEG has no alpha channel; flatten onto white
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(target, format="JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        image.save(target, format="WEBP", quality=quality, method=4)
+    return os.path.getsize(target)
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+
+def _is_stale_partial(name, mtime, now):
+    """
+    Whether ``<target>.<pid>.tmp`` was left behind by an encode that never
+    finished: its worker is gone, or it is too old to still be written.
+    Other workers sharing the cache directory may be writing theirs.
+    """
+    if now - mtime > STALE_PARTIAL_SECONDS:
+        return True
+    pid = name[:-len(".tmp")].rpartition(".")[2]
+    if not pid.isdigit():
+        return False
+    # Nothing is rendered before the cache is loaded, so a file with our own
+    # pid comes from an earlier process
+    return int(pid) == os.getpid() or not _pid_alive(int(pid))
+
+
+class ImageDerivatives:
+    """
+    Resized and re-encoded variants of images in the uploads tree.
+
+    A derivative is named after the source's ETag (inode, mtime and size)
+    and its width, format and quality, so replacing the source makes new
+    names and old variants simply age out. Files are written to a disk cache
+    bounded by total size with least-recently-used eviction. Encoding runs in
+    a process pool, and concurrent requests for the same derivative share one
+    encode. Derivatives are served by a FileServer over the cache directory,
+    with the same validators and range support as the originals.
+    """
+
+    def __init__(self, settings=None, source=None):
+        self.settings = settings or ImageSettings.from_env()
+        self.source = source or file_server
+        self.files = FileServer(FileServerSettings(root=self.settings.cache_dir, max_entries=2048))
+        self._pool = None
+        self._flight = SingleFlight()
+        self._loader = SingleFlight()
+        # Derivative name -> size in bytes, least recently used first
+        self._index = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+
+        self.hits = 0
+        self.renders = 0
+        self.render_seconds = 0.0
+        self.evictions = 0
+        self.errors = 0
+
+        if not PILLOW_AVAILABLE:
+            logger.warning("Pillow is not installed; /api/images serves original files")
+
+    def _executor(self):
+        if self._pool is None:
+            # Spawned, not forked: the gateway process has threads running
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.settings.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def _load_sync(self):
+        os.makedirs(self.files.root, exist_ok=True)
+        now = time.time()
+        entries = []
+        with os.scandir(self.files.root) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                if entry.name.endswith(".tmp"):
+                    if _is_stale_partial(entry.name, st.st_mtime, now):
+                        _remove(entry.path)
+                    continue
+                entries.append((st.st_mtime, entry.name, st.st_size))
+        return sorted(entries)
+
+    async def _load(self):
+        # Pick up derivatives written before a restart, oldest first
+        for _, name, size in await run_in_threadpool(self._load_sync):
+            self._index[name] = size
+            self._bytes += size
+        self._loaded = True
+        await self._evict()
+
+    def parse(self, request):
+        """
+        Read ``w``, ``format`` and ``q`` from the query string. Returns
+        (width, format key, quality, negotiated) or raises ValueError.
+        """
+        params = request.query_params
+        widths = self.settings.widths
+        try:
+            requested = int(params.get("w", widths[-1]))
+            quality = int(params.get("q", self.settings.quality))
+        except ValueError:
+            raise ValueError("w and q must be integers")
+        if requested <= 0:
+            raise ValueError("w must be positive")
+        width = next((w for w in widths if w >= requested), widths[-1])
+        quality = min(MAX_QUALITY, max(MIN_QUALITY, round(quality / QUALITY_STEP) * QUALITY_STEP))
+
+        requested_format = params.get("format", "auto").lower()
+        negotiated = requested_format == "auto"
+        if negotiated:
+            requested_format = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+        if requested_format not in FORMATS:
+            raise ValueError(f"format must be one of: auto, {', '.join(FORMATS)}")
+        return width, requested_format, quality, negotiated
+
+    async def response(self, request, relative):
+        """Build the response for a GET or HEAD of a derivative of ``relative``."""
+        path = self.source.resolve(relative)
+        entry = await self.source.stat(path) if path is not None else None
+        if entry is None or not entry.is_file:
+            return JSONResponse(status_code=404, content={"error": f"File not found: {relative}"})
+        if entry.media_type not in SOURCE_TYPES:
+            return JSONResponse(status_code=415, content={"error": f"Not a resizable image: {relative}"})
+        try:
+            width, requested_format, quality, negotiated = self.parse(request)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+
+        if not PILLOW_AVAILABLE:
+            return await self.source.response(request, relative)
+
+        image_format, extension = FORMATS[requested_format]
+        digest = hashlib.sha1(f"{entry.etag}|{relative}|{width}|{image_format}|{quality}".encode("utf-8"))
+        name = f"{digest.hexdigest()}.{extension}"
+
+        if not self._loaded:
+            await self._loader.do(("load", self.files.root), self._load)
+        if not await self._cached(name):
+            try:
+                await self._flight.do(
+                    ("render", relative, name), lambda: self._render(path, name, width, image_format, quality)
+                )
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Could not resize {relative}: {e}")
+                return await self.source.response(request, relative)
+
+        # The URL stays the same when the source is replaced, so only
+        # immutable upload names make immutable derivatives
+        if IMMUTABLE_NAME.match(os.path.basename(path)):
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            cache_control = f"public, max-age={self.source.settings.max_age}"
+        extra_headers = {"Vary": "Accept"} if negotiated else None
+        return await self.files.response(request, name, cache_control, extra_headers)
+
+    async def _cached(self, name):
+        if name not in self._index:
+            return False
+        entry = await self.files.stat(self.files.resolve(name))
+        if not entry.is_file:
+            # Removed from the cache directory behind our back
+            self._bytes -= self._index.pop(name)
+            return False
+        self._index.move_to_end(name)
+        self.hits += 1
+        return True
+
+    async def _render(self, source, name, width, image_format, quality):
+        target = os.path.join(self.files.root, name)
+        partial = f"{target}.{os.getpid()}.tmp"
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(
+                self._executor(), render_derivative, source, partial, width, image_format, quality
+            )
+            await run_in_threadpool(os.replace, partial, target)
+        except BaseException as e:
+            if isinstance(e, BrokenProcessPool):
+                # A worker died (e.g. killed for memory); start a fresh pool next time
+                self._pool = None
+            await run_in_threadpool(_remove, partial)
+            raise
+        self.renders += 1
+        self.render_seconds += time.perf_counter() - started
+
+        self.files.invalidate_path(target)
+        self._bytes += size - self._index.pop(name, 0)
+        self._index[name] = size
+        await self._evict()
+
+    async def _evict(self):
+        evicted = []
+        # The most recent entry stays even if it alone exceeds the budget
+        while self._bytes > self.settings.max_cache_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self._bytes -= size
+            evicted.append(os.path.join(self.files.root, name))
+        if not evicted:
+            return
+
+        await run_in_threadpool(lambda: [_remove(target) for target in evicted])
+        for target in evicted:
+            self.files.invalidate_path(target)
+        self.evictions += len(evicted)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        return {
+            "enabled": PILLOW_AVAILABLE,
+            "cache_dir": self.files.root,
+            "entries": len(self._index),
+            "bytes": self._bytes,
+            "max_bytes": self.settings.max_cache_bytes,
+            "hits": self.hits,
+            "renders": self.renders,
+            "render_seconds": round(self.render_seconds, 3),
+            "coalesced": self._flight.followers,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "widths": list(self.settings.widths),
+        }
+
+
+# Shared derivative cache for the uploads tree
+image_derivatives = ImageDerivatives()
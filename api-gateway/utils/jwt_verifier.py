@@ -0,0 +1,151 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+from collections import OrderedDict
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# HMAC algorithms the Node services sign tokens with (jsonwebtoken defaults to HS256)
+ALGORITHMS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+
+class InvalidTokenError(ValueError):
+    """Raised when a token is malformed, badly signed or expired."""
+
+
+def _b64decode(segment):
+    padding = -len(segment) % 4
+    return base64.urlsafe_b64decode(segment + "=" * padding)
+
+
+class JWTVerifier:
+    """
+    Verify HMAC-signed JWTs with the secret shared with the backend services.
+
+    Verified claims are kept in a bounded LRU keyed by the SHA-256 of the
+    token and expire at the token's ``exp``, so a client that sends the same
+    token on every request only pays for signature verification once.
+    """
+
+    def __init__(self, secret, max_entries=10_000, leeway=0, max_ttl=300, clock=time.time):
+        """
+        Initialize the verifier.
+
+        Args:
+            secret: Shared JWT signing secret
+            max_entries: Maximum number of verified tokens kept in the cache
+            leeway: Seconds of clock skew tolerated on exp/nbf
+            max_ttl: Cache lifetime for tokens without an exp claim
+            clock: Function returning the current time in seconds
+        """
+        self.secret = secret.encode("utf-8")
+        self.max_entries = max_entries
+        self.leeway = leeway
+        self.max_ttl = max_ttl
+        self.clock = clock
+        self._cache = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def verify(self, token):
+        """
+        Return the claims of a valid token.
+
+        Raises:
+            InvalidTokenError: If the token is malformed, badly signed or expired
+        """
+        now = self.clock()
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            claims, expires_at = cached
+            if expires_at > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return claims
+            del self._cache[key]
+
+        self.misses += 1
+        try:
+            claims = self._decode(token, now)
+        except InvalidTokenError:
+            self.rejected += 1
+            raise
+
+        exp = claims.get("exp")
+        expires_at = exp + self.leeway if isinstance(exp, (int, float)) else now + self.max_ttl
+        self._cache[key] = (claims, expires_at)
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return claims
+
+    def _decode(self, token, now):
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            header = json.loads(_b64decode(header_segment))
+            claims = json.loads(_b64decode(payload_segment))
+            signature = _b64decode(signature_segment)
+        except (ValueError, TypeError):
+            raise InvalidTokenError("Malformed token")
+
+        if not isinstance(header, dict) or not isinstance(claims, dict):
+            raise InvalidTokenError("Malformed token")
+
+        digest = ALGORITHMS.get(header.get("alg"))
+        if digest is None:
+            raise InvalidTokenError(f"Unsupported algorithm: {header.get('alg')}")
+
+        signing_input = f"{header_segment}.{payload_segment}".encode("ascii")
+        expected = hmac.new(self.secret, signing_input, digest).digest()
+        if not hmac.compare_digest(expected, signature):
+            raise InvalidTokenError("Invalid signature")
+
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)) and exp + self.leeway <= now:
+            raise InvalidTokenError("Token expired")
+        nbf = claims.get("nbf")
+        if isinstance(nbf, (int, float)) and nbf - self.leeway > now:
+            raise InvalidTokenError("Token not yet valid")
+
+        return claims
+
+    def stats(self):
+        return {
+            "cached_tokens": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+        }
+
+
+def create_jwt_verifier():
+    """
+    Build the verifier when ``GATEWAY_JWT_VERIFY`` is enabled, otherwise
+    return None and leave token validation to the services.
+    """
+    if os.getenv("GATEWAY_JWT_VERIFY", "false").lower() not in ("1", "true", "yes", "on"):
+        return None
+
+    secret = os.getenv("JWT_SECRET") or os.getenv("JWT_SECRET_KEY")
+    if not secret:
+        logger.warning("GATEWAY_JWT_VERIFY is enabled but JWT_SECRET is not set, tokens will not be verified")
+        return None
+
+    logger.info("Gateway-side JWT verification enabled")
+    return JWTVerifier(
+        secret,
+        max_entries=int(os.getenv("JWT_CACHE_MAX_ENTRIES", 10000)),
+        leeway=int(os.getenv("JWT_LEEWAY_SECONDS", 0)),
+    )
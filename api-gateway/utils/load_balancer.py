@@ -0,0 +1,209 @@
+import math
+import time
+import random
+import logging
+from dataclasses import dataclass
+
+from utils.gateway_config import gateway_config
+from utils.upstream_pools import upstream_setting
+from utils.circuit_breaker import circuit_breakers
+from utils.health_checker import upstream_health
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+
+@dataclass(frozen=True)
+class BalancerSettings:
+    """Endpoint selection and ejection settings for one service."""
+
+    # Weight of the newest sample in the latency EWMA
+    ewma_alpha: float = 0.3
+    # An idle endpoint's EWMA decays with this time constant, so an instance
+    # that was slow once is tried again instead of being starved
+    ewma_decay_seconds: float = 10.0
+    # Latency sample recorded for a failed request; fast failures (e.g.
+    # connection refused) must not make an endpoint look attractive
+    failure_penalty: float = 1.0
+    # Consecutive failures that eject an endpoint
+    eject_after: int = 5
+    # Ejection time; doubles on each repeated ejection up to max_eject_seconds
+    eject_seconds: float = 10.0
+    max_eject_seconds: float = 300.0
+
+    @classmethod
+    def from_env(cls, service):
+        """Build settings from ``<SERVICE>_SERVICE_LB_*`` / ``UPSTREAM_LB_*``."""
+        defaults = cls()
+        return cls(
+            ewma_alpha=upstream_setting(service, "LB_EWMA_ALPHA", defaults.ewma_alpha, float),
+            ewma_decay_seconds=upstream_setting(service, "LB_EWMA_DECAY_SECONDS", defaults.ewma_decay_seconds, float),
+            failure_penalty=upstream_setting(service, "LB_FAILURE_PENALTY", defaults.failure_penalty, float),
+            eject_after=upstream_setting(service, "LB_EJECT_AFTER", defaults.eject_after, int),
+            eject_seconds=upstream_setting(service, "LB_EJECT_SECONDS", defaults.eject_seconds, float),
+            max_eject_seconds=upstream_setting(service, "LB_MAX_EJECT_SECONDS", defaults.max_eject_seconds, float),
+        )
+
+
+class Endpoint:
+    """One instance of a backend service and its load statistics."""
+
+    __slots__ = (
+        "url", "outstanding", "ewma", "updated_at", "consecutive_failures",
+        "ejected_until", "times_ejected", "requests", "failures",
+    )
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.ewma = 0.0
+        self.updated_at = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.times_ejected = 0
+        self.requests = 0
+        self.failures = 0
+
+    def cost(self, now, decay_seconds):
+        # Expected wait if one more request is sent now
+        ewma = self.ewma * math.exp(-(now - self.updated_at) / decay_seconds)
+        return ewma * (self.outstanding + 1), self.outstanding
+
+    def stats(self, now):
+        return {
+            "outstanding": self.outstanding,
+            "latency_ewma_ms": round(self.ewma * 1000, 2),
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.ejected_until > now,
+            "times_ejected": self.times_ejected,
+        }
+
+
+class LoadBalancer:
+    """
+    Spreads one service's requests over its endpoints.
+
+    Selection is power-of-two-choices: two healthy endpoints are sampled at
+    random and the one with the lower ``latency EWMA * (outstanding + 1)``
+    wins, so slow or busy instances get less traffic without every gateway
+    worker herding onto the same "best" one. The EWMA decays while an
+    endpoint is not used, so it gets probed again after a slow spell.
+
+    An endpoint is ejected after ``eject_after`` consecutive failures, or
+    while its circuit is open, and readmitted once its ejection time is
+    over. Endpoints that health checks report down are skipped the same
+    way. If every endpoint is ejected, all of them are used again rather
+    than failing every request.
+    """
+
+    def __init__(self, service, urls, settings=None, clock=time.monotonic, previous=None):
+        self.service = service
+        self.primary = urls[0]
+        self.settings = settings or BalancerSettings()
+        self.clock = clock
+        # Keep statistics of endpoints that survive a configuration reload
+        known = {e.url: e for e in previous.endpoints} if previous is not None else {}
+        self.endpoints = [known.get(url) or Endpoint(url) for url in urls]
+
+    def _available(self, endpoint, now):
+        if endpoint.ejected_until > now or upstream_health.is_down(endpoint.url):
+            return False
+        return not circuit_breakers.breaker_for(endpoint.url).is_open(now)
+
+    def pick(self):
+        now = self.clock()
+        candidates = [e for e in self.endpoints if self._available(e, now)] or self.endpoints
+        if len(candidates) == 1:
+            return candidates[0]
+        a, b = random.sample(candidates, 2)
+        decay = self.settings.ewma_decay_seconds
+        return a if a.cost(now, decay) <= b.cost(now, decay) else b
+
+    def rewrite(self, url, endpoint):
+        """Point a URL built from the primary endpoint at ``endpoint``."""
+        if endpoint.url == self.primary or not url.startswith(self.primary):
+            return url
+        return endpoint.url + url[len(self.primary):]
+
+    def start(self, endpoint):
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+
+    def finish(self, endpoint, success, latency):
+        """Record a request that received a response or failed."""
+        now = self.clock()
+        endpoint.outstanding = max(0, endpoint.outstanding - 1)
+        if not success:
+            latency = max(latency, self.settings.failure_penalty)
+        alpha = self.settings.ewma_alpha
+        endpoint.ewma = latency if endpoint.ewma == 0.0 else alpha * latency + (1 - alpha) * endpoint.ewma
+        endpoint.updated_at = now
+
+        if success:
+            endpoint.consecutive_failures = 0
+            return
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.settings.eject_after:
+            if endpoint.ejected_until > now - self.settings.max_eject_seconds:
+                endpoint.times_ejected += 1
+            else:
+                # Healthy for a long while; start the backoff over
+                endpoint.times_ejected = 1
+            duration = min(
+                self.settings.max_eject_seconds,
+                self.settings.eject_seconds * 2 ** (endpoint.times_ejected - 1),
+            )
+            endpoint.ejected_until = now + duration
+            endpoint.consecutive_failures = 0
+            logger.warning(f"Ejected {endpoint.url} from {self.service} for {duration:g}s")
+
+    def cancel(self, endpoint):
+        """Release a request that ended without an outcome (e.g. client disconnect)."""
+        endpoint.outstanding = max(0, endpoint.outstanding - 1)
+
+    def stats(self):
+        now = self.clock()
+        return {endpoint.url: endpoint.stats(now) for endpoint in self.endpoints}
+
+
+class LoadBalancerRegistry:
+    """Load balancers for services configured with more than one endpoint."""
+
+    def __init__(self, endpoints):
+        self._balancers = {}
+        self.update(endpoints)
+
+    def update(self, endpoints):
+        balancers = {}
+        for service, urls in endpoints.items():
+            if len(urls) > 1:
+                previous = self._balancers.get(urls[0])
+                balancers[urls[0]] = LoadBalancer(
+                    service, urls, BalancerSettings.from_env(service), previous=previous
+                )
+                logger.info(f"Load balancing {service} over {len(urls)} endpoints")
+        self._balancers = balancers
+
+    def route(self, url):
+        """
+        Pick an endpoint for a destination URL built from a service's primary
+        URL. Returns ``(url, balancer, endpoint)``; the balancer and endpoint
+        are None when the service has a single endpoint.
+        """
+        if not self._balancers:
+            return url, None, None
+        for primary, balancer in self._balancers.items():
+            if url.startswith(primary) and url[len(primary):len(primary) + 1] in ("", "/", "?"):
+                endpoint = balancer.pick()
+                return balancer.rewrite(url, endpoint), balancer, endpoint
+        return url, None, None
+
+    def stats(self):
+        return {balancer.service: balancer.stats() for balancer in self._balancers.values()}
+
+
+# Shared registry used by proxy_request, following configuration reloads
+load_balancers = LoadBalancerRegistry(gateway_config.current.endpoints)
+gateway_config.subscribe(lambda old, new: load_balancers.update(new.endpoints))
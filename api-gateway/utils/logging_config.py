@@ -0,0 +1,82 @@
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+
+# Access log records carry a dict and are written as one JSON line each
+ACCESS_LOGGER_NAME = "api_gateway.access"
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - [%(name)s] %(message)s"
+
+_listener = None
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the logging thread as they are. The stock QueueHandler
+    formats the message on the calling thread, i.e. the event loop; records
+    here only cross a thread boundary, so formatting can wait.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """Serialize a record whose message is a dict as a single JSON line."""
+
+    def format(self, record):
+        if isinstance(record.msg, dict):
+            return json.dumps(record.msg, separators=(",", ":"), default=str)
+        return super().format(record)
+
+
+def _is_access(record):
+    return record.name == ACCESS_LOGGER_NAME
+
+
+def _is_not_access(record):
+    return record.name != ACCESS_LOGGER_NAME
+
+
+def configure_logging(level=logging.INFO):
+    """
+    Route all logging through a queue drained by a background thread, so
+    the event loop never blocks on formatting or writing log output.
+
+    Application logs keep the usual text format; access log records are
+    written as JSON lines. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    app_handler = logging.StreamHandler()
+    app_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    app_handler.addFilter(_is_not_access)
+
+    access_handler = logging.StreamHandler()
+    access_handler.setFormatter(JSONFormatter())
+    access_handler.addFilter(_is_access)
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, app_handler, access_handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_EnqueueHandler(log_queue))
+    root.setLevel(level)
+
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the logging thread."""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
@@ -0,0 +1,286 @@
+import time
+import logging
+from bisect import bisect_left
+
+from utils.upstream_pools import upstream_pools
+from utils.concurrency_limiter import concurrency_limiters
+from utils.health_checker import upstream_health, UNKNOWN, UP
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, for whole requests and upstream responses
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Connection setup is normally much faster than a request
+CONNECT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# Methods reported as-is; anything else is counted as "OTHER"
+KNOWN_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        values = self.values
+        values[labels] = values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    """
+    A value that can go up and down. With ``collect``, the values are
+    produced at scrape time by calling it; it returns (labels, value) pairs.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def dec(self, labels=(), amount=1):
+        values = self.values
+        values[labels] = values.get(labels, 0) - amount
+
+    def set(self, value, labels=()):
+        self.values[labels] = value
+
+    def samples(self):
+        if self.collect is None:
+            yield from super().samples()
+            return
+        for labels, value in self.collect():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets per label set.
+
+    Each series is a flat list of per-bucket counts followed by the sum, so
+    an observation is a dict lookup, a bisect and two additions. Buckets are
+    made cumulative only when rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self.series = {}
+
+    def observe(self, value, labels=()):
+        series = self.series.get(labels)
+        if series is None:
+            # One slot per bucket, one for +Inf, then the sum
+            series = self.series[labels] = [0] * (len(self.bounds) + 1) + [0.0]
+        series[bisect_left(self.bounds, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        bounds = self.bounds + (float("inf"),)
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(self.labelnames, labels, ("le", _format_value(float(bound)))),
+                    cumulative,
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum", label_text, series[-1]
+            yield f"{self.name}_count", label_text, cumulative
+
+
+class MetricsRegistry:
+    """
+    Metrics of this gateway process, rendered in the Prometheus text format.
+
+    Metrics are only updated from the event loop thread, so they need no
+    locks; with several workers each process reports its own values.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for name, labels, value in metric.samples():
+                    lines.append(f"{name}{labels} {_format_value(value)}")
+            except Exception as e:
+                logger.warning(f"Failed to collect metric {metric.name}: {e}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+def _pool_samples():
+    for upstream, stats in upstream_pools.pool_stats().items():
+        for state in ("active", "idle", "queued"):
+            yield (upstream, state), stats[state]
+
+
+def _pool_limits():
+    for upstream, stats in upstream_pools.pool_stats().items():
+        yield (upstream,), stats["max_connections"]
+
+
+def _concurrency_samples():
+    for upstream, stats in concurrency_limiters.stats().items():
+        yield (upstream, "limit"), stats["limit"]
+        yield (upstream, "in_flight"), stats["in_flight"]
+        yield (upstream, "queued"), stats["queued"]
+
+
+def _health_samples():
+    for upstream, stats in upstream_health.stats().items():
+        if stats["status"] != UNKNOWN:
+            yield (upstream,), 1 if stats["status"] == UP else 0
+
+
+# Shared registry and the gateway's metrics
+metrics = MetricsRegistry()
+
+requests_total = metrics.counter(
+    "gateway_requests_total", "Requests handled by the gateway.", ("route", "method", "status")
+)
+request_duration = metrics.histogram(
+    "gateway_request_duration_seconds", "Time from receiving a request to sending the last response byte.",
+    ("route", "method"),
+)
+requests_in_flight = metrics.gauge(
+    "gateway_requests_in_flight", "Requests currently being handled."
+)
+request_bytes = metrics.counter(
+    "gateway_request_bytes_total", "Request body bytes received from clients.", ("route",)
+)
+response_bytes = metrics.counter(
+    "gateway_response_bytes_total", "Response body bytes sent to clients.", ("route",)
+)
+rate_limited_total = metrics.counter(
+    "gateway_rate_limited_total", "Requests rejected with 429 by the rate limiter.", ("rate_limit_class",)
+)
+auth_rejected_total = metrics.counter(
+    "gateway_auth_rejected_total", "Requests rejected with 401 by the gateway.", ("reason",)
+)
+upstream_requests_total = metrics.counter(
+    "gateway_upstream_requests_total",
+    "Upstream attempts by status code; 'error' for transport errors, 'rejected' when the circuit was open, "
+    "'down' when health checks reported the upstream down.",
+    ("upstream", "status"),
+)
+upstream_response_duration = metrics.histogram(
+    "gateway_upstream_response_seconds",
+    "Time from starting an upstream attempt to receiving its response headers, including pool wait.",
+    ("upstream",),
+)
+upstream_ttfb = metrics.histogram(
+    "gateway_upstream_ttfb_seconds", "Time from sending request headers upstream to receiving response headers.",
+    ("upstream",),
+)
+upstream_connect_duration = metrics.histogram(
+    "gateway_upstream_connect_seconds", "Time to open a new upstream connection, including TLS.",
+    ("upstream",), buckets=CONNECT_BUCKETS,
+)
+upstream_pool_connections = metrics.gauge(
+    "gateway_upstream_pool_connections",
+    "Upstream pool connections by state; 'queued' counts requests waiting for a connection.",
+    ("upstream", "state"), collect=_pool_samples,
+)
+upstream_shed_total = metrics.counter(
+    "gateway_upstream_shed_total", "Requests answered with 503 because the upstream had no capacity left.",
+    ("upstream", "priority"),
+)
+upstream_concurrency = metrics.gauge(
+    "gateway_upstream_concurrency",
+    "Adaptive concurrency limit of each upstream, with the requests in flight and waiting for a slot.",
+    ("upstream", "state"), collect=_concurrency_samples,
+)
+upstream_up = metrics.gauge(
+    "gateway_upstream_up", "1 if the latest health checks report the upstream endpoint up, 0 if down.",
+    ("upstream",), collect=_health_samples,
+)
+upstream_pool_max_connections = metrics.gauge(
+    "gateway_upstream_pool_max_connections", "Connection limit of each upstream pool.",
+    ("upstream",), collect=_pool_limits,
+)
+
+
+class UpstreamTrace:
+    """
+    httpcore ``trace`` extension recording connect time and TTFB of one
+    upstream attempt.
+    """
+
+    __slots__ = ("labels", "connect_started", "request_started")
+
+    def __init__(self, upstream):
+        self.labels = (upstream,)
+        self.connect_started = None
+        self.request_started = None
+
+    async def __call__(self, name, info):
+        if name == "connection.connect_tcp.started":
+            self.connect_started = time.perf_counter()
+        elif name.endswith(".send_request_headers.started"):
+            now = time.perf_counter()
+            self.request_started = now
+            if self.connect_started is not None:
+                upstream_connect_duration.observe(now - self.connect_started, self.labels)
+                self.connect_started = None
+        elif name.endswith(".receive_response_headers.complete") and self.request_started is not None:
+            upstream_ttfb.observe(time.perf_counter() - self.request_started, self.labels)
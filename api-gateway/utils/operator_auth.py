@@ -0,0 +1,48 @@
+import os
+import hmac
+import logging
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# Header carrying the operator token (GATEWAY_ADMIN_TOKEN)
+ADMIN_TOKEN_HEADER = "X-Gateway-Admin-Token"
+
+
+def _allowed_ips():
+    return {ip.strip() for ip in os.getenv("GATEWAY_ADMIN_ALLOWED_IPS", "").split(",") if ip.strip()}
+
+
+def _client_ip(request: Request):
+    client = request.scope.get("client")
+    return client[0] if client else None
+
+
+def is_operator(request: Request):
+    """
+    True if the request comes from an address in ``GATEWAY_ADMIN_ALLOWED_IPS``
+    (e.g. the metrics scraper) or carries the operator token.
+    """
+    if _client_ip(request) in _allowed_ips():
+        return True
+    expected = os.getenv("GATEWAY_ADMIN_TOKEN")
+    if not expected:
+        return False
+    supplied = request.headers.get(ADMIN_TOKEN_HEADER, "")
+    return hmac.compare_digest(supplied.encode("utf-8"), expected.encode("utf-8"))
+
+
+def authorize(request: Request):
+    """
+    Check the operator token for gateway management and stats endpoints.
+    Returns an error response, or None if the request may proceed. Without
+    a token configured the endpoints answer 404, except to allowed addresses.
+    """
+    if is_operator(request):
+        return None
+    if not os.getenv("GATEWAY_ADMIN_TOKEN"):
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+    logger.warning(f"Rejected operator request to {request.url.path} with an invalid admin token")
+    return JSONResponse(status_code=403, content={"detail": "Invalid admin token"})
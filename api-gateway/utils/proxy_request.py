@@ -1,135 +1,482 @@
 import httpx
+import json
 import logging
-import os
+import time
 from fastapi import Request, HTTPException
-from starlette.responses import Response
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse
+from utils.gateway_config import gateway_config
+from utils.upstream_pools import upstream_pools
+from utils.response_cache import response_cache, INVALIDATING_METHODS
+from utils.route_policy import route_policies
+from utils.single_flight import single_flight, COALESCIBLE_METHODS
+from utils.circuit_breaker import circuit_breakers, CircuitOpenError, FAILURE_STATUSES
+from utils.concurrency_limiter import concurrency_limiters, OverloadedError
+from utils.retry_policy import retry_policies, RETRYABLE_METHODS
+from utils.load_balancer import load_balancers
+from utils.health_checker import upstream_health
+from utils.deadlines import (
+    deadline_for,
+    within_deadline,
+    ClientDisconnected,
+    DeadlineExceeded,
+    CANCELLABLE_METHODS,
+    DEADLINE_HEADER,
+)
+from utils.metrics import (
+    UpstreamTrace,
+    upstream_requests_total,
+    upstream_response_duration,
+    upstream_shed_total,
+)
+from utils.compression import (
+    response_compressor,
+    accepts,
+    add_vary,
+    is_compressible,
+    weaken_etag,
+    UPSTREAM_ACCEPT_ENCODING,
+)
 
 # Configure logging
 logger = logging.getLogger("api_gateway")
 
-# HTTP client for making requests to microservices
-http_client = httpx.AsyncClient(timeout=30.0)
+# Response headers that describe the upstream hop and must not be copied as-is
+EXCLUDED_RESPONSE_HEADERS = ("content-encoding", "transfer-encoding", "content-length")
 
 async def close_http_client():
-    await http_client.aclose()
+    await upstream_pools.aclose()
 
-async def proxy_request(request: Request, destination_url: str):
+def request_has_body(request: Request) -> bool:
+    """
+    Check whether the incoming request carries a body that must be forwarded.
+    """
+    if "transfer-encoding" in request.headers:
+        return True
+    return request.headers.get("content-length", "0").strip() not in ("", "0")
+
+class BufferedResponse:
+    """A fully read upstream response that can be cached or shared."""
+
+    __slots__ = ("status_code", "headers", "body", "media_type")
+
+    def __init__(self, status_code, headers, body, media_type):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.media_type = media_type
+
+def filter_response_headers(response: httpx.Response) -> dict:
+    """
+    Copy upstream response headers, excluding ones that would cause issues.
+    """
+    response_headers = {}
+    for name, value in response.headers.items():
+        if name.lower() not in EXCLUDED_RESPONSE_HEADERS:
+            response_headers[name] = value
+    return response_headers
+
+async def encode_body(request: Request, status_code: int, headers: dict, body: bytes, media_type: str, entry=None) -> bytes:
+    """
+    Compress a buffered body when the client accepts a supported encoding,
+    updating ``headers``. Compressed copies of cached entries are kept in the
+    cache so each is compressed only once.
+    """
+    if response_compressor.settings.enabled and is_compressible(media_type):
+        add_vary(headers)
+    encoding = response_compressor.choose(request, status_code, headers, media_type, len(body))
+    if encoding is None:
+        return body
+
+    encoded = entry.encoded.get(encoding) if entry is not None else None
+    if encoded is None:
+        encoded = await response_compressor.compress(encoding, body)
+        if entry is not None:
+            response_cache.add_encoded(entry, encoding, encoded)
+    headers["Content-Encoding"] = encoding
+    weaken_etag(headers)
+    return encoded
+
+def encode_stream(request: Request, response: httpx.Response, headers: dict):
+    """
+    Return the body iterator for a streamed upstream response, updating
+    ``headers``. A body the upstream already compressed in an encoding the
+    client accepts is passed through untouched; otherwise the decoded body
+    is compressed for the client when worthwhile.
+    """
+    media_type = response.headers.get("content-type")
+    upstream_encoding = response.headers.get("content-encoding", "").strip().lower()
+    client_encoding = request.headers.get("accept-encoding")
+
+    if upstream_encoding and upstream_encoding != "identity" and "," not in upstream_encoding:
+        if accepts(client_encoding, upstream_encoding):
+            response_compressor.passed_through += 1
+            headers["Content-Encoding"] = upstream_encoding
+            if "content-length" in response.headers:
+                headers["Content-Length"] = response.headers["content-length"]
+            if is_compressible(media_type):
+                add_vary(headers)
+            return response.aiter_raw()
+
+    if response_compressor.settings.enabled and is_compressible(media_type):
+        add_vary(headers)
+    size = None
+    if not upstream_encoding and response.headers.get("content-length", "").isdigit():
+        size = int(response.headers["content-length"])
+    encoding = response_compressor.choose(request, response.status_code, headers, media_type, size)
+    if encoding is None:
+        return response.aiter_bytes()
+
+    headers["Content-Encoding"] = encoding
+    weaken_etag(headers)
+    return response_compressor.compress_stream(encoding, response.aiter_bytes())
+
+async def send_upstream(request: Request, destination_url: str) -> httpx.Response:
+    """
+    Send the request to the upstream using its pool and return the response
+    with the body still unread.
+    """
+    # Get the request headers
+    headers = dict(request.headers)
+    headers.pop("host", None)  # Remove host header to avoid conflicts
+    # Only ask for encodings the gateway can decode; the client's own
+    # preference is applied when the response goes out
+    headers["accept-encoding"] = UPSTREAM_ACCEPT_ENCODING
+
+    # Stream the request body instead of reading it into memory
+    content = request.stream() if request_has_body(request) else None
+
+    # Services with several instances get one picked per attempt
+    destination_url, balancer, endpoint = load_balancers.route(destination_url)
+
+    # What is left of the request's time budget caps every phase of this
+    # attempt and is passed on, so the upstream can give up in time too
+    timeout = httpx.USE_CLIENT_DEFAULT
+    policy = route_policies.match(request.method, request.url.path)
+    deadline = deadline_for(request)
+    if deadline is not None:
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(deadline.budget)
+        settings = upstream_pools.settings_for(destination_url)
+        timeout = httpx.Timeout(
+            connect=min(settings.connect_timeout, remaining),
+            read=remaining,
+            write=remaining,
+            pool=min(settings.pool_timeout, remaining)
+        )
+        headers[DEADLINE_HEADER] = deadline.header_value()
+
+    breaker = circuit_breakers.breaker_for(destination_url)
+    upstream = breaker.name
+
+    # Fail fast while health checks report the upstream down, rather than
+    # waiting for a connect error or timeout
+    if upstream_health.is_down(destination_url):
+        upstream_requests_total.inc((upstream, "down"))
+        raise CircuitOpenError(upstream, upstream_health.retry_after())
+
+    # Wait for a slot under the upstream's concurrency limit; low priority
+    # requests are shed first when it runs out
+    limiter = concurrency_limiters.limiter_for(destination_url)
+    slot = None
+    if limiter is not None:
+        try:
+            slot = await limiter.acquire(policy.priority)
+        except OverloadedError:
+            upstream_shed_total.inc((upstream, policy.priority))
+            raise
+
+    # Fail fast while the upstream's circuit is open
+    if not breaker.allow():
+        if slot is not None:
+            limiter.release(slot)
+        upstream_requests_total.inc((upstream, "rejected"))
+        raise CircuitOpenError(breaker.name, breaker.retry_after())
+
+    # Forward the request to the appropriate microservice using its own pool
+    http_client = upstream_pools.client_for(destination_url)
+    upstream_request = http_client.build_request(
+        method=request.method,
+        url=destination_url,
+        headers=headers,
+        params=dict(request.query_params),
+        content=content,
+        timeout=timeout,
+        extensions={"trace": UpstreamTrace(upstream)}
+    )
+    if endpoint is not None:
+        balancer.start(endpoint)
+    start = time.monotonic()
+    try:
+        response = await http_client.send(upstream_request, stream=True)
+    except httpx.RequestError:
+        latency = time.monotonic() - start
+        breaker.record(False, latency)
+        if slot is not None:
+            limiter.release(slot, overloaded=True)
+        upstream_requests_total.inc((upstream, "error"))
+        if endpoint is not None:
+            balancer.finish(endpoint, False, latency)
+        raise
+    except BaseException:
+        breaker.release()
+        if slot is not None:
+            limiter.release(slot)
+        if endpoint is not None:
+            balancer.cancel(endpoint)
+        raise
+
+    latency = time.monotonic() - start
+    success = response.status_code not in FAILURE_STATUSES
+    breaker.record(success, latency)
+    # The slot covers the wait for response headers, not the body transfer.
+    # Uploads and writes only count for their errors, as their latency
+    # depends on the body they send.
+    if slot is not None:
+        limiter.release(slot, overloaded=not success, sample=content is None)
+    upstream_requests_total.inc((upstream, str(response.status_code)))
+    upstream_response_duration.observe(latency, (upstream,))
+    if endpoint is not None:
+        balancer.finish(endpoint, success, latency)
+    return response
+
+async def send_upstream_with_retries(request: Request, destination_url: str) -> httpx.Response:
+    """
+    Like ``send_upstream``, but bodiless GET/HEAD requests are retried on
+    connect errors and 502/503/504 within the upstream's retry budget, and
+    hedged on routes whose policy asks for it.
+    """
+    if request.method not in RETRYABLE_METHODS or request_has_body(request):
+        return await send_upstream(request, destination_url)
+
+    policy = route_policies.match(request.method, request.url.path)
+    retry = retry_policies.policy_for(destination_url)
+    if not policy.hedge:
+        return await retry.send(lambda: send_upstream(request, destination_url))
+
+    latency = retry_policies.latency_for(policy.name)
+    start = time.monotonic()
+    response = await retry.send(lambda: send_upstream(request, destination_url), hedge_delay=latency.value)
+    latency.add(time.monotonic() - start)
+    return response
+
+async def fetch_buffered(request: Request, destination_url: str, cache_rule=None) -> BufferedResponse:
+    """
+    Send the request upstream and read the whole body, storing it in the
+    response cache when ``cache_rule`` applies.
+    """
+    # Taken before the call, so a write that lands meanwhile keeps a
+    # possibly older body out of the cache
+    generation = response_cache.generation(request.url.path) if cache_rule is not None else None
+    response = await send_upstream_with_retries(request, destination_url)
+    try:
+        body = await response.aread()
+    finally:
+        await response.aclose()
+
+    logger.debug(f"Response from {destination_url}: Status {response.status_code}")
+
+    result = BufferedResponse(
+        status_code=response.status_code,
+        headers=filter_response_headers(response),
+        body=body,
+        media_type=response.headers.get("content-type")
+    )
+    if cache_rule is not None:
+        response_cache.store(
+            request, cache_rule, result.status_code, result.headers, result.body, result.media_type, generation
+        )
+    return result
+
+def gateway_timeout_response(config, origin, destination_url, budget):
+    logger.warning(f"No response from {destination_url} within the {budget:g}s budget")
+
+    # Return error response with CORS headers
+    error_headers = config.error_cors_headers(origin)
+
+    return Response(
+        content=json.dumps({"detail": f"Gateway timeout: no response within {budget:g}s"}).encode("utf-8"),
+        status_code=504,
+        headers=error_headers,
+        media_type="application/json"
+    )
+
+async def proxy_request(request: Request, destination_url: str, buffered: bool = False, coalesce: bool = False):
     """
     Forward a request to a microservice and return the response.
-    
+
+    The request body is piped into the upstream request and the upstream body
+    is piped back to the client chunk by chunk, so uploads and large listings
+    are never held in gateway memory. Pass ``buffered=True`` when the caller
+    needs the whole body. Cacheable catalog reads are buffered and answered
+    from the gateway response cache while fresh.
+
+    With ``coalesce=True``, concurrent identical GET/HEAD requests (same URL,
+    query and credentials) share a single upstream call.
+
     Args:
         request: The original FastAPI request
         destination_url: The URL of the microservice to forward the request to
-        
+        buffered: Read the full upstream body before returning
+        coalesce: Share one upstream call between identical in-flight reads
+
     Returns:
         The response from the microservice
     """
     # Get the request method
     method = request.method
-    
+
+    # One configuration snapshot for the whole request, so a reload does not
+    # change CORS or upstream settings halfway through
+    config = gateway_config.current
+
     # Get origin from request headers
     origin = request.headers.get("origin", "*")
-    
-    # Get the request headers
-    headers = dict(request.headers)
-    headers.pop("host", None)  # Remove host header to avoid conflicts
-    
-    # Get the request body
-    body = await request.body()
-    
-    # Get the query parameters
-    params = dict(request.query_params)
-    
+
+    # Serve cacheable reads from the response cache when possible
+    cache_rule = response_cache.rule_for(request)
+    if cache_rule is not None:
+        entry = response_cache.get(request)
+        if entry is not None:
+            logger.debug(f"Cache hit for {request.url.path} ({cache_rule.name})")
+            cached_headers = dict(entry.headers)
+            cached_headers["Age"] = str(int(time.monotonic() - entry.stored_at))
+            cached_headers["X-Cache"] = "HIT"
+            cached_headers.update(config.cors_headers(origin))
+            body = await encode_body(request, entry.status_code, cached_headers, entry.body, entry.media_type, entry)
+            return Response(
+                content=body,
+                status_code=entry.status_code,
+                headers=cached_headers,
+                media_type=entry.media_type
+            )
+        # The body has to be read in full to be cached
+        buffered = True
+
+    coalesce = coalesce and method in COALESCIBLE_METHODS
+
+    # Stop waiting when the time budget runs out, and for reads when the
+    # client goes away, so abandoned requests do not hold upstream capacity
+    deadline = deadline_for(request)
+    watch_disconnect = method in CANCELLABLE_METHODS and not request_has_body(request)
+
     logger.debug(f"Proxying request to: {destination_url}, origin: {origin}")
-    
+
     try:
-        # Forward the request to the appropriate microservice
-        response = await http_client.request(
-            method=method,
-            url=destination_url,
-            headers=headers,
-            params=params,
-            content=body
-        )
-        
-        # Copy response headers, excluding ones that would cause issues
-        response_headers = {}
-        for name, value in response.headers.items():
-            if name.lower() not in ("content-encoding", "transfer-encoding", "content-length"):
-                response_headers[name] = value
-        
-        # Add CORS headers to the response
-        # Get configured origins from environment
-        origins = [
-            "http://localhost:4000",
-            "http://127.0.0.1:4000",
-        ]
-        
-        # Add frontend URL if available
-        if "FRONTEND_URL" in os.environ:
-            origins.append(os.environ.get("FRONTEND_URL"))
-            
-        # Add additional origins if available
-        if "ADDITIONAL_CORS_ORIGINS" in os.environ:
-            additional_origins = os.environ.get("ADDITIONAL_CORS_ORIGINS").split(",")
-            origins.extend([o.strip() for o in additional_origins])
-        
-        # Check if the origin is in allowed origins, otherwise use wildcard
-        if origin in origins:
-            response_headers["Access-Control-Allow-Origin"] = origin
-        else:
-            # In development, we're more permissive
-            if os.environ.get("ENVIRONMENT", "development").lower() == "development":
-                response_headers["Access-Control-Allow-Origin"] = origin
+        if buffered or coalesce:
+            if coalesce:
+                key = single_flight.key_for(request, destination_url)
+                result = await within_deadline(request, deadline, single_flight.do(
+                    key, lambda: fetch_buffered(request, destination_url, cache_rule)
+                ), watch_disconnect)
             else:
-                response_headers["Access-Control-Allow-Origin"] = origins[0]  # Default to first origin
-        
-        # Add other CORS headers
-        response_headers["Access-Control-Allow-Credentials"] = "true"
-        response_headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, PATCH, OPTIONS"
-        response_headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, Accept, Origin, X-Requested-With"
-        response_headers["Access-Control-Expose-Headers"] = "Content-Length"
-        
+                result = await within_deadline(
+                    request, deadline, fetch_buffered(request, destination_url, cache_rule), watch_disconnect
+                )
+
+                # A successful write makes cached catalog reads under the same path stale
+                if method in INVALIDATING_METHODS and result.status_code < 400:
+                    response_cache.invalidate(request.url.path)
+
+            # Copy so shared and cached headers stay free of per-client values
+            response_headers = dict(result.headers)
+            if cache_rule is not None:
+                response_headers["X-Cache"] = "MISS"
+
+            # Add CORS headers to the response
+            response_headers.update(config.cors_headers(origin))
+            body = await encode_body(request, result.status_code, response_headers, result.body, result.media_type)
+
+            # Return the full response from the microservice
+            return Response(
+                content=body,
+                status_code=result.status_code,
+                headers=response_headers,
+                media_type=result.media_type
+            )
+
+        response = await within_deadline(
+            request, deadline, send_upstream_with_retries(request, destination_url), watch_disconnect
+        )
+        response_headers = filter_response_headers(response)
+
         logger.debug(f"Response from {destination_url}: Status {response.status_code}")
-        
-        # Return the response from the microservice
-        return Response(
-            content=response.content,
+
+        # A successful write makes cached catalog reads under the same path stale
+        if method in INVALIDATING_METHODS and response.status_code < 400:
+            response_cache.invalidate(request.url.path)
+
+        # Add CORS headers to the response
+        response_headers.update(config.cors_headers(origin))
+
+        # Pipe the response from the microservice back to the client; the
+        # upstream connection is released once the body is sent or the
+        # client goes away
+        return StreamingResponse(
+            encode_stream(request, response, response_headers),
             status_code=response.status_code,
             headers=response_headers,
-            media_type=response.headers.get("content-type")
+            media_type=response.headers.get("content-type"),
+            background=BackgroundTask(response.aclose)
+        )
+    except CircuitOpenError as exc:
+        logger.debug(f"Circuit open, not calling {destination_url}")
+
+        # Return error response with CORS headers
+        error_headers = config.error_cors_headers(origin)
+        error_headers["Retry-After"] = str(max(1, round(exc.retry_after)))
+
+        return Response(
+            content=json.dumps({"detail": f"Service unavailable: {exc.name} is failing, try again later"}).encode("utf-8"),
+            status_code=503,
+            headers=error_headers,
+            media_type="application/json"
+        )
+    except ClientDisconnected:
+        logger.debug(f"Client disconnected, abandoned request to {destination_url}")
+
+        # Nobody reads this; it records the outcome in the access log and metrics
+        return Response(status_code=499)
+    except DeadlineExceeded as exc:
+        return gateway_timeout_response(config, origin, destination_url, exc.budget)
+    except OverloadedError as exc:
+        logger.debug(f"Shed {exc.priority} request to {destination_url}")
+
+        # Return error response with CORS headers
+        error_headers = config.error_cors_headers(origin)
+        error_headers["Retry-After"] = str(exc.retry_after)
+
+        return Response(
+            content=json.dumps({"detail": f"Service unavailable: {exc.name} is overloaded, try again later"}).encode("utf-8"),
+            status_code=503,
+            headers=error_headers,
+            media_type="application/json"
         )
     except httpx.RequestError as exc:
+        if isinstance(exc, httpx.TimeoutException) and deadline is not None and deadline.expired():
+            return gateway_timeout_response(config, origin, destination_url, deadline.budget)
+
         logger.error(f"Request error when connecting to {destination_url}: {str(exc)}")
-        
+
         # Return error response with CORS headers
-        error_headers = {
-            "Access-Control-Allow-Origin": origin,
-            "Access-Control-Allow-Credentials": "true",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, PATCH, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With"
-        }
-        
+        error_headers = config.error_cors_headers(origin)
+
         return Response(
-            content={"detail": f"Service unavailable: {str(exc)}"}.encode("utf-8"),
+            content=json.dumps({"detail": f"Service unavailable: {str(exc)}"}).encode("utf-8"),
             status_code=503,
             headers=error_headers,
             media_type="application/json"
         )
     except Exception as exc:
         logger.error(f"Unexpected error when proxying to {destination_url}: {str(exc)}", exc_info=True)
-        
+
         # Return error response with CORS headers
-        error_headers = {
-            "Access-Control-Allow-Origin": origin,
-            "Access-Control-Allow-Credentials": "true",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, PATCH, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With"
-        }
-        
+        error_headers = config.error_cors_headers(origin)
+
         return Response(
-            content={"detail": f"Internal server error: {str(exc)}"}.encode("utf-8"),
+            content=json.dumps({"detail": f"Internal server error: {str(exc)}"}).encode("utf-8"),
             status_code=500,
             headers=error_headers,
             media_type="application/json"
-        ) 
\ No newline at end of file
+        )
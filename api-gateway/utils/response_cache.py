@@ -0,0 +1,305 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+from utils.route_policy import route_policies
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# Methods that change state and invalidate cached reads
+INVALIDATING_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    """
+    A cacheable gateway route and how long its responses stay fresh.
+    Entries are shared by every caller, with or without a token, so rules
+    only cover reads whose response does not depend on who asks.
+    """
+
+    name: str
+    ttl: float
+
+
+@dataclass
+class CacheEntry:
+    status_code: int
+    headers: dict
+    body: bytes
+    media_type: str
+    stored_at: float
+    expires_at: float
+    size: int
+    key: tuple = None
+    # Compressed copies of the body, by content coding
+    encoded: dict = field(default_factory=dict)
+
+
+def parse_cache_control(value):
+    """Parse a Cache-Control header into a dict of directive -> value."""
+    directives = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def _ttl_from_env(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Ignoring invalid value for {name}")
+        return float(default)
+
+
+def default_rules():
+    """
+    Cache rules for public catalog reads, by name. Which routes use them is
+    set by the ``cache`` field of the route policy table.
+    """
+    rules = [
+        CacheRule(name="vehicle_list", ttl=_ttl_from_env("CACHE_TTL_VEHICLES", 30)),
+        CacheRule(name="rental_availability", ttl=_ttl_from_env("CACHE_TTL_AVAILABILITY", 10)),
+        CacheRule(name="vehicle_detail", ttl=_ttl_from_env("CACHE_TTL_VEHICLE_DETAIL", 60)),
+    ]
+    return {rule.name: rule for rule in rules}
+
+
+# Writes under a prefix drop every cached entry under the listed prefixes.
+# Vehicle changes can also change availability answers.
+DEFAULT_INVALIDATIONS = {
+    "/vehicles": ("/vehicles", "/rentals/availability"),
+    "/rentals": ("/rentals/availability",),
+}
+
+
+class ResponseCache:
+    """
+    In-process LRU cache for upstream responses, bounded by total body size.
+
+    Entries are keyed on method, path, normalized query string and the
+    request headers named in the upstream ``Vary`` header.
+
+    Each invalidated prefix has a generation that every invalidation bumps.
+    A fetch takes the generation of its path before it starts and passes it
+    to ``store``, which drops the response if a write invalidated the path
+    in the meantime: the body may predate the write.
+    """
+
+    def __init__(self, max_bytes, rules=None, invalidations=None, enabled=True):
+        self.max_bytes = max_bytes
+        # A single entry may not take more than an eighth of the cache
+        self.max_entry_bytes = max(max_bytes // 8, 1)
+        self.rules = rules if rules is not None else default_rules()
+        self.invalidations = invalidations if invalidations is not None else DEFAULT_INVALIDATIONS
+        self.enabled = enabled
+
+        self._entries = OrderedDict()
+        self._vary = {}
+        self._variants = {}
+        self._size = 0
+        # Invalidated prefix -> number of invalidations so far
+        self._generations = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidated = 0
+
+    def rule_for(self, request):
+        """Return the cache rule for a request, or None when it is not cacheable."""
+        if not self.enabled or request.method != "GET":
+            return None
+        policy = route_policies.match(request.method, request.url.path)
+        return self.rules.get(policy.cache) if policy.cache else None
+
+    def generation(self, path):
+        """Return the invalidation generation of ``path``, to pass to ``store``."""
+        return sum(
+            count for prefix, count in self._generations.items()
+            if path == prefix or path.startswith(prefix + "/")
+        )
+
+    def _primary_key(self, request):
+        query = urlencode(sorted(request.query_params.multi_items()))
+        return (request.method, request.url.path, query)
+
+    def _key(self, request, primary):
+        vary = self._vary.get(primary, ())
+        return primary + tuple(request.headers.get(name, "") for name in vary)
+
+    def get(self, request):
+        """Return a fresh cached entry for the request, or None."""
+        directives = parse_cache_control(request.headers.get("cache-control"))
+        if "no-cache" in directives or "no-store" in directives or directives.get("max-age") == "0":
+            self.misses += 1
+            return None
+
+        key = self._key(request, self._primary_key(request))
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(self, request, rule, status_code, headers, body, media_type, generation=None):
+        """
+        Store an upstream response if its status and Cache-Control allow it,
+        and its path was not invalidated since ``generation`` was taken.
+        """
+        if status_code != 200 or len(body) > self.max_entry_bytes:
+            return
+        if generation is not None and generation != self.generation(request.url.path):
+            logger.debug(f"Not caching {request.url.path}: invalidated while it was fetched")
+            return
+
+        request_directives = parse_cache_control(request.headers.get("cache-control"))
+        if "no-store" in request_directives:
+            return
+
+        lowered = {name.lower(): value for name, value in headers.items()}
+        if "set-cookie" in lowered:
+            return
+
+        directives = parse_cache_control(lowered.get("cache-control"))
+        if "no-store" in directives or "no-cache" in directives or "private" in directives:
+            return
+
+        ttl = rule.ttl
+        for directive in ("s-maxage", "max-age"):
+            if directive in directives:
+                try:
+                    ttl = float(directives[directive])
+                except (TypeError, ValueError):
+                    pass
+                break
+        if ttl <= 0:
+            return
+
+        vary = tuple(
+            name.strip().lower()
+            for name in lowered.get("vary", "").split(",")
+            if name.strip()
+        )
+        if "*" in vary:
+            return
+
+        primary = self._primary_key(request)
+        key = primary + tuple(request.headers.get(name, "") for name in vary)
+        if key in self._entries:
+            self._remove(key)
+        self._vary[primary] = vary
+
+        now = time.monotonic()
+        entry = CacheEntry(
+            status_code=status_code,
+            headers=headers,
+            body=body,
+            media_type=media_type,
+            stored_at=now,
+            expires_at=now + ttl,
+            size=len(body),
+            key=key,
+        )
+        self._entries[key] = entry
+        self._variants[primary] = self._variants.get(primary, 0) + 1
+        self._size += entry.size
+        self.stores += 1
+
+        while self._size > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def add_encoded(self, entry, encoding, body):
+        """Keep a compressed copy of a cached body, counted against the size limit."""
+        if self._entries.get(entry.key) is not entry or encoding in entry.encoded:
+            return
+        entry.encoded[encoding] = body
+        entry.size += len(body)
+        self._size += len(body)
+
+    def invalidate(self, path):
+        """Drop cached entries affected by a write to ``path``."""
+        prefixes = set()
+        for write_prefix, targets in self.invalidations.items():
+            if path == write_prefix or path.startswith(write_prefix + "/"):
+                prefixes.update(targets)
+        if not prefixes:
+            return 0
+        for prefix in prefixes:
+            self._generations[prefix] = self._generations.get(prefix, 0) + 1
+
+        stale = [
+            key for key in self._entries
+            if any(key[1] == prefix or key[1].startswith(prefix + "/") for prefix in prefixes)
+        ]
+        for key in stale:
+            self._remove(key)
+        self.invalidated += len(stale)
+        if stale:
+            logger.debug(f"Invalidated {len(stale)} cached responses after write to {path}")
+        return len(stale)
+
+    def clear(self):
+        self._entries.clear()
+        self._vary.clear()
+        self._variants.clear()
+        self._size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= entry.size
+
+        # Forget the Vary spec once no variant of the resource is cached
+        primary = key[:3]
+        remaining = self._variants.get(primary, 1) - 1
+        if remaining > 0:
+            self._variants[primary] = remaining
+        else:
+            self._variants.pop(primary, None)
+            self._vary.pop(primary, None)
+
+    def stats(self):
+        """Counters and current size, for the health routes."""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidated,
+        }
+
+
+# Shared cache used by proxy_request
+response_cache = ResponseCache(
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    enabled=os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes", "on"),
+)
@@ -0,0 +1,253 @@
+import time
+import random
+import asyncio
+import logging
+from dataclasses import dataclass
+
+import httpx
+
+from utils.upstream_pools import upstream_pools, upstream_setting, origin_of
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# Only requests that are safe to send twice are retried or hedged
+RETRYABLE_METHODS = ("GET", "HEAD")
+
+# Upstream statuses worth another attempt
+RETRY_STATUSES = (502, 503, 504)
+
+# Errors raised before the upstream could have produced a response
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+
+@dataclass(frozen=True)
+class RetrySettings:
+    """Retry and hedging limits for one upstream."""
+
+    # Total attempts per request, including the first; 1 disables retries
+    attempts: int = 2
+    # Full-jitter exponential backoff between attempts, in seconds
+    backoff_base: float = 0.05
+    backoff_max: float = 1.0
+    # Retries and hedges may add this share of the request volume...
+    budget_ratio: float = 0.2
+    # ...plus this many per second, so low-traffic services can still retry
+    budget_min_per_second: float = 5.0
+    # Never hedge earlier than this many seconds
+    hedge_min_delay: float = 0.05
+
+    @classmethod
+    def from_env(cls, service):
+        """Build settings from ``<SERVICE>_SERVICE_RETRY_*`` / ``UPSTREAM_RETRY_*``."""
+        defaults = cls()
+        return cls(
+            attempts=upstream_setting(service, "RETRY_ATTEMPTS", defaults.attempts, int),
+            backoff_base=upstream_setting(service, "RETRY_BACKOFF_BASE", defaults.backoff_base, float),
+            backoff_max=upstream_setting(service, "RETRY_BACKOFF_MAX", defaults.backoff_max, float),
+            budget_ratio=upstream_setting(service, "RETRY_BUDGET_RATIO", defaults.budget_ratio, float),
+            budget_min_per_second=upstream_setting(
+                service, "RETRY_BUDGET_MIN_PER_SECOND", defaults.budget_min_per_second, float
+            ),
+            hedge_min_delay=upstream_setting(service, "HEDGE_MIN_DELAY", defaults.hedge_min_delay, float),
+        )
+
+    def backoff(self, attempt):
+        """Delay before attempt number ``attempt + 1``."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    """
+    Token bucket that caps extra upstream calls.
+
+    Every original request deposits ``ratio`` tokens and the bucket refills
+    by ``min_per_second`` tokens per second; each retry or hedge spends one.
+    During an outage the bucket drains quickly, so retries can add at most
+    ``ratio`` to the load instead of multiplying it.
+    """
+
+    def __init__(self, ratio, min_per_second, clock=time.monotonic):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = max(1.0, min_per_second * 10)
+        self.clock = clock
+        self.tokens = self.capacity
+        self._refilled_at = clock()
+        self.spent = 0
+        self.exhausted = 0
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._refilled_at) * self.min_per_second)
+        self._refilled_at = now
+
+    def deposit(self):
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self):
+        """Spend one token for an extra call; False if the budget is used up."""
+        self._refill()
+        if self.tokens < 1:
+            self.exhausted += 1
+            return False
+        self.tokens -= 1
+        self.spent += 1
+        return True
+
+
+class LatencyTracker:
+    """
+    Recent response-header latencies for one route, used to pick the hedge
+    delay. Keeps the last ``size`` samples and recomputes the percentile
+    every ``refresh`` samples.
+    """
+
+    def __init__(self, size=512, refresh=32, min_samples=50, percentile=0.95):
+        self.size = size
+        self.refresh = refresh
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self._samples = []
+        self._next = 0
+        self._pending = 0
+        self.value = None
+
+    def add(self, latency):
+        if len(self._samples) < self.size:
+            self._samples.append(latency)
+        else:
+            self._samples[self._next] = latency
+            self._next = (self._next + 1) % self.size
+
+        self._pending += 1
+        if self._pending >= self.refresh and len(self._samples) >= self.min_samples:
+            self._pending = 0
+            ordered = sorted(self._samples)
+            self.value = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+
+def _discard(task):
+    """Cancel a losing attempt and release its response if it already has one."""
+    def close(t):
+        if not t.cancelled() and t.exception() is None:
+            asyncio.ensure_future(t.result().aclose())
+
+    task.cancel()
+    task.add_done_callback(close)
+
+
+class RetryPolicy:
+    """Retries and hedging for one upstream, sharing one retry budget."""
+
+    def __init__(self, name, settings):
+        self.name = name
+        self.settings = settings
+        self.budget = RetryBudget(settings.budget_ratio, settings.budget_min_per_second)
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def _hedged(self, send, delay):
+        first = asyncio.ensure_future(send())
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self.budget.withdraw():
+                self.hedges += 1
+                tasks.append(asyncio.ensure_future(send()))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        tasks.remove(task)
+                        return task.result()
+                    if error is None or task is first:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                _discard(task)
+
+    async def send(self, send, hedge_delay=None):
+        """
+        Call ``send()`` (which returns an ``httpx.Response`` with its body
+        unread) with retries, and hedged after ``hedge_delay`` seconds if given.
+        """
+        settings = self.settings
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if hedge_delay is not None:
+                    response = await self._hedged(send, max(hedge_delay, settings.hedge_min_delay))
+                else:
+                    response = await send()
+            except RETRY_ERRORS as exc:
+                if attempt >= settings.attempts or not self.budget.withdraw():
+                    raise
+                logger.info(f"Retrying {self.name} after {type(exc).__name__} (attempt {attempt + 1})")
+            else:
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or attempt >= settings.attempts
+                    or not self.budget.withdraw()
+                ):
+                    return response
+                logger.info(f"Retrying {self.name} after status {response.status_code} (attempt {attempt + 1})")
+                await response.aclose()
+
+            self.retries += 1
+            await asyncio.sleep(settings.backoff(attempt))
+
+    def stats(self):
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "budget_tokens": round(self.budget.tokens, 2),
+            "budget_exhausted": self.budget.exhausted,
+        }
+
+
+class RetryPolicyRegistry:
+    """Retry policies per upstream origin and latency trackers per route."""
+
+    def __init__(self):
+        self._policies = {}
+        self._latency = {}
+
+    def policy_for(self, url):
+        origin = origin_of(url)
+        policy = self._policies.get(origin)
+        if policy is None:
+            service = upstream_pools.service_for(url)
+            policy = RetryPolicy(service or origin, RetrySettings.from_env(service or "default"))
+            self._policies[origin] = policy
+        return policy
+
+    def latency_for(self, route):
+        tracker = self._latency.get(route)
+        if tracker is None:
+            tracker = self._latency[route] = LatencyTracker()
+        return tracker
+
+    def stats(self):
+        return {
+            "upstreams": {policy.name: policy.stats() for policy in self._policies.values()},
+            "hedge_delay": {
+                route: round(tracker.value, 4)
+                for route, tracker in self._latency.items()
+                if tracker.value is not None
+            },
+        }
+
+
+# Shared registry used by proxy_request
+retry_policies = RetryPolicyRegistry()
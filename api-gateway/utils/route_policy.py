@@ -0,0 +1,203 @@
+import os
+import logging
+from dataclasses import dataclass, replace
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    """How the gateway treats requests to a route."""
+
+    name: str
+    auth_required: bool = True
+    # Rate limit class; "exempt" skips rate limiting entirely
+    rate_limit: str = "default"
+    # Name of the response cache rule that applies, if any
+    cache: str = None
+    # Time budget in seconds for the upstream call, retries included; None
+    # to use the pool's timeouts. Can be shortened per request by the
+    # client's X-Request-Timeout-Ms header.
+    timeout: float = None
+    # Send a second GET when the first has not answered within the route's p95
+    hedge: bool = False
+    # Load shedding class: "critical", "normal" or "low"; low is shed first
+    # when an upstream runs out of capacity
+    priority: str = "normal"
+
+
+# Applies to any path without a more specific entry
+DEFAULT_POLICY = RoutePolicy(name="default")
+
+# Route table: (path pattern, prefix match, methods or None for all, policy).
+# "{name}" matches exactly one path segment. Prefix entries match the path
+# itself and anything below it on a segment boundary, so "/vehicles" covers
+# "/vehicles/123" but not "/vehicles-admin".
+ROUTE_POLICIES = [
+    ("/", False, None, RoutePolicy("root", auth_required=False, rate_limit="exempt")),
+    ("/health", False, None, RoutePolicy("health", auth_required=False)),
+    ("/info", False, None, RoutePolicy("info", auth_required=False)),
+    ("/api/health", False, None, RoutePolicy("api_health", auth_required=False, rate_limit="exempt")),
+    ("/api/health/ready", False, None, RoutePolicy("api_health_ready", auth_required=False, rate_limit="exempt")),
+    # Stats and metrics endpoints check the operator token themselves
+    ("/api/health", True, None, RoutePolicy("api_health_detail", auth_required=False)),
+    ("/api/metrics", False, None, RoutePolicy("metrics", auth_required=False, rate_limit="exempt")),
+    # Gateway management endpoints check their own operator token
+    ("/api/gateway", True, None, RoutePolicy("gateway_admin", auth_required=False)),
+    # Composed from the public vehicle, ratings and availability reads
+    ("/api/vehicles/{id}/details", False, ("GET",), RoutePolicy("vehicle_details", auth_required=False, priority="low")),
+    # Sub-requests of a batch are authorized and rate limited one by one
+    ("/api/batch", False, ("POST",), RoutePolicy("batch", auth_required=False)),
+    ("/api/check-file", True, None, RoutePolicy("check_file", auth_required=False)),
+    ("/api/serve-file", True, None, RoutePolicy("serve_file", auth_required=False)),
+    ("/uploads", True, None, RoutePolicy("uploads", auth_required=False)),
+    ("/api/images", True, ("GET", "HEAD"), RoutePolicy("images", auth_required=False)),
+    ("/auth/login", False, None, RoutePolicy("auth_login", auth_required=False, rate_limit="auth", timeout=10.0)),
+    ("/auth/register", False, None, RoutePolicy("auth_register", auth_required=False, rate_limit="auth", timeout=10.0)),
+    ("/auth/forgot-password", False, None, RoutePolicy("auth_forgot_password", auth_required=False, rate_limit="auth", timeout=10.0)),
+    # Other user-service auth flows (logout, password reset, verification)
+    # authorize themselves; they share the auth rate limit class
+    ("/auth", True, None, RoutePolicy("auth", auth_required=False, rate_limit="auth", timeout=10.0)),
+    # Vehicle catalog; writes are authorized by vehicle-service itself.
+    # Browsing is shed first under load.
+    ("/vehicles", True, ("GET", "HEAD"), RoutePolicy("vehicle_browse", auth_required=False, timeout=10.0, priority="low")),
+    ("/vehicles", True, None, RoutePolicy("vehicles", auth_required=False, timeout=120.0)),
+    ("/vehicles", False, ("GET",), RoutePolicy("vehicle_list", auth_required=False, cache="vehicle_list", timeout=10.0, hedge=True, priority="low")),
+    ("/vehicles/{id}", False, ("GET",), RoutePolicy("vehicle_detail", auth_required=False, cache="vehicle_detail", timeout=5.0, priority="low")),
+    # Booking and payment keep their latency when upstreams are saturated
+    ("/rentals", True, ("POST", "PUT", "PATCH", "DELETE"), RoutePolicy("rental_write", timeout=30.0, priority="critical")),
+    ("/payments", True, None, RoutePolicy("payments", timeout=30.0, priority="critical")),
+    ("/api/admin", True, ("GET", "HEAD"), RoutePolicy("admin_read", timeout=30.0, priority="low")),
+    ("/rentals/availability", True, None, RoutePolicy("rental_availability", auth_required=False, timeout=5.0)),
+    ("/rentals/availability", False, ("GET",), RoutePolicy("rental_availability", auth_required=False, cache="rental_availability", timeout=5.0, hedge=True)),
+    # Read endpoints the backends serve without a token
+    ("/rentals/all", False, ("GET",), RoutePolicy("rental_all", auth_required=False, timeout=10.0)),
+    ("/users/profile", False, None, RoutePolicy("user_profile", timeout=60.0)),
+    ("/users/{id}", False, ("GET",), RoutePolicy("user_public_profile", auth_required=False, timeout=5.0)),
+    ("/users/{id}/avatar", False, ("GET",), RoutePolicy("user_avatar", auth_required=False, timeout=10.0)),
+    ("/ratings", True, ("GET",), RoutePolicy("ratings_read", auth_required=False, timeout=5.0)),
+    ("/ratings/user/{id}", False, ("GET",), RoutePolicy("ratings_user", auth_required=False, timeout=5.0, hedge=True)),
+    # Payment provider callbacks never carry a user token
+    ("/payments/momo/ipn", False, ("POST",), RoutePolicy("momo_ipn", auth_required=False, timeout=30.0, priority="critical")),
+    ("/payments/momo/success", False, ("GET",), RoutePolicy("momo_success", auth_required=False, timeout=30.0, priority="critical")),
+]
+
+
+class _Node:
+    __slots__ = ("children", "param", "exact", "prefix")
+
+    def __init__(self):
+        self.children = {}
+        self.param = None
+        self.exact = []
+        self.prefix = []
+
+
+def _segments(path):
+    path = path.strip("/")
+    return path.split("/") if path else []
+
+
+def _select(entries, method):
+    for methods, policy in entries:
+        if methods is None or method in methods:
+            return policy
+    return None
+
+
+class RoutePolicyTable:
+    """
+    Route policies compiled into a segment trie.
+
+    A lookup walks the request path once, so it costs O(path length) no
+    matter how many routes are configured. At each level a literal segment
+    is preferred over a ``{param}`` segment. The deepest matching entry wins:
+    an exact entry for the full path, otherwise the longest prefix entry.
+    Method-restricted entries are listed before catch-all ones at the same
+    node, so they take precedence.
+    """
+
+    def __init__(self, routes, default=DEFAULT_POLICY):
+        self.default = default
+        self._root = _Node()
+        self.paths = []
+        for pattern, prefix, methods, policy in routes:
+            self.add(pattern, policy, prefix=prefix, methods=methods)
+
+    def add(self, pattern, policy, prefix=False, methods=None):
+        """Add a route pattern to the table."""
+        node = self._root
+        for segment in _segments(pattern):
+            if segment.startswith("{") and segment.endswith("}"):
+                if node.param is None:
+                    node.param = _Node()
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _Node())
+
+        entries = node.prefix if prefix else node.exact
+        entry = (frozenset(m.upper() for m in methods) if methods else None, policy)
+        # Method-specific entries are checked before catch-all ones
+        if entry[0] is None:
+            entries.append(entry)
+        else:
+            entries.insert(sum(1 for m, _ in entries if m is not None), entry)
+        self.paths.append(pattern)
+
+    def match(self, method, path):
+        """Return the policy for a request."""
+        node = self._root
+        best = _select(node.prefix, method)
+        for segment in _segments(path):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.param
+                if child is None:
+                    return best or self.default
+            node = child
+            policy = _select(node.prefix, method)
+            if policy is not None:
+                best = policy
+
+        return _select(node.exact, method) or best or self.default
+
+    def is_public(self, method, path):
+        return not self.match(method, path).auth_required
+
+
+def _with_env_timeout(policy):
+    """Apply ``ROUTE_TIMEOUT_<POLICY NAME>`` (seconds, 0 for none) if set."""
+    key = f"ROUTE_TIMEOUT_{policy.name.upper()}"
+    value = os.getenv(key)
+    if value in (None, ""):
+        return policy
+    try:
+        timeout = float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid value for {key}: {value!r}")
+        return policy
+    return replace(policy, timeout=timeout if timeout > 0 else None)
+
+
+def build_route_policies():
+    """
+    Compile the route table, adding public prefixes from ``PUBLIC_API_PATHS``
+    (comma separated) and timeouts from ``ROUTE_TIMEOUT_<POLICY NAME>``.
+    """
+    table = RoutePolicyTable(
+        [(pattern, prefix, methods, _with_env_timeout(policy)) for pattern, prefix, methods, policy in ROUTE_POLICIES]
+    )
+
+    additional_paths = os.getenv("PUBLIC_API_PATHS", "")
+    for path in additional_paths.split(","):
+        path = path.strip()
+        if path:
+            table.add(path, RoutePolicy(f"public:{path}", auth_required=False), prefix=True)
+
+    logger.info(f"Route policy table compiled with {len(table.paths)} entries")
+    return table
+
+
+# Compiled once at startup and shared by the middleware and proxy layer
+route_policies = build_route_policies()
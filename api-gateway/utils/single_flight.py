@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from urllib.parse import urlencode
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+# Only requests that are safe to replay may share an upstream call
+COALESCIBLE_METHODS = ("GET", "HEAD")
+
+# Request headers that can change what an upstream returns. Authorization and
+# Cookie are part of the key so callers never share each other's private data.
+KEY_HEADERS = ("authorization", "cookie", "accept", "accept-language")
+
+# Cancel message of a caller abandoned because its client disconnected
+CLIENT_DISCONNECTED = "client disconnected"
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one shared upstream call.
+
+    The first caller for a key starts the call in its own task; callers that
+    arrive while it is running await the same task and receive the same
+    result (or exception). The task is shielded so a caller that leaves
+    does not cancel the call for everyone else. The call is only cancelled
+    when the last caller left because its client disconnected (cancelled
+    with ``CLIENT_DISCONNECTED``). A caller that gave up for another reason,
+    e.g. a timeout, leaves it running so it can still fill the response
+    cache.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def key_for(self, request, destination_url):
+        """Build the coalescing key for a request forwarded to ``destination_url``."""
+        query = urlencode(sorted(request.query_params.multi_items()))
+        return (request.method, destination_url, query) + tuple(
+            request.headers.get(name, "") for name in KEY_HEADERS
+        )
+
+    async def do(self, key, fn):
+        """Run ``fn()`` once per key among concurrent callers and share its result."""
+        call = self._calls.get(key)
+        if call is None:
+            # [task, callers still waiting]
+            call = [asyncio.ensure_future(fn()), 0]
+            self._calls[key] = call
+            call[0].add_done_callback(lambda done: self._finish(key, done))
+            self.leaders += 1
+        else:
+            self.followers += 1
+            logger.debug(f"Joining in-flight request for {key[1]}")
+        task = call[0]
+        call[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError as e:
+            call[1] -= 1
+            if call[1] == 0 and not task.done() and e.args[:1] == (CLIENT_DISCONNECTED,):
+                logger.debug(f"Every caller left, cancelling request for {key[1]}")
+                task.cancel()
+            raise
+        except BaseException:
+            call[1] -= 1
+            raise
+        else:
+            call[1] -= 1
+
+    def _finish(self, key, task):
+        call = self._calls.get(key)
+        if call is not None and call[0] is task:
+            del self._calls[key]
+        # Mark the exception as retrieved when every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
+
+
+# Shared single-flight group used by proxy_request
+single_flight = SingleFlight()
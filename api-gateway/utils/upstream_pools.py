@@ -0,0 +1,257 @@
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import httpx
+
+from utils.gateway_config import gateway_config
+
+# Configure logging
+logger = logging.getLogger("api_gateway")
+
+
+def upstream_setting(service, name, default, cast):
+    """
+    Read a pool setting, preferring ``<SERVICE>_SERVICE_<NAME>`` over the
+    gateway-wide ``UPSTREAM_<NAME>`` value.
+    """
+    for key in (f"{service.upper()}_SERVICE_{name}", f"UPSTREAM_{name}"):
+        value = os.getenv(key)
+        if value not in (None, ""):
+            try:
+                return cast(value)
+            except ValueError:
+                logger.warning(f"Ignoring invalid value for {key}: {value!r}")
+    return default
+
+
+def _bool(value):
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def origin_of(url):
+    """Return the scheme://host[:port] part of a URL, used as the pool key."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """Connection limits and per-phase timeouts for one upstream pool."""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 5.0
+    http2: bool = False
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 10.0
+
+    @classmethod
+    def from_env(cls, service):
+        """Build settings for a service from the environment."""
+        defaults = cls()
+        return cls(
+            max_connections=upstream_setting(service, "MAX_CONNECTIONS", defaults.max_connections, int),
+            max_keepalive_connections=upstream_setting(service, "MAX_KEEPALIVE", defaults.max_keepalive_connections, int),
+            keepalive_expiry=upstream_setting(service, "KEEPALIVE_EXPIRY", defaults.keepalive_expiry, float),
+            http2=upstream_setting(service, "HTTP2", defaults.http2, _bool),
+            connect_timeout=upstream_setting(service, "CONNECT_TIMEOUT", defaults.connect_timeout, float),
+            read_timeout=upstream_setting(service, "READ_TIMEOUT", defaults.read_timeout, float),
+            write_timeout=upstream_setting(service, "WRITE_TIMEOUT", defaults.write_timeout, float),
+            pool_timeout=upstream_setting(service, "POOL_TIMEOUT", defaults.pool_timeout, float),
+        )
+
+    def limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeout(self):
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+
+_ssl_context = None
+
+
+def shared_ssl_context():
+    """
+    Return the TLS context every upstream client verifies with. Loading the
+    CA bundle takes tens of milliseconds, so it is done once, not per pool.
+    """
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = httpx.create_ssl_context()
+    return _ssl_context
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class UpstreamPoolRegistry:
+    """
+    Lazily created httpx clients, one per upstream origin.
+
+    Each backend gets its own connection pool so a slow service can only
+    exhaust its own connections. Origins that do not belong to a configured
+    service share the gateway-wide defaults.
+    """
+
+    def __init__(self, endpoints):
+        """
+        Args:
+            endpoints: Mapping of service name to its endpoint base URLs
+        """
+        self._clients = {}
+        self._settings = {}
+        self._set_endpoints(endpoints)
+
+    def _set_endpoints(self, endpoints):
+        self._service_names = {
+            origin_of(url): name for name, urls in endpoints.items() for url in urls
+        }
+        self._multi_endpoint = {name for name, urls in endpoints.items() if len(urls) > 1}
+
+    def update_services(self, endpoints, drain_seconds=60.0):
+        """
+        Point the registry at new service endpoints.
+
+        Pools of origins that are no longer configured are removed at once,
+        so new requests cannot use them, and closed after ``drain_seconds``
+        to let in-flight requests finish.
+        """
+        previous = self._service_names
+        self._set_endpoints(endpoints)
+        # Settings are re-read lazily, picking up any reloaded environment
+        self._settings.clear()
+
+        retired = [
+            origin for origin in self._clients
+            if origin in previous and origin not in self._service_names
+        ]
+        if not retired:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        for origin in retired:
+            client = self._clients.pop(origin)
+            logger.info(f"Retiring upstream pool for {origin}, closing in {drain_seconds:g}s")
+            if loop is not None:
+                loop.call_later(drain_seconds, lambda c=client: asyncio.ensure_future(c.aclose()))
+
+    def service_for(self, url):
+        """Return the configured service name for a URL, or None."""
+        return self._service_names.get(origin_of(url))
+
+    def label_for(self, url):
+        """
+        Name an upstream for stats and logs: the service name, qualified by
+        host when the service has several endpoints.
+        """
+        origin = origin_of(url)
+        service = self._service_names.get(origin)
+        if service is None:
+            return origin
+        if service in self._multi_endpoint:
+            return f"{service}@{urlsplit(origin).netloc}"
+        return service
+
+    def settings_for(self, url):
+        """Return the pool settings that apply to a URL's origin."""
+        origin = origin_of(url)
+        settings = self._settings.get(origin)
+        if settings is None:
+            service = self._service_names.get(origin, "default")
+            settings = PoolSettings.from_env(service)
+            if settings.http2 and not _http2_available():
+                logger.warning(f"HTTP/2 requested for {service} but the 'h2' package is not installed, using HTTP/1.1")
+                settings = PoolSettings(**{**settings.__dict__, "http2": False})
+            self._settings[origin] = settings
+        return settings
+
+    def client_for(self, url):
+        """Return the pooled client for a URL's origin, creating it on first use."""
+        origin = origin_of(url)
+        client = self._clients.get(origin)
+        if client is None:
+            settings = self.settings_for(url)
+            client = httpx.AsyncClient(
+                limits=settings.limits(),
+                timeout=settings.timeout(),
+                http2=settings.http2,
+                verify=shared_ssl_context(),
+            )
+            self._clients[origin] = client
+            logger.info(
+                f"Created upstream pool for {origin} "
+                f"(max_connections={settings.max_connections}, http2={settings.http2})"
+            )
+        return client
+
+    def warm(self, services=None):
+        """
+        Create the pools of the given services' origins (all configured ones
+        by default) up front, so the first request to each service does not
+        pay for it. Returns the number of pools created.
+        """
+        created = 0
+        for origin, service in self._service_names.items():
+            if services is not None and service not in services:
+                continue
+            if origin not in self._clients:
+                self.client_for(origin)
+                created += 1
+        return created
+
+    def pool_stats(self):
+        """
+        Report connection usage of each pool created so far: active and idle
+        connections, requests queued for a connection and the limit.
+        """
+        stats = {}
+        for origin, client in self._clients.items():
+            # httpx does not expose its pool; read httpcore's where available
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            connections = getattr(pool, "connections", [])
+            idle = sum(1 for connection in connections if connection.is_idle())
+            queued = sum(1 for request in getattr(pool, "_requests", []) if request.is_queued())
+            stats[self.label_for(origin)] = {
+                "max_connections": self.settings_for(origin).max_connections,
+                "active": len(connections) - idle,
+                "idle": idle,
+                "queued": queued,
+            }
+        return stats
+
+    async def aclose(self):
+        """Close every pool that has been created."""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+# Shared registry used by proxy_request, following configuration reloads
+upstream_pools = UpstreamPoolRegistry(gateway_config.current.endpoints)
+gateway_config.subscribe(
+    lambda old, new: upstream_pools.update_services(
+        new.endpoints, drain_seconds=float(os.getenv("GATEWAY_CONFIG_DRAIN_SECONDS", 60))
+    )
+)